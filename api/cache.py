@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any
+
+try:
+    from api.log import get_logger
+    from api.metrics import CACHE_LOOKUPS
+except ImportError:
+    from log import get_logger
+    from metrics import CACHE_LOOKUPS
+
+
+logger = get_logger("cache")
+
+
+CACHE_FILE = "ocr-cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+_TABLES = ("ocr_text", "transactions")
+
+
+def document_digest(data: bytes) -> str:
+    """SHA-256 hex digest used to content-address uploaded documents."""
+
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """`document_digest` of a file's contents, read in chunks."""
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def default_cache_path() -> str:
+    """`$XDG_CACHE_HOME/creditnext/ocr-cache.sqlite3` (default `~/.cache`).
+
+    The cache holds statement text and transactions, so it never defaults to
+    the shared temp dir; without a usable home directory it falls back to a
+    per-user `creditnext-<uid>` directory there. The directory is made 0700.
+    """
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    if not os.path.isabs(base):
+        uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+        base = os.path.join(tempfile.gettempdir(), f"creditnext-{uid}")
+        return os.path.join(_private_dir(base), CACHE_FILE)
+    return os.path.join(_private_dir(os.path.join(base, "creditnext")), CACHE_FILE)
+
+
+def _private_dir(path: str) -> str:
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        st = os.stat(path)
+        if st.st_uid != os.getuid():
+            raise PermissionError(f"Cache directory {path} belongs to another user")
+        if st.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+def _private_file(path: str) -> None:
+    # SQLite creates the -wal/-shm files with the database file's permissions.
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    if hasattr(os, "getuid") and os.stat(path).st_mode & 0o077:
+        os.chmod(path, 0o600)
+
+
+def cache_key(*parts: Any) -> str:
+    return ":".join("" if p is None else str(p) for p in parts)
+
+
+class ResultCache:
+    """Local SQLite cache for OCR text and structured transactions.
+
+    The two kinds of result live in separate tables, so a prompt change only
+    invalidates the (cheap to miss) LLM step while OCR text keeps hitting.
+    Entries expire `ttl_seconds` after being written; each table is trimmed to
+    `max_entries` by least-recent access. WAL mode lets every worker process
+    on the host share one file, which is created readable by its owner only.
+    The `a*` methods run the same queries in a thread, for use on the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ) -> None:
+        path = path or default_cache_path()
+        _private_file(path)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for table in _TABLES:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)")
+
+    def get_text(self, key: str) -> dict[str, Any] | None:
+        return self._get("ocr_text", key)
+
+    def put_text(self, key: str, value: dict[str, Any]) -> None:
+        self._put("ocr_text", key, value)
+
+    def get_transactions(self, key: str) -> list[dict[str, Any]] | None:
+        return self._get("transactions", key)
+
+    def put_transactions(self, key: str, value: list[dict[str, Any]]) -> None:
+        self._put("transactions", key, value)
+
+    async def aget_text(self, key: str) -> dict[str, Any] | None:
+        return await asyncio.to_thread(self.get_text, key)
+
+    async def aput_text(self, key: str, value: dict[str, Any]) -> None:
+        await asyncio.to_thread(self.put_text, key, value)
+
+    async def aget_transactions(self, key: str) -> list[dict[str, Any]] | None:
+        return await asyncio.to_thread(self.get_transactions, key)
+
+    async def aput_transactions(self, key: str, value: list[dict[str, Any]]) -> None:
+        await asyncio.to_thread(self.put_transactions, key, value)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, table: str, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created_at FROM {table} WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                CACHE_LOOKUPS.labels(table, "miss").inc()
+                return None
+            self._conn.execute(f"UPDATE {table} SET accessed_at = ? WHERE key = ?", (now, key))
+        CACHE_LOOKUPS.labels(table, "hit").inc()
+        return json.loads(row[0])
+
+    def _put(self, table: str, key: str, value: Any) -> None:
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self._conn.execute(f"DELETE FROM {table} WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE key IN ("
+                f"SELECT key FROM {table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+_CACHE: ResultCache | None = None
+_CACHE_FAILED = False
+
+
+def get_cache() -> ResultCache | None:
+    """Process-wide cache from `CREDITNEXT_CACHE_*` env vars; None when disabled.
+
+    A cache that cannot be opened (e.g. read-only filesystem) disables caching
+    instead of failing requests.
+    """
+
+    global _CACHE, _CACHE_FAILED
+    if _CACHE is not None or _CACHE_FAILED:
+        return _CACHE
+    if os.environ.get("CREDITNEXT_CACHE_DISABLED", "").strip().lower() in ("1", "true", "yes"):
+        _CACHE_FAILED = True
+        return None
+    try:
+        _CACHE = ResultCache(
+            path=os.environ.get("CREDITNEXT_CACHE_PATH") or None,
+            max_entries=int(os.environ.get("CREDITNEXT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl_seconds=float(os.environ.get("CREDITNEXT_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("OCR result cache disabled", extra={"error": str(e)})
+        _CACHE_FAILED = True
+    return _CACHE
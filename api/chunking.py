@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import math
+
+try:
+    from api.statement_parser import is_opening_line, is_row_line, row_balance
+except ImportError:
+    from statement_parser import is_opening_line, is_row_line, row_balance
+
+
+# Rough tokenizer-free estimate: ~4 ASCII chars per token, while Thai and other
+# non-ASCII script costs closer to one token per couple of characters.
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 2.0
+
+
+def estimate_tokens(text: str) -> int:
+    n_ascii = sum(1 for c in text if c < "\x80")
+    return math.ceil(n_ascii / ASCII_CHARS_PER_TOKEN + (len(text) - n_ascii) / OTHER_CHARS_PER_TOKEN)
+
+
+def chunk_ocr_text(text: str, max_tokens: int, overlap_lines: int = 2) -> list[str]:
+    """Split OCR text into chunks of at most ~`max_tokens` estimated tokens.
+
+    Whole pages (separated by form feeds) are packed together while they fit;
+    a page too large on its own is split between lines, never inside one, and
+    each of its continuation chunks repeats the previous `overlap_lines` lines
+    so a row wrapped across the cut is seen whole by one request. The repeated
+    rows are removed again when chunk results are merged. Continuation chunks
+    also carry the page header (bank, account, column titles) and open with a
+    brought-forward line at the last balance printed before them, so each
+    chunk is read with the same columns and reconciles on its own.
+    """
+
+    pages = [p.strip("\n") for p in (text or "").split("\f")]
+    pages = [p for p in pages if p.strip()]
+
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for page in pages:
+        tokens = estimate_tokens(page)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        if tokens <= max_tokens:
+            current.append(page)
+            current_tokens += tokens
+        else:
+            chunks.extend(_split_lines(page.split("\n"), max_tokens, overlap_lines))
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _split_lines(lines: list[str], max_tokens: int, overlap_lines: int) -> list[str]:
+    header = _page_header(lines, max_tokens)
+    chunks: list[str] = []
+    start = 0
+    while start < len(lines):
+        prefix = _carry_over(lines, start, header) if start else []
+        end = start
+        tokens = sum(estimate_tokens(line) + 1 for line in prefix)
+        while end < len(lines) and (end == start or tokens + estimate_tokens(lines[end]) <= max_tokens):
+            tokens += estimate_tokens(lines[end]) + 1
+            end += 1
+        chunks.append("\n".join(prefix + lines[start:end]))
+        if end >= len(lines):
+            break
+        # Step back for the overlap, but always make progress.
+        start = max(end - overlap_lines, start + 1)
+    return chunks
+
+
+def _page_header(lines: list[str], max_tokens: int) -> list[str]:
+    """Lines above the first row, minus the page's own brought-forward line; empty if too long to repeat."""
+
+    first_row = next((i for i, line in enumerate(lines) if is_row_line(line)), 0)
+    header = [line for line in lines[:first_row] if not is_opening_line(line)]
+    if sum(estimate_tokens(line) + 1 for line in header) > max_tokens // 4:
+        return []
+    return header
+
+
+def _carry_over(lines: list[str], start: int, header: list[str]) -> list[str]:
+    prefix = list(header) if start >= len(header) else []
+    for line in reversed(lines[:start]):
+        if is_row_line(line):
+            balance = row_balance(line)
+            if balance is not None:
+                prefix.append(f"Balance brought forward {balance:,.2f}")
+            break
+    return prefix
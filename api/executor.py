@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised by `CpuExecutor.admit` when too much CPU work is already queued."""
+
+
+def _init_worker() -> None:
+    # Work already runs in one process per core; keep Tesseract (OpenMP)
+    # single-threaded inside each worker to avoid oversubscribing the cores.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+class CpuExecutor:
+    """Process pool for blocking PDF/OCR work, kept off the event loop.
+
+    `max_pending` bounds tasks, not requests: `run()` holds one of
+    `max_pending` slots from submission until the task finishes, so the pool
+    never has more than that many tasks queued or running, however many pages
+    a document has; further `run()` calls wait on the event loop. Requests call
+    `admit()` before doing any CPU work and are rejected with
+    `ExecutorSaturated` (mapped to HTTP 503) while `max_pending` requests are
+    admitted or the task backlog (submitted plus waiting) has reached
+    `max_pending`, instead of queueing unboundedly behind a large document.
+    """
+
+    def __init__(self, max_workers: int | None = None, max_pending: int | None = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.admitted = 0  # requests inside `admit()`
+        self.pending = 0  # tasks submitted to the pool and not finished
+        self.waiting = 0  # `run()` calls waiting for a task slot
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._slots_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def backlog(self) -> int:
+        return self.pending + self.waiting
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that already runs uvicorn/XGBoost threads is unsafe.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._pool
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        if self.admitted >= self.max_pending:
+            raise ExecutorSaturated(f"{self.admitted} OCR jobs already admitted")
+        if self.backlog >= self.max_pending:
+            raise ExecutorSaturated(f"{self.backlog} OCR tasks already queued")
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.admitted -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        slots = self._task_slots()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+            slots.release()
+
+    def _task_slots(self) -> asyncio.Semaphore:
+        # Semaphores bind to the loop they first block on; scripts and tests
+        # may call from a new loop, which gets fresh slots.
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._slots_loop = loop
+        return self._slots
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_CPU_EXECUTOR: CpuExecutor | None = None
+
+
+def get_cpu_executor() -> CpuExecutor:
+    """Process-wide executor sized by `CREDITNEXT_CPU_WORKERS` / `CREDITNEXT_CPU_MAX_PENDING`."""
+
+    global _CPU_EXECUTOR
+    if _CPU_EXECUTOR is None:
+        _CPU_EXECUTOR = CpuExecutor(
+            max_workers=int(os.environ.get("CREDITNEXT_CPU_WORKERS", "0")) or None,
+            max_pending=int(os.environ.get("CREDITNEXT_CPU_MAX_PENDING", "0")) or None,
+        )
+    return _CPU_EXECUTOR
+
+
+def shutdown_cpu_executor() -> None:
+    global _CPU_EXECUTOR
+    if _CPU_EXECUTOR is not None:
+        _CPU_EXECUTOR.shutdown()
+        _CPU_EXECUTOR = None
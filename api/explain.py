@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# "path_dependent": exact TreeSHAP over the training cover, from the compiled
+#   forest (NumPy, no xgboost import) or XGBoost's `pred_contribs=True` when the
+#   artifact has no forest. No background data needed.
+# "interventional": `shap.Explainer` over the training background (previous behaviour).
+# "none": no contributions; p_default only (from the compiled forest).
+SHAP_MODES = ("path_dependent", "interventional", "none")
+DEFAULT_SHAP_MODE = "path_dependent"
+
+# `/analyze?explain=` levels and the SHAP mode each one selects.
+EXPLAIN_LEVELS = {"none": "none", "fast": "path_dependent", "full": "interventional"}
+
+
+@dataclass
+class TreeExplanation:
+    p_default: np.ndarray
+    base_values: np.ndarray
+    values: np.ndarray
+
+
+def shap_mode() -> str:
+    """Configured explanation mode (`CREDITNEXT_SHAP_MODE`), validated."""
+
+    mode = os.environ.get("CREDITNEXT_SHAP_MODE", DEFAULT_SHAP_MODE).strip().lower()
+    if mode not in SHAP_MODES:
+        raise ValueError(f"CREDITNEXT_SHAP_MODE must be one of {SHAP_MODES}, got {mode!r}")
+    return mode
+
+
+def tree_contributions(model, x_s: np.ndarray) -> TreeExplanation:
+    """Path-dependent TreeSHAP straight from the booster.
+
+    `pred_contribs` returns one column per feature plus a trailing bias column,
+    all in log-odds; their row sum is the raw margin, so p_default falls out of
+    the same call without a separate `predict_proba`.
+    """
+
+    from xgboost import DMatrix
+
+    contribs = model.get_booster().predict(DMatrix(np.asarray(x_s, dtype=np.float32)), pred_contribs=True)
+    contribs = np.asarray(contribs, dtype=np.float64)
+    margin = contribs.sum(axis=1)
+    return TreeExplanation(
+        p_default=1.0 / (1.0 + np.exp(-margin)),
+        base_values=contribs[:, -1],
+        values=contribs[:, :-1],
+    )
+
+
+def forest_contributions(forest, x_s: np.ndarray) -> TreeExplanation:
+    """Path-dependent TreeSHAP from a `CompiledForest` (see `CompiledForest.contributions`).
+
+    Same values as `tree_contributions` to float32 precision; p_default is the
+    forest's own `predict_proba`, so it matches the "none" mode exactly.
+    """
+
+    values, bias = forest.contributions(x_s)
+    return TreeExplanation(
+        p_default=forest.predict_proba(x_s)[:, 1].astype(float),
+        base_values=bias,
+        values=values,
+    )
+
+
+def interventional_contributions(explainer, predict_default, x_s: np.ndarray) -> TreeExplanation:
+    """Interventional SHAP through a `shap.Explainer` built by `build_interventional_explainer`.
+
+    `predict_default(x_s)` supplies p_default (e.g. `ModelBundle.predict_default`).
+    """
+
+    shap_values = explainer(x_s)
+    return TreeExplanation(
+        p_default=np.asarray(predict_default(x_s), dtype=float),
+        base_values=np.asarray(shap_values.base_values, dtype=float).reshape(len(x_s)),
+        values=np.asarray(shap_values.values, dtype=float),
+    )
+
+
+def build_interventional_explainer(model, background: np.ndarray):
+    import shap
+
+    return shap.Explainer(model, np.asarray(background))
+
+
+def max_abs_deviation_from_shap(model, x_s: np.ndarray) -> float:
+    """Largest |native - shap.TreeExplainer| difference over `x_s` (values and base)."""
+
+    import shap
+
+    native = tree_contributions(model, x_s)
+    reference = shap.TreeExplainer(model, feature_perturbation="tree_path_dependent")
+    ref_values = np.asarray(reference.shap_values(x_s), dtype=float)
+    ref_base = float(np.ravel(reference.expected_value)[0])
+    return float(
+        max(
+            np.max(np.abs(native.values - ref_values)),
+            np.max(np.abs(native.base_values - ref_base)),
+        )
+    )
+
+
+if __name__ == "__main__":
+    # Regression check: native contributions must match the shap package.
+    #   python -m api.explain
+    try:
+        from api.model import load_or_train_model
+    except ImportError:
+        from model import load_or_train_model
+
+    bundle = load_or_train_model(seed=42)
+    rows = np.asarray(bundle.shap_background[:500])
+    deviation = max_abs_deviation_from_shap(bundle.classifier(), rows)
+    print(f"max |native - shap| over {len(rows)} rows: {deviation:.2e}")
+    raise SystemExit(0 if deviation < 1e-4 else 1)
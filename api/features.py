@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Iterable, Mapping, Sequence
+
+import numpy as np
+
+
+# int64 day number used for dates that could not be parsed.
+NO_DAY = np.iinfo(np.int64).min
+
+
+@dataclass
+class TransactionColumns:
+    """One statement's transactions as parallel NumPy columns.
+
+    Built once per request and shared by industry classification and feature
+    extraction, instead of each step copying a DataFrame and re-parsing dates.
+    `day` holds days since 1970-01-01 (`NO_DAY` when unparseable).
+    """
+
+    day: np.ndarray
+    amount: np.ndarray
+    is_income: np.ndarray
+    is_expense: np.ndarray
+    description: list[str]
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    @classmethod
+    def from_columns(
+        cls,
+        dates: Sequence[Any],
+        descriptions: Sequence[Any],
+        amounts: Sequence[Any],
+        types: Sequence[Any],
+    ) -> "TransactionColumns":
+        types = np.asarray(types, dtype=object)
+        return cls(
+            day=parse_days(dates),
+            amount=np.asarray(amounts, dtype=np.float64),
+            is_income=types == "Income",
+            is_expense=types == "Expense",
+            description=[str(d) for d in descriptions],
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> "TransactionColumns":
+        records = list(records)
+        return cls.from_columns(
+            [r.get("date") for r in records],
+            [r.get("description", "") for r in records],
+            [r.get("amount", 0.0) for r in records],
+            [r.get("type") for r in records],
+        )
+
+    @classmethod
+    def from_frame(cls, df) -> "TransactionColumns":
+        if df is None or len(df) == 0:
+            return cls.from_columns([], [], [], [])
+        return cls.from_columns(
+            df["date"].tolist(),
+            df["description"].tolist(),
+            df["amount"].to_numpy(dtype=np.float64),
+            df["type"].to_numpy(dtype=object),
+        )
+
+
+def parse_days(dates: Sequence[Any]) -> np.ndarray:
+    """Dates -> int64 days since epoch, `NO_DAY` for anything unparseable.
+
+    ISO `YYYY-MM-DD` strings (what the OCR pipeline and `/analyze` produce)
+    are converted in one vectorized NumPy cast; any other input falls back to
+    `pandas.to_datetime(errors="coerce")`, matching the previous behaviour.
+    """
+
+    if len(dates) == 0:
+        return np.empty(0, dtype=np.int64)
+    try:
+        values = np.asarray(dates, dtype="datetime64[D]")
+    except (TypeError, ValueError):
+        try:
+            # Date-times such as "2025-01-31 14:05:00" keep only the day.
+            values = np.asarray([str(d)[:10] for d in dates], dtype="datetime64[D]")
+        except ValueError:
+            import pandas as pd
+
+            values = pd.to_datetime(pd.Series(list(dates), dtype=object), errors="coerce").to_numpy("datetime64[D]")
+    days = values.astype(np.int64)
+    days[np.isnat(values)] = NO_DAY
+    return days
+
+
+@dataclass
+class CashflowSummary:
+    income: float
+    expense: float
+    consistency: float
+    # Days between the first and last dated transaction; None without dates.
+    span_days: int | None
+
+    def monthly_income_est(self) -> float:
+        if self.span_days is None:
+            return float(self.income)
+        scaled = self.income * (30.0 / float(max(self.span_days, 1)))
+        return float(np.clip(scaled, 0.0, 1e9))
+
+
+def summarize_cashflow(cols: TransactionColumns) -> CashflowSummary:
+    """Totals, daily-net-flow consistency and date span in one pass over the columns.
+
+    Consistency is `1 - std / mean(|net|)` over the net flow of each day that
+    has transactions (clipped to [0, 1]; 0.7 for a single day, 0.5 with no
+    usable dates).
+    """
+
+    income = float(cols.amount[cols.is_income].sum())
+    expense = float(cols.amount[cols.is_expense].sum())
+
+    dated = cols.day != NO_DAY
+    if not dated.any():
+        return CashflowSummary(income, expense, 0.5, None)
+
+    day = cols.day[dated]
+    signed = np.where(cols.is_income[dated], cols.amount[dated], -cols.amount[dated])
+    first = int(day.min())
+    span = int(day.max()) - first
+    if span <= 4 * len(day) + 366:
+        offset = day - first
+        present = np.bincount(offset, minlength=span + 1) > 0
+        daily = np.bincount(offset, weights=signed, minlength=span + 1)[present]
+    else:
+        # A stray misread year would make the dense day range huge; bin by rank instead.
+        _, inverse = np.unique(day, return_inverse=True)
+        daily = np.bincount(inverse, weights=signed)
+
+    if len(daily) <= 1:
+        consistency = 0.7
+    else:
+        vol = float(np.std(daily))
+        avg = float(np.mean(np.abs(daily)))
+        consistency = float(np.clip(1.0 - (vol / (avg + 1e-6)), 0.0, 1.0))
+    return CashflowSummary(income, expense, consistency, span)
+
+
+def build_features(summary: CashflowSummary, industry_factor: float, proxy_net_profit: float) -> dict[str, float]:
+    total = max(summary.income + summary.expense, 1.0)
+    return {
+        "expense_ratio": float(summary.expense / total),
+        "consistency": float(summary.consistency),
+        "industry_factor": float(industry_factor),
+        "proxy_net_profit": float(proxy_net_profit),
+        "cashflow_strength": float(np.log1p(max(proxy_net_profit, 0.0))),
+    }
@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from math import factorial
+
+import numpy as np
+
+
+# Saved next to the booster in the model artifact (see `api.model.save_model`).
+FOREST_FILE = "forest.npz"
+
+# Rows evaluated together; larger batches are split into blocks of this size.
+ROW_BLOCK = 256
+
+# Rows per block for SHAP values: their (rows, leaves, depth) work arrays grow fast.
+SHAP_ROW_BLOCK = 16
+
+# Deepest trees `contributions` tabulates: the table has 2**depth rows per leaf.
+SHAP_MAX_DEPTH = 8
+
+# Largest accepted |forest - predict_proba|; margins themselves must match exactly.
+PROBA_TOLERANCE = 1e-6
+
+# Largest accepted |forest - pred_contribs| (XGBoost computes them in float32).
+CONTRIBUTION_TOLERANCE = 1e-5
+
+
+@dataclass
+class _LeafPaths:
+    """Every root-to-leaf path, padded to `max_depth` edges, for path-dependent TreeSHAP.
+
+    A row's contributions from a leaf depend only on which edges of its path
+    the row follows, so `table` holds them for every such pattern.
+    """
+
+    edge_node: np.ndarray  # intp (leaves, depth), split node of each edge
+    edge_right: np.ndarray  # bool, the path goes right at that node
+    onehot: np.ndarray  # float64 (leaves * depth, features): path slot -> feature
+    table: np.ndarray  # float64 (leaves * 2**depth, depth): contribution per pattern and slot
+    bias: float  # expected margin: base margin + sum of leaf value x path cover share
+
+
+@dataclass
+class CompiledForest:
+    """A binary:logistic XGBoost ensemble flattened into contiguous NumPy arrays.
+
+    All trees share one node numbering; `roots[t]` is tree t's root and
+    `children[i]` its (left, right) node indices, with leaves pointing at
+    themselves so a fixed `max_depth` steps always end on a leaf. Splits and
+    leaf values stay float32 and the margin is summed tree by tree in float32,
+    the same way XGBoost does, so margins match the booster bit for bit.
+    `cover` (training hessian per node) enables `contributions`.
+    """
+
+    feature: np.ndarray  # intp, split feature (0 on leaves)
+    threshold: np.ndarray  # float32, go right when x >= threshold
+    children: np.ndarray  # intp, shape (n_nodes, 2)
+    default_left: np.ndarray  # bool, branch taken for NaN
+    value: np.ndarray  # float32, leaf value (0 on inner nodes)
+    roots: np.ndarray  # intp
+    base_margin: np.float32
+    max_depth: int
+    cover: np.ndarray | None = None  # float32 sum_hessian; None in forests saved without it
+    _paths: _LeafPaths | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def n_trees(self) -> int:
+        return int(self.roots.shape[0])
+
+    def predict_margin(self, X) -> np.ndarray:
+        """Raw log-odds for each row of `X` (n_rows, n_features), as float32."""
+
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        if X.shape[0] <= ROW_BLOCK:
+            return self._margin_block(X)
+        # Blocks keep the (trees, rows) work arrays cache-sized.
+        return np.concatenate([self._margin_block(X[i : i + ROW_BLOCK]) for i in range(0, X.shape[0], ROW_BLOCK)])
+
+    def _margin_block(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        # Feature-major copy: value of feature f for row r is at f * n + r.
+        flat = np.ascontiguousarray(X.T).ravel()
+        has_nan = bool(np.isnan(flat).any())
+        cols = np.arange(n, dtype=np.intp)
+        edges = self.children.ravel()
+        node = np.repeat(self.roots[:, None], n, axis=1)  # (trees, rows)
+        for _ in range(self.max_depth):
+            x = flat.take(self.feature.take(node) * n + cols)
+            go_right = x >= self.threshold.take(node)
+            if has_nan:
+                go_right = np.where(np.isnan(x), ~self.default_left.take(node), go_right)
+            node = edges.take(node * 2 + go_right)
+        # Add one tree at a time in order, starting from the base margin:
+        # XGBoost's float32 accumulation exactly. `accumulate` is strictly
+        # sequential; `reduce` switches to pairwise summation when the summed
+        # axis is contiguous (a single row), which changes the last bits.
+        terms = np.empty((self.n_trees + 1, n), dtype=np.float32)
+        terms[0] = self.base_margin
+        terms[1:] = self.value.take(node)
+        return np.add.accumulate(terms, axis=0, out=terms)[-1]
+
+    def predict_proba(self, X) -> np.ndarray:
+        """(n_rows, 2) class probabilities, like `XGBClassifier.predict_proba`.
+
+        The sigmoid runs in float32 around a double-precision exp; the platform
+        `expf` XGBoost calls can differ from it by one ulp on rare rows.
+        """
+
+        margin = self.predict_margin(X)
+        e = np.exp(-margin.astype(np.float64)).astype(np.float32)
+        p = np.float32(1.0) / (np.float32(1.0) + e)
+        return np.column_stack([np.float32(1.0) - p, p])
+
+    @property
+    def explains(self) -> bool:
+        """Whether `contributions` is available (covers compiled in, shallow trees)."""
+
+        return self.cover is not None and self.max_depth <= SHAP_MAX_DEPTH
+
+    def contributions(self, X) -> tuple[np.ndarray, np.ndarray]:
+        """Path-dependent TreeSHAP, as XGBoost's `pred_contribs`: (values, bias).
+
+        `values` is (n_rows, n_features) in log-odds and `bias` the expected
+        margin per row; they sum to the margin. A leaf's share for a row
+        depends only on which edges of its path the row follows, so the
+        Shapley sums are tabulated once per leaf and pattern (see
+        `_leaf_paths`) and a row costs one pass over the path edges plus a
+        table lookup.
+        """
+
+        if not self.explains:
+            raise ValueError("Forest has no node covers or is too deep to explain")
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        paths = self._leaf_paths(X.shape[1])
+        if X.shape[0] <= SHAP_ROW_BLOCK:
+            values = self._contributions_block(X, paths)
+        else:
+            values = np.concatenate(
+                [self._contributions_block(X[i : i + SHAP_ROW_BLOCK], paths) for i in range(0, X.shape[0], SHAP_ROW_BLOCK)]
+            )
+        return values, np.full(X.shape[0], paths.bias)
+
+    def _contributions_block(self, X: np.ndarray, paths: _LeafPaths) -> np.ndarray:
+        # Which path edges each row follows: (rows, leaves, depth).
+        x = X[:, self.feature.take(paths.edge_node)]
+        go_right = x >= self.threshold.take(paths.edge_node)
+        nan = np.isnan(x)
+        if nan.any():
+            go_right = np.where(nan, ~self.default_left.take(paths.edge_node), go_right)
+        follows = go_right == paths.edge_right
+        pattern = follows.view(np.uint8) @ (np.uint8(1) << np.arange(self.max_depth, dtype=np.uint8))
+        rows = np.take(paths.table, pattern + np.arange(0, paths.table.shape[0], 2**self.max_depth), axis=0)
+        return rows.reshape(X.shape[0], -1) @ paths.onehot
+
+    def _leaf_paths(self, n_features: int) -> _LeafPaths:
+        if self._paths is not None and self._paths.onehot.shape[1] == n_features:
+            return self._paths
+        depth = self.max_depth
+        cover = self.cover.astype(np.float64)
+        rows: list[tuple] = []
+        for root in self.roots.tolist():
+            stack = [(int(root), [])]
+            while stack:
+                node, edges = stack.pop()
+                left, right = self.children[node]
+                if left == node:
+                    rows.append((node, edges))
+                    continue
+                stack.append((int(right), edges + [(node, True, int(right))]))
+                stack.append((int(left), edges + [(node, False, int(left))]))
+
+        # Slots are the distinct features on a path (a feature split twice is one slot).
+        n_leaves = len(rows)
+        value = np.empty(n_leaves)
+        edge_node = np.zeros((n_leaves, depth), dtype=np.intp)
+        edge_right = np.zeros((n_leaves, depth), dtype=bool)
+        edge_slot = np.full((n_leaves, depth), -1, dtype=np.intp)
+        onehot = np.zeros((n_leaves, depth, n_features))
+        zero = np.ones((n_leaves, depth))  # share of training cover following the slot; 1 on padding
+        weights = np.zeros((n_leaves, depth))  # Shapley weight of k other slots, by k
+        shapley = [[factorial(k) * factorial(m - k - 1) / factorial(m) for k in range(m)] for m in range(depth + 1)]
+        for leaf, (node, edges) in enumerate(rows):
+            value[leaf] = self.value[node]
+            slots: dict[int, int] = {}
+            for e, (parent, went_right, child) in enumerate(edges):
+                slot = slots.setdefault(int(self.feature[parent]), len(slots))
+                edge_node[leaf, e], edge_right[leaf, e], edge_slot[leaf, e] = parent, went_right, slot
+                zero[leaf, slot] *= cover[child] / cover[parent]
+            for feature, slot in slots.items():
+                onehot[leaf, slot, feature] = 1.0
+            weights[leaf, : len(slots)] = shapley[len(slots)]
+
+        # o_j: the row follows every edge of slot j, per leaf and edge pattern; 0 on padding.
+        edges_followed = (np.arange(2**depth)[:, None] >> np.arange(depth)) & 1 == 1  # (patterns, edges)
+        slot_range = np.arange(depth)
+        one = np.all(
+            (edge_slot[:, None, None, :] != slot_range[None, None, :, None]) | edges_followed[None, :, None, :], axis=3
+        )
+        one &= (edge_slot[:, None, :] == slot_range[None, :, None]).any(axis=2)[:, None, :]
+        one = one.astype(np.float64)  # (leaves, patterns, slots)
+
+        # Slot i gets value * (o_i - z_i) * sum_S w(|S|) prod_{j in S} o_j prod_{j not in S} z_j
+        # over subsets S of the other slots; the sum over S is read off the
+        # coefficients of prod_{j != i} (z_j + o_j t). Padding slots are the factor 1.
+        table = np.zeros(one.shape)
+        for i in range(depth):
+            coef = np.zeros(one.shape)
+            coef[:, :, 0] = 1.0
+            for j in range(depth):
+                if j == i:
+                    continue
+                shifted = np.zeros_like(coef)
+                shifted[:, :, 1:] = coef[:, :, :-1] * one[:, :, j, None]
+                coef = coef * zero[:, None, j, None] + shifted
+            subsets = (coef * weights[:, None, :]).sum(axis=2)
+            table[:, :, i] = value[:, None] * (one[:, :, i] - zero[:, i, None]) * subsets
+        table *= (weights > 0)[:, None, :]  # unused slots
+
+        self._paths = _LeafPaths(
+            edge_node=edge_node,
+            edge_right=edge_right,
+            onehot=onehot.reshape(n_leaves * depth, n_features),
+            table=table.reshape(n_leaves * 2**depth, depth),
+            bias=float(self.base_margin) + float(value @ zero.prod(axis=1)),
+        )
+        return self._paths
+
+    def save(self, fh) -> None:
+        arrays = {} if self.cover is None else {"cover": self.cover}
+        np.savez(
+            fh,
+            feature=self.feature,
+            threshold=self.threshold,
+            children=self.children,
+            default_left=self.default_left,
+            value=self.value,
+            roots=self.roots,
+            base_margin=np.asarray(self.base_margin, dtype=np.float32),
+            max_depth=np.asarray(self.max_depth, dtype=np.int64),
+            **arrays,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledForest":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(
+                feature=z["feature"].astype(np.intp),
+                threshold=z["threshold"],
+                children=z["children"].astype(np.intp),
+                default_left=z["default_left"],
+                value=z["value"],
+                roots=z["roots"].astype(np.intp),
+                base_margin=np.float32(z["base_margin"]),
+                max_depth=int(z["max_depth"]),
+                cover=z["cover"] if "cover" in z.files else None,
+            )
+
+
+def compile_booster(booster) -> CompiledForest:
+    """Flatten an `xgboost.Booster` (binary:logistic, numerical splits) into a `CompiledForest`."""
+
+    model = json.loads(bytes(booster.save_raw(raw_format="json")))
+    learner = model["learner"]
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise ValueError(f"Only binary:logistic boosters can be compiled, got {objective}")
+    trees = learner["gradient_booster"]["model"]["trees"]
+
+    feature, threshold, children, default_left, value, roots, cover = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for tree in trees:
+        if any(tree["split_type"]):
+            raise ValueError("Categorical splits are not supported")
+        lc = np.asarray(tree["left_children"], dtype=np.intp)
+        rc = np.asarray(tree["right_children"], dtype=np.intp)
+        cond = np.asarray(tree["split_conditions"], dtype=np.float32)
+        leaf = lc == -1
+        own = np.arange(len(lc), dtype=np.intp)
+        feature.append(np.where(leaf, 0, tree["split_indices"]))
+        # On leaves XGBoost stores the leaf value in split_conditions.
+        threshold.append(np.where(leaf, np.float32(0.0), cond))
+        value.append(np.where(leaf, cond, np.float32(0.0)))
+        children.append(np.column_stack([np.where(leaf, own, lc), np.where(leaf, own, rc)]) + offset)
+        default_left.append(np.asarray(tree["default_left"], dtype=bool))
+        cover.append(np.asarray(tree["sum_hessian"], dtype=np.float32))
+        roots.append(offset)
+        max_depth = max(max_depth, _depth(lc, rc))
+        offset += len(lc)
+
+    base_score = _parse_base_score(learner["learner_model_param"]["base_score"])
+    return CompiledForest(
+        feature=np.concatenate(feature).astype(np.intp),
+        threshold=np.concatenate(threshold).astype(np.float32),
+        children=np.concatenate(children).astype(np.intp),
+        default_left=np.concatenate(default_left),
+        value=np.concatenate(value).astype(np.float32),
+        roots=np.asarray(roots, dtype=np.intp),
+        # base_score is a probability for binary:logistic; the trees add to its
+        # log-odds, taken in float32 exactly as XGBoost does.
+        base_margin=np.log(base_score / (np.float32(1.0) - base_score)),
+        max_depth=max_depth,
+        cover=np.concatenate(cover),
+    )
+
+
+def validate(forest: CompiledForest, model, X) -> dict:
+    """Compare `forest` with the `XGBClassifier` it was compiled from on the rows of `X`.
+
+    A faithful forest has no margin mismatches and a probability error of at
+    most `PROBA_TOLERANCE` (the one-ulp `expf` difference). With covers, its
+    contributions and bias must also be within `CONTRIBUTION_TOLERANCE` of
+    `pred_contribs`.
+    """
+
+    from xgboost import DMatrix
+
+    X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+    dmatrix = DMatrix(X)
+    margin = model.get_booster().predict(dmatrix, output_margin=True)
+    proba = np.asarray(model.predict_proba(X), dtype=np.float32)[:, 1]
+    report = {
+        "rows": int(X.shape[0]),
+        "margin_mismatches": int(np.count_nonzero(forest.predict_margin(X) != margin)),
+        "max_abs_proba_error": float(np.max(np.abs(forest.predict_proba(X)[:, 1] - proba), initial=0.0)),
+    }
+    if forest.cover is not None:
+        reference = np.asarray(model.get_booster().predict(dmatrix, pred_contribs=True), dtype=np.float64)
+        values, bias = forest.contributions(X)
+        errors = np.abs(np.column_stack([values, bias]) - reference)
+        report["max_abs_contribution_error"] = float(np.max(errors, initial=0.0))
+    return report
+
+
+def is_faithful(report: dict) -> bool:
+    return (
+        report["margin_mismatches"] == 0
+        and report["max_abs_proba_error"] <= PROBA_TOLERANCE
+        and report.get("max_abs_contribution_error", 0.0) <= CONTRIBUTION_TOLERANCE
+    )
+
+
+def _depth(lc: np.ndarray, rc: np.ndarray) -> int:
+    depth, level = 0, [0]
+    while level:
+        level = [c for n in level for c in (lc[n], rc[n]) if c != -1]
+        depth += 1 if level else 0
+    return depth
+
+
+def _parse_base_score(raw: str) -> np.float32:
+    # XGBoost >= 3 writes vector-valued base scores as "[5E-1]".
+    return np.float32(float(str(raw).strip("[]").split(",")[0]))
+
+
+if __name__ == "__main__":
+    # Validate and time the compiled forest against the booster:
+    #   python -m api.forest
+    import time
+
+    try:
+        from api.model import load_or_train_model
+    except ImportError:
+        from model import load_or_train_model
+
+    bundle = load_or_train_model(seed=42)
+    forest = compile_booster(bundle.classifier().get_booster())
+    rows = np.asarray(bundle.shap_background)
+    rng = np.random.default_rng(0)
+    probe = np.vstack([rows, rng.normal(size=(2000, rows.shape[1])) * 3.0])
+    probe[rng.random(probe.shape) < 0.01] = np.nan
+    report = validate(forest, bundle.classifier(), probe)
+    print(f"{forest.n_trees} trees, {forest.feature.shape[0]} nodes, depth {forest.max_depth}")
+    print(f"over {report['rows']} rows: {report['margin_mismatches']} margin mismatches, "
+          f"max |forest - predict_proba| {report['max_abs_proba_error']:.3e}, "
+          f"max |forest - pred_contribs| {report['max_abs_contribution_error']:.3e}")
+
+    from xgboost import DMatrix
+
+    booster = bundle.classifier().get_booster()
+    cases = (
+        ("predict_proba", bundle.classifier().predict_proba),
+        ("forest", forest.predict_proba),
+        ("pred_contribs", lambda X: booster.predict(DMatrix(X.astype(np.float32)), pred_contribs=True)),
+        ("forest_contribs", forest.contributions),
+    )
+    for n in (1, 32, 100, 10000):
+        X = probe[:n]
+        for name, fn in cases:
+            fn(X)
+            t0 = time.perf_counter()
+            reps = 0
+            while time.perf_counter() - t0 < 0.3:
+                fn(X)
+                reps += 1
+            print(f"  rows={n:<6} {name:<16} {(time.perf_counter() - t0) / reps * 1000:.3f} ms")
+    raise SystemExit(0 if is_faithful(report) else 1)
@@ -1,62 +1,177 @@
 from __future__ import annotations
 
+import json
+import os
 import re
-from typing import Tuple
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Tuple
 
 import numpy as np
-import pandas as pd
 
+try:
+    from api.features import CashflowSummary, TransactionColumns, summarize_cashflow
+except ImportError:
+    from features import CashflowSummary, TransactionColumns, summarize_cashflow
 
-def classify_industry_and_profit(df: pd.DataFrame) -> Tuple[str, float, float, float]:
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+DEFAULT_KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "industry_keywords.json")
+
+
+@dataclass
+class IndustryMatch:
+    industry: str
+    factor: float
+    # Keyword occurrences and weighted score for every configured industry.
+    hits: dict[str, int]
+    scores: dict[str, float]
+
+
+class KeywordClassifier:
+    """Weighted keyword dictionary compiled into one regex.
+
+    The keywords are merged into a prefix trie and emitted as a single
+    pattern, so every keyword of every industry is matched in one scan of the
+    descriptions (longest keyword at each position) and the work per
+    character depends on the trie depth rather than the number of keywords.
+
+    Industries in `precedence` win, in that order, as soon as they have any
+    hit (Freelance wins ties because the target product is freelancers).
+    Otherwise an industry's score is the sum of its keyword weights over all
+    occurrences; the highest score wins, ties go to the industry listed
+    first, and no hits at all gives the default industry.
+    """
+
+    def __init__(
+        self,
+        industries: list[tuple[str, float, dict[str, float]]],
+        default: tuple[str, float] = ("Other", 0.10),
+        precedence: Iterable[str] = (),
+    ) -> None:
+        self.names = [name for name, _, _ in industries]
+        self.factors = np.array([factor for _, factor, _ in industries], dtype=float)
+        self.default = default
+        self.precedence = [self.names.index(name) for name in precedence]
+        # keyword -> weight per industry (a keyword may count for several).
+        self._weights: dict[str, np.ndarray] = {}
+        self._members: dict[str, np.ndarray] = {}
+        for i, (_, _, keywords) in enumerate(industries):
+            for kw, weight in keywords.items():
+                kw = kw.lower()
+                if kw not in self._weights:
+                    self._weights[kw] = np.zeros(len(industries))
+                    self._members[kw] = np.zeros(len(industries), dtype=np.int64)
+                self._weights[kw][i] = float(weight)
+                self._members[kw][i] = 1
+        self._pattern = re.compile(_trie_regex(self._weights)) if self._weights else None
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_KEYWORDS_PATH) -> "KeywordClassifier":
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        default = config.get("default", {})
+        return cls(
+            [(ind["name"], float(ind["factor"]), ind["keywords"]) for ind in config["industries"]],
+            default=(default.get("industry", "Other"), float(default.get("factor", 0.10))),
+            precedence=config.get("precedence", []),
+        )
+
+    def classify(self, descriptions: Iterable[str]) -> IndustryMatch:
+        counts = Counter(self._pattern.findall("\n".join(descriptions).lower())) if self._pattern else Counter()
+        hits = np.zeros(len(self.names), dtype=np.int64)
+        scores = np.zeros(len(self.names))
+        for kw, n in counts.items():
+            hits += n * self._members[kw]
+            scores += n * self._weights[kw]
+
+        preferred = [i for i in self.precedence if hits[i] > 0]
+        if preferred:
+            best = preferred[0]
+        elif scores.size and scores.max() > 0:
+            best = int(np.argmax(scores))
+        else:
+            best = None
+        if best is None:
+            industry, factor = self.default
+        else:
+            industry, factor = self.names[best], float(self.factors[best])
+        return IndustryMatch(
+            industry=industry,
+            factor=factor,
+            hits=dict(zip(self.names, hits.tolist())),
+            scores=dict(zip(self.names, scores.tolist())),
+        )
+
+
+def _trie_regex(keywords: Iterable[str]) -> str:
+    # Python's re tries alternatives one by one; factoring shared prefixes
+    # ("ค่าจ้าง|ค่าแปล" -> "ค่า(?:จ้าง|แปล)") keeps matching cheap.
+    trie: dict = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return _trie_node_regex(trie)
+
+
+def _trie_node_regex(node: dict) -> str:
+    branches = [re.escape(ch) + _trie_node_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # A keyword ends here but longer ones continue: optional, greedy.
+        return ("(?:" + body + ")" if len(branches) == 1 else body) + "?"
+    return body
+
+
+_CLASSIFIER: KeywordClassifier | None = None
+
+
+def get_classifier() -> KeywordClassifier:
+    """Process-wide classifier from `CREDITNEXT_INDUSTRY_KEYWORDS` (default `industry_keywords.json`)."""
+
+    global _CLASSIFIER
+    if _CLASSIFIER is None:
+        _CLASSIFIER = KeywordClassifier.from_file(os.environ.get("CREDITNEXT_INDUSTRY_KEYWORDS") or DEFAULT_KEYWORDS_PATH)
+    return _CLASSIFIER
+
+
+def classify_industry_and_profit(
+    df: pd.DataFrame | TransactionColumns, summary: CashflowSummary | None = None
+) -> Tuple[str, float, float, float]:
     """Keyword-based industry classification + proxy net profit.
 
-    Rules:
-    - 'ค่าจ้าง', 'freelance' -> Freelance (factor 0.50)
-    - 'วัตถุดิบ', 'ขายของ' -> Retail (factor 0.20)
+    Industries, factors and weighted keywords come from `industry_keywords.json`
+    (e.g. 'ค่าจ้าง' -> Freelance, factor 0.50; 'ขายของ' -> Retail, factor 0.20).
+
+    Accepts a DataFrame or prebuilt `TransactionColumns`; pass the `summary`
+    already computed for the same columns to avoid a second pass.
 
     Returns: (industry, factor, adjusted_proxy_net_profit, monthly_income_est)
     """
 
-    if df is None or len(df) == 0:
+    cols = df if isinstance(df, TransactionColumns) else TransactionColumns.from_frame(df)
+    if len(cols) == 0:
         return "Unknown", 0.0, 0.0, 0.0
 
-    text = " ".join(df["description"].astype(str).tolist()).lower()
-    freelance_hits = _has_any(text, ["ค่าจ้าง", "freelance"])
-    retail_hits = _has_any(text, ["วัตถุดิบ", "ขายของ"])
-
-    if freelance_hits and not retail_hits:
-        industry, factor = "Freelance", 0.50
-    elif retail_hits and not freelance_hits:
-        industry, factor = "Retail", 0.20
-    elif freelance_hits and retail_hits:
-        industry, factor = "Freelance", 0.50
-    else:
-        industry, factor = "Other", 0.10
+    industry, factor = classify_industry(cols.description)
 
-    income = float(df.loc[df["type"] == "Income", "amount"].sum())
-    expense = float(df.loc[df["type"] == "Expense", "amount"].sum())
-    proxy_net_profit = income - expense
-
-    monthly_income_est = _estimate_monthly_income(df, income)
+    if summary is None:
+        summary = summarize_cashflow(cols)
+    proxy_net_profit = summary.income - summary.expense
 
     adjusted_profit = float(proxy_net_profit * (1.0 + factor))
-    return industry, factor, adjusted_profit, monthly_income_est
-
+    return industry, factor, adjusted_profit, summary.monthly_income_est()
 
-def _has_any(text: str, keywords: list[str]) -> bool:
-    for kw in keywords:
-        if re.search(re.escape(kw.lower()), text):
-            return True
-    return False
 
+def classify_industry(descriptions: list[str]) -> Tuple[str, float]:
+    """(industry, factor) from transaction descriptions."""
 
-def _estimate_monthly_income(df: pd.DataFrame, income_sum: float) -> float:
-    d = df.copy()
-    d["date"] = pd.to_datetime(d["date"], errors="coerce")
-    d = d.dropna(subset=["date"])
-    if len(d) == 0:
-        return float(income_sum)
+    match = get_classifier().classify(descriptions)
+    return match.industry, match.factor
 
-    days = max(int((d["date"].max() - d["date"].min()).days), 1)
-    scaled = float(income_sum) * (30.0 / float(days))
-    return float(np.clip(scaled, 0.0, 1e9))
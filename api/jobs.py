@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+try:
+    from api.log import get_logger
+    from api.ocr import merge_page_transactions
+except ImportError:
+    from log import get_logger
+    from ocr import merge_page_transactions
+
+
+logger = get_logger("jobs")
+
+DEFAULT_JOB_TTL_SECONDS = 3600
+TERMINAL_STATUSES = ("done", "failed")
+
+# runner(upload, filename, password, bank, on_page) -> /ocr response dict. `upload`
+# only needs `close()` here (the API passes a spooled temp file): the runner closes
+# it, and `JobManager.stop` closes those of jobs that never reached a runner.
+JobRunner = Callable[..., Awaitable[dict[str, Any]]]
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by `JobManager.submit` when the backlog is at capacity."""
+
+
+class MemoryJobStore:
+    """In-process job state; finished jobs are dropped after `ttl_seconds`."""
+
+    def __init__(self, ttl_seconds: float = DEFAULT_JOB_TTL_SECONDS) -> None:
+        self.ttl_seconds = ttl_seconds
+        # job_id -> (status, updated_at, serialized job)
+        self._jobs: dict[str, tuple[str, float, str]] = {}
+
+    async def save(self, job: dict[str, Any]) -> None:
+        self._evict()
+        # Stored serialized so readers always get a consistent snapshot.
+        self._jobs[job["job_id"]] = (job["status"], job["updated_at"], json.dumps(job, ensure_ascii=False))
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        entry = self._jobs.get(job_id)
+        return json.loads(entry[2]) if entry is not None else None
+
+    def _evict(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for job_id, (status, updated_at, _) in list(self._jobs.items()):
+            if status in TERMINAL_STATUSES and updated_at < cutoff:
+                del self._jobs[job_id]
+
+
+class RedisJobStore:
+    """Job state in any Redis-compatible server, shared by every API worker.
+
+    Only state lives here; queued uploads (and their passwords) stay in the
+    accepting process's memory.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float = DEFAULT_JOB_TTL_SECONDS, prefix: str = "creditnext:job:") -> None:
+        import redis.asyncio as redis
+
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+
+    async def save(self, job: dict[str, Any]) -> None:
+        await self._redis.set(self.prefix + job["job_id"], json.dumps(job, ensure_ascii=False), ex=int(self.ttl_seconds))
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        raw = await self._redis.get(self.prefix + job_id)
+        return json.loads(raw) if raw is not None else None
+
+
+class JobManager:
+    """Background OCR jobs: bounded in-process queue drained by worker tasks.
+
+    Each job records per-page progress and the transactions of completed
+    pages (merged in page order) as they arrive, so clients can poll or
+    stream partial results long before the whole document is done.
+    """
+
+    def __init__(self, runner: JobRunner, store=None, workers: int = 2, max_queued: int = 64) -> None:
+        self.runner = runner
+        self.store = store or MemoryJobStore()
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel the workers, then fail every job still queued and remove its upload."""
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            job, upload, *_ = self._queue.get_nowait()
+            self._queue.task_done()
+            upload.close()
+            job["status"] = "failed"
+            job["error"] = "Server shut down before the job started"
+            await self._save_quietly(job)
+
+    async def submit(self, upload: Any, filename: str, password: str | None, bank: str | None) -> dict[str, Any]:
+        if self._queue is None:
+            await self.start()
+        if self._queue.full():
+            raise JobQueueFull(f"{self._queue.qsize()} OCR jobs already queued")
+
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "filename": filename,
+            "created_at": now,
+            "updated_at": now,
+            "version": 0,
+            "pages_total": None,
+            "pages_done": 0,
+            "pages": [],
+            "transactions": [],
+            "error": None,
+        }
+        await self.store.save(job)
+        self._queue.put_nowait((job, upload, filename, password, bank))
+        return job
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        return await self.store.get(job_id)
+
+    async def events(self, job_id: str, interval: float = 0.5) -> AsyncIterator[str]:
+        """Server-sent events: a `progress` event per job change, then `done`/`failed`."""
+
+        last_version = None
+        while True:
+            job = await self.store.get(job_id)
+            if job is None:
+                yield _sse("error", {"job_id": job_id, "error": "Job not found"})
+                return
+            if job["version"] != last_version:
+                last_version = job["version"]
+                event = job["status"] if job["status"] in TERMINAL_STATUSES else "progress"
+                yield _sse(event, job)
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(interval)
+
+    async def _worker(self) -> None:
+        while True:
+            job, upload, filename, password, bank = await self._queue.get()
+            try:
+                await self._run(job, upload, filename, password, bank)
+            except Exception:
+                # Typically the store (Redis unreachable): lose this job's state, not the worker.
+                logger.exception("OCR job could not be saved", extra={"job_id": job["job_id"]})
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: dict[str, Any], upload: Any, filename: str, password: str | None, bank: str | None) -> None:
+        page_txns: dict[int, list[dict[str, Any]]] = {}
+        # Pages finish concurrently; serialize saves so a slow write can't overwrite a newer one.
+        lock = asyncio.Lock()
+
+        async def on_page(info: dict[str, Any], txns: list[dict[str, Any]], page_count: int) -> None:
+            async with lock:
+                page_txns[info["page"]] = txns
+                job["pages_total"] = page_count
+                job["pages_done"] = len(page_txns)
+                job["pages"] = sorted(job["pages"] + [info], key=lambda p: p["page"])
+                job["transactions"] = merge_page_transactions([page_txns[p] for p in sorted(page_txns)])
+                await self._save_quietly(job)
+
+        # Progress saves are best-effort; the runner always gets the upload, so it is closed.
+        job["status"] = "running"
+        await self._save_quietly(job)
+        try:
+            result = await self.runner(upload, filename, password, bank, on_page=on_page)
+        except asyncio.CancelledError:
+            job["status"] = "failed"
+            job["error"] = "Server shut down before the job finished"
+            await self._save_quietly(job)
+            raise
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        else:
+            if result.get("error"):
+                job["status"] = "failed"
+                job["error"] = result["error"]
+            else:
+                job["status"] = "done"
+                job["transactions"] = result.get("transactions", [])
+                if result.get("pages") is not None:
+                    job["pages"] = result["pages"]
+                    job["pages_total"] = job["pages_done"] = len(result["pages"])
+        async with lock:
+            await self._save(job)
+
+    async def _save(self, job: dict[str, Any]) -> None:
+        job["version"] += 1
+        job["updated_at"] = time.time()
+        await self.store.save(job)
+
+    async def _save_quietly(self, job: dict[str, Any]) -> None:
+        try:
+            await self._save(job)
+        except Exception:
+            logger.warning("Saving OCR job state failed", exc_info=True, extra={"job_id": job["job_id"]})
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def job_store_from_env():
+    """`RedisJobStore` when `CREDITNEXT_REDIS_URL` is set, else in-process."""
+
+    ttl = float(os.environ.get("CREDITNEXT_JOB_TTL_SECONDS", DEFAULT_JOB_TTL_SECONDS))
+    url = os.environ.get("CREDITNEXT_REDIS_URL", "").strip()
+    if url:
+        return RedisJobStore(url, ttl_seconds=ttl)
+    return MemoryJobStore(ttl_seconds=ttl)
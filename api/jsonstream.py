@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+
+class ArrayItemStreamParser:
+    """Incrementally pull the items of one top-level array out of streamed JSON.
+
+    Feed it raw text chunks of a document shaped like `{"<key>": [{...}, ...]}`
+    (e.g. LLM tokens); `feed` returns every array element whose closing brace
+    has arrived, parsed. It tracks string/escape state and nesting depth, so
+    braces inside descriptions or nested objects are handled, and it only
+    buffers the element currently being received.
+    """
+
+    def __init__(self, key: str = "transactions") -> None:
+        self.key = key
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start: int | None = None
+        self._last_key: str | None = None
+        self._array_depth: int | None = None
+        self._item_start: int | None = None
+        self.done = False
+
+    def feed(self, chunk: str) -> list[Any]:
+        items: list[Any] = []
+        if self.done or not chunk:
+            return items
+        self._buf += chunk
+        buf = self._buf
+
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._string_start is not None:
+                        try:
+                            self._last_key = json.loads(buf[self._string_start : i + 1])
+                        except ValueError:
+                            self._last_key = None
+                    self._string_start = None
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i if self._depth == 1 else None
+            elif c in "{[":
+                if c == "[" and self._depth == 1 and self._last_key == self.key and self._array_depth is None:
+                    self._array_depth = self._depth + 1
+                elif c == "{" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._item_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if c == "}" and self._depth == self._array_depth and self._item_start is not None:
+                        try:
+                            items.append(json.loads(buf[self._item_start : i + 1]))
+                        except ValueError:
+                            pass
+                        self._item_start = None
+                    elif c == "]" and self._depth == self._array_depth - 1:
+                        self.done = True
+                        break
+            elif c == "," and self._depth == 1:
+                self._last_key = None
+            i += 1
+
+        # Drop everything already consumed unless an element or key is still open.
+        keep_from = min(p for p in (self._item_start, self._string_start, i) if p is not None)
+        self._buf = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._item_start is not None:
+            self._item_start -= keep_from
+        if self._string_start is not None:
+            self._string_start -= keep_from
+        return items
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import time
+
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, any `extra=` fields, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging() -> None:
+    """Route the `api` loggers to stderr.
+
+    `CREDITNEXT_LOG_LEVEL` (default INFO) and `CREDITNEXT_LOG_FORMAT`
+    (`json`, default, or `text`). Safe to call more than once.
+    """
+
+    root = logging.getLogger("creditnext")
+    level = os.environ.get("CREDITNEXT_LOG_LEVEL", "INFO").upper()
+    root.setLevel(level)
+    if any(getattr(h, "_creditnext", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if os.environ.get("CREDITNEXT_LOG_FORMAT", "json").strip().lower() == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    handler._creditnext = True
+    root.addHandler(handler)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the `creditnext` hierarchy, e.g. `get_logger("ocr")`."""
+
+    return logging.getLogger(f"creditnext.{name}")
@@ -1,27 +1,65 @@
 from __future__ import annotations
 
 from typing import Any, Literal
+from contextlib import ExitStack
+import asyncio
+import json
 import sys
 import os
+import threading
+import time
 
 # Add api folder to path for Vercel serverless
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import numpy as np
-import pandas as pd
-from fastapi import FastAPI, File, UploadFile, Form
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 try:
+    from api.features import TransactionColumns, build_features, summarize_cashflow
     from api.industry import classify_industry_and_profit
-    from api.model import ModelBundle, score_and_explain, train_model
-    from api.ocr import mock_typhoon_ocr, real_openai_ocr_to_transactions
+    from api.explain import EXPLAIN_LEVELS
+    from api.model import ModelBundle, load_or_train_model, score_and_explain, score_and_explain_batch
+    from api.executor import ExecutorSaturated, get_cpu_executor, shutdown_cpu_executor
+    from api.jobs import JobManager, JobQueueFull, job_store_from_env
+    from api.log import configure_logging, get_logger
+    from api import metrics
+    from api import tracing
+    from api.ocr import (
+        PdfPasswordError,
+        decrypt_pdf,
+        mock_typhoon_ocr,
+        real_openai_ocr_to_transactions,
+        real_openai_pdf_to_transactions,
+    )
+    from api.upstream import shutdown_upstream, startup_upstream
+    from api.uploads import MAX_UPLOAD_BYTES, SpooledUpload, UploadTooLarge, spool_upload
 except ImportError:
+    from features import TransactionColumns, build_features, summarize_cashflow
     from industry import classify_industry_and_profit
-    from model import ModelBundle, score_and_explain, train_model
-    from ocr import mock_typhoon_ocr, real_openai_ocr_to_transactions
+    from explain import EXPLAIN_LEVELS
+    from model import ModelBundle, load_or_train_model, score_and_explain, score_and_explain_batch
+    from executor import ExecutorSaturated, get_cpu_executor, shutdown_cpu_executor
+    from jobs import JobManager, JobQueueFull, job_store_from_env
+    from log import configure_logging, get_logger
+    import metrics
+    import tracing
+    from ocr import (
+        PdfPasswordError,
+        decrypt_pdf,
+        mock_typhoon_ocr,
+        real_openai_ocr_to_transactions,
+        real_openai_pdf_to_transactions,
+    )
+    from upstream import shutdown_upstream, startup_upstream
+    from uploads import MAX_UPLOAD_BYTES, SpooledUpload, UploadTooLarge, spool_upload
+
 
+configure_logging()
+logger = get_logger("api")
 
 app = FastAPI(title="CreditNext API", version="1.0.0")
 
@@ -38,16 +76,93 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"] ,
     allow_headers=["*"] ,
+    expose_headers=["Server-Timing", "traceparent"],
 )
 
 
 MODEL: ModelBundle | None = None
+JOBS: JobManager | None = None
+
+
+# Multipart framing on top of the file itself.
+_UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+
+@app.middleware("http")
+async def _limit_upload_size(request: Request, call_next):
+    # Reject oversized uploads from Content-Length before the body is read;
+    # chunked uploads are cut off by `spool_upload` instead. Registered before
+    # the metrics middleware, so it runs inside it and 413s are counted.
+    length = request.headers.get("content-length")
+    if request.method == "POST" and request.url.path.startswith("/ocr") and length and length.isdigit():
+        if int(length) > MAX_UPLOAD_BYTES + _UPLOAD_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413, content={"detail": f"Upload is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}
+            )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def _record_request_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    with tracing.start_request(f"{request.method} {request.url.path}", request.headers.get("traceparent")) as root:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            # Streaming bodies are still running here: their timing covers time to headers.
+            response.headers["Server-Timing"] = tracing.server_timing(root)
+            response.headers["traceparent"] = root.traceparent()
+            return response
+        finally:
+            # Label by route template, not raw path, so job ids don't explode cardinality.
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            root.name = f"{request.method} {route}"
+            root.attributes.update({"http.method": request.method, "http.route": route, "http.status_code": status})
+            metrics.HTTP_REQUESTS.labels(route, request.method, status).inc()
+            metrics.HTTP_SECONDS.labels(route).observe(time.perf_counter() - t0)
 
 
 @app.on_event("startup")
-def _startup() -> None:
-    global MODEL
-    MODEL = train_model(seed=42)
+async def _startup() -> None:
+    global MODEL, JOBS
+    MODEL = load_or_train_model(seed=42)
+    JOBS = JobManager(
+        runner=_run_ocr_job,
+        store=job_store_from_env(),
+        workers=int(os.environ.get("CREDITNEXT_JOB_WORKERS", "2")),
+        max_queued=int(os.environ.get("CREDITNEXT_JOB_QUEUE_SIZE", "64")),
+    )
+    await JOBS.start()
+    if os.environ.get("CREDITNEXT_PRELOAD", "0") == "1":
+        # The upstream client is bound to this loop, so it is built here, not in the thread.
+        await startup_upstream()
+        threading.Thread(target=_preload, name="creditnext-preload", daemon=True).start()
+
+
+def _preload() -> None:
+    """Import the lazily loaded stacks ahead of the first request (long-running servers).
+
+    Off by default so cold starts stay lean; requests that arrive first simply
+    wait on the same imports.
+    """
+
+    t0 = time.perf_counter()
+    try:
+        MODEL.classifier()
+        import pandas  # noqa: F401
+    except Exception:
+        logger.warning("Preload failed", exc_info=True)
+        return
+    logger.info("Preload done", extra={"seconds": round(time.perf_counter() - t0, 3)})
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    if JOBS is not None:
+        await JOBS.stop()
+    shutdown_cpu_executor()
+    await shutdown_upstream()
 
 
 class Transaction(BaseModel):
@@ -61,49 +176,54 @@ class AnalyzeRequest(BaseModel):
     transactions: list[Transaction]
 
 
+# `explain` query parameter of /analyze: none = score only, fast = XGBoost
+# pred_contribs (path-dependent TreeSHAP), full = shap.Explainer (interventional).
+ExplainLevel = Literal["none", "fast", "full"]
+
+
 class AnalyzeResponse(BaseModel):
     industry: str
     industry_factor: float
     proxy_net_profit: float
     monthly_income_est: float
     features: dict[str, float]
-    credit_score: int
-    risk_grade: str
-    recommended_loan_amount: float
-    shap: dict[str, Any]
-
-
-def _transactions_to_features(df: pd.DataFrame, industry_factor: float, proxy_net_profit: float) -> dict[str, float]:
-    income = float(df.loc[df["type"] == "Income", "amount"].sum())
-    expense = float(df.loc[df["type"] == "Expense", "amount"].sum())
-    total = max(income + expense, 1.0)
-    expense_ratio = float(expense / total)
-
-    df_day = df.copy()
-    df_day["date"] = pd.to_datetime(df_day["date"], errors="coerce")
-    df_day = df_day.dropna(subset=["date"])
-    if len(df_day) == 0:
-        consistency = 0.5
-    else:
-        df_day["signed_amount"] = np.where(df_day["type"] == "Income", df_day["amount"], -df_day["amount"])
-        daily = df_day.groupby(df_day["date"].dt.date)["signed_amount"].sum()
-        if len(daily) <= 1:
-            consistency = 0.7
-        else:
-            vol = float(np.std(daily.values))
-            avg = float(np.mean(np.abs(daily.values)))
-            consistency = float(1.0 - (vol / (avg + 1e-6)))
-            consistency = float(np.clip(consistency, 0.0, 1.0))
-
-    cashflow_strength = float(np.log1p(max(proxy_net_profit, 0.0)))
-
-    return {
-        "expense_ratio": expense_ratio,
-        "consistency": consistency,
-        "industry_factor": float(industry_factor),
-        "proxy_net_profit": float(proxy_net_profit),
-        "cashflow_strength": cashflow_strength,
-    }
+    # Omitted with features_only=true.
+    credit_score: int | None = None
+    risk_grade: str | None = None
+    recommended_loan_amount: float | None = None
+    p_default: float | None = None
+    # Omitted with explain=none or features_only=true.
+    shap: dict[str, Any] | None = None
+
+
+class BatchAnalyzeRequest(BaseModel):
+    applicants: list[AnalyzeRequest]
+
+
+class BatchAnalyzeResponse(BaseModel):
+    results: list[AnalyzeResponse]
+
+
+def _transactions_to_columns(transactions: list[Transaction]) -> TransactionColumns:
+    return TransactionColumns.from_columns(
+        [t.date for t in transactions],
+        [t.description for t in transactions],
+        [t.amount for t in transactions],
+        [t.type for t in transactions],
+    )
+
+
+def _statement_features(transactions: list[Transaction]) -> tuple[str, float, float, float, dict[str, float]]:
+    """(industry, factor, proxy_net_profit, monthly_income_est, features) for one statement.
+
+    Shared by `/analyze` and `/analyze/batch`, so an applicant's features never
+    depend on who else is in the batch (dates are parsed per statement).
+    """
+
+    cols = _transactions_to_columns(transactions)
+    summary = summarize_cashflow(cols)
+    industry, factor, profit, monthly_income = classify_industry_and_profit(cols, summary)
+    return industry, factor, profit, monthly_income, build_features(summary, factor, profit)
 
 
 def _score_to_grade(score: int) -> str:
@@ -131,112 +251,317 @@ def health() -> dict:
     return {"ok": True}
 
 
+@app.get("/metrics")
+def metrics_endpoint() -> PlainTextResponse:
+    """Prometheus text format: stage latencies, fallbacks, cache and upstream counters."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post("/ocr")
 async def ocr(
     file: UploadFile = File(...),
     password: str | None = Form(None),
     bank: str | None = Form(None),
 ) -> dict:
-    content = await file.read()
-    
-    # Handle PDF
-    if file.filename.lower().endswith(".pdf"):
+    upload = await _spool(file)
+    try:
+        with get_cpu_executor().admit():
+            return await _ocr_document(upload, password, bank)
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="OCR workers are busy, please retry shortly.",
+            headers={"Retry-After": "5"},
+        )
+    finally:
+        upload.close()
+
+
+async def _spool(file: UploadFile) -> SpooledUpload:
+    try:
+        return await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.post("/ocr/stream")
+async def ocr_stream(
+    file: UploadFile = File(...),
+    password: str | None = Form(None),
+    bank: str | None = Form(None),
+) -> StreamingResponse:
+    """Like `/ocr`, but streams NDJSON events while the document is processed.
+
+    One `transaction` event per transaction as the LLM emits it, a `page`
+    event per finished page, then a final `done` event carrying the same body
+    `/ocr` would return (or an `error` event). Clients should treat `done` as
+    authoritative: it is de-duplicated across pages and may differ from the
+    streamed rows when the pipeline falls back to mock data.
+    """
+    upload = await _spool(file)
+    admission = ExitStack()
+    # The temp file lives exactly as long as the admission slot: until the stream ends.
+    admission.callback(upload.close)
+    try:
+        admission.enter_context(get_cpu_executor().admit())
+    except ExecutorSaturated:
+        admission.close()
+        raise HTTPException(
+            status_code=503,
+            detail="OCR workers are busy, please retry shortly.",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        _ocr_events(admission, upload, password, bank),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _ocr_events(admission: ExitStack, upload: SpooledUpload, password: str | None, bank: str | None):
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def on_transaction(page: int, txn: dict) -> None:
+        await events.put({"event": "transaction", "page": page, **txn})
+
+    async def on_page(info: dict, txns: list[dict], page_count: int) -> None:
+        await events.put({"event": "page", "pages_total": page_count, **info})
+
+    async def run() -> None:
+        try:
+            result = await _ocr_document(upload, password, bank, on_page=on_page, on_transaction=on_transaction)
+            await events.put({"event": "error" if result.get("error") else "done", **result})
+        except Exception as e:
+            await events.put({"event": "error", "error": str(e)})
+
+    with admission:
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+                if event["event"] in ("done", "error"):
+                    return
+        finally:
+            # Client went away mid-stream: stop the pipeline rather than finish unseen work.
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+@app.post("/ocr/jobs")
+async def create_ocr_job(
+    file: UploadFile = File(...),
+    password: str | None = Form(None),
+    bank: str | None = Form(None),
+) -> dict:
+    """Queue an upload for background OCR; poll `/ocr/jobs/{id}` or stream `/events`."""
+    upload = await _spool(file)
+    try:
+        # Queued jobs hold their upload on disk, not in memory; the runner deletes it.
+        job = await _jobs().submit(upload, upload.filename, password, bank)
+    except JobQueueFull:
+        upload.close()
+        raise HTTPException(
+            status_code=503,
+            detail="OCR job queue is full, please retry shortly.",
+            headers={"Retry-After": "5"},
+        )
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+
+@app.get("/ocr/jobs/{job_id}")
+async def get_ocr_job(job_id: str) -> dict:
+    job = await _jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/ocr/jobs/{job_id}/events")
+async def stream_ocr_job(job_id: str) -> StreamingResponse:
+    if await _jobs().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _jobs().events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _jobs() -> JobManager:
+    global JOBS
+    if JOBS is None:
+        JOBS = JobManager(runner=_run_ocr_job, store=job_store_from_env())
+    return JOBS
+
+
+async def _run_ocr_job(
+    upload: SpooledUpload, filename: str, password: str | None, bank: str | None, on_page=None
+) -> dict:
+    # Jobs are already queued, so wait for CPU capacity instead of failing with 503.
+    try:
+        while True:
+            try:
+                with get_cpu_executor().admit():
+                    return await _ocr_document(upload, password, bank, on_page=on_page)
+            except ExecutorSaturated:
+                await asyncio.sleep(0.5)
+    finally:
+        upload.close()
+
+
+async def _ocr_document(
+    upload: SpooledUpload,
+    password: str | None,
+    bank: str | None,
+    on_page=None,
+    on_transaction=None,
+) -> dict:
+    filename = upload.filename
+    pdf_path = None
+    page_count = 0
+
+    # Handle PDF: decrypt (if needed) in the CPU executor, off the event loop.
+    # Only paths cross the process boundary; pages are read from disk one at a time.
+    if upload.is_pdf:
         try:
-            import io
-            from pypdf import PdfReader, PdfWriter
-            from pdf2image import convert_from_bytes
-            
-            # 1. Decrypt if needed
-            pdf_file = io.BytesIO(content)
-            reader = PdfReader(pdf_file)
-            
-            if reader.is_encrypted:
-                if not password:
-                    return {"error": "PDF is encrypted. Please provide a password."}
-                if not reader.decrypt(password):
-                    return {"error": "Invalid password."}
-            
-            # 2. Convert PDF to images for OpenAI Vision
-            # OpenAI Vision API requires images, not PDF
-            output = io.BytesIO()
-            writer = PdfWriter()
-            for page in reader.pages:
-                writer.add_page(page)
-            writer.write(output)
-            decrypted_pdf_bytes = output.getvalue()
-            
-            # Convert to images
-            images = convert_from_bytes(decrypted_pdf_bytes)
-            
-            # Convert first image to bytes
-            import io as io2
-            img_bytes = io2.BytesIO()
-            images[0].save(img_bytes, format='PNG')
-            content = img_bytes.getvalue()
-            
-            print(f"[DEBUG] Converted PDF to {len(images)} images, using first page")
-            
+            with metrics.stage("decrypt"):
+                pdf_path, page_count = await get_cpu_executor().run(
+                    decrypt_pdf, upload.path, password, upload.scratch_path("decrypted.pdf")
+                )
+        except PdfPasswordError as e:
+            return {"error": str(e)}
         except Exception as e:
             return {"error": f"Failed to process PDF: {str(e)}"}
 
     # If `OPENAI_API_KEY` is configured, run real OCR->LLM extraction.
     # Otherwise fall back to deterministic mock transactions.
     txns = None
+    pages = None
     
     api_key = os.environ.get("OPENAI_API_KEY")
-    print(f"[DEBUG] OPENAI_API_KEY present: {bool(api_key)}")
-    if api_key:
-        print(f"[DEBUG] API key value: {api_key[:20]}...")
+    fallback_reason = "no_api_key"
+    used_mock = False
     
-    if api_key:
+    if api_key or pdf_path is not None:
+        fallback_reason = "no_transactions"
         try:
-            print(f"[DEBUG] Calling real_openai_ocr_to_transactions with {len(content)} bytes, bank={bank}")
-            txns = await real_openai_ocr_to_transactions(content, bank=bank)
-            print(f"[DEBUG] Got {len(txns) if txns else 0} transactions from real OCR")
-        except Exception as e:
-            # Log the error for debugging
-            print(f"ERROR in real_openai_ocr_to_transactions: {e}")
-            import traceback
-            traceback.print_exc()
+            if pdf_path is not None:
+                # Without a key only text-layer pages are parsed (heuristically).
+                txns, pages = await real_openai_pdf_to_transactions(
+                    pdf_path,
+                    page_count,
+                    bank=bank,
+                    on_page=on_page,
+                    on_transaction=on_transaction,
+                    digest=upload.digest,
+                )
+            else:
+                txns = await real_openai_ocr_to_transactions(
+                    upload.read_bytes(), bank=bank, on_transaction=on_transaction
+                )
+        except Exception:
+            logger.exception("Real OCR pipeline failed", extra={"upload": filename, "pages": page_count})
+            fallback_reason = "pipeline_error"
             txns = None
 
     if not txns:
         # Mock OCR doesn't work well with PDF bytes (hash might be weird), 
         # but it will return *something*.
-        print("WARNING: Falling back to mock OCR")
-        txns = mock_typhoon_ocr(content)
+        logger.warning("Falling back to mock OCR", extra={"reason": fallback_reason, "upload": filename})
+        metrics.OCR_FALLBACKS.labels(fallback_reason).inc()
+        txns = mock_typhoon_ocr(b"", digest=upload.digest)
+        used_mock = True
     
-    print(f"[DEBUG] Returning {len(txns)} transactions to client")
-    return {"transactions": txns}
+    logger.info("OCR done", extra={"upload": filename, "pages": page_count, "transactions": len(txns), "mock": used_mock})
+    result: dict[str, Any] = {"transactions": txns}
+    if pages is not None:
+        result["pages"] = pages
+    return result
+
+
+@app.post("/analyze", response_model=AnalyzeResponse, response_model_exclude_none=True)
+def analyze(
+    req: AnalyzeRequest, explain: ExplainLevel | None = None, features_only: bool = False
+) -> AnalyzeResponse:
+    """Features, score and explanation for one statement.
+
+    `explain` defaults to `CREDITNEXT_SHAP_MODE`; `features_only=true` skips the model.
+    """
+
+    with metrics.stage("features"):
+        industry, factor, profit, monthly_income, features = _statement_features(req.transactions)
+
+    if features_only:
+        return _to_response(industry, factor, profit, monthly_income, features, None)
+
+    scored = score_and_explain(_model(), features, mode=_shap_mode(explain))
+    return _to_response(industry, factor, profit, monthly_income, features, scored)
+
+
+@app.post("/analyze/batch", response_model=BatchAnalyzeResponse, response_model_exclude_none=True)
+def analyze_batch(
+    req: BatchAnalyzeRequest, explain: ExplainLevel | None = None, features_only: bool = False
+) -> BatchAnalyzeResponse:
+    """Score many applicants with one model/SHAP call; same options and results as `/analyze`.
+
+    Features are computed per applicant with the same code as `/analyze`; only
+    the model call is batched.
+    """
 
+    with metrics.stage("features"):
+        computed = [_statement_features(applicant.transactions) for applicant in req.applicants]
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-def analyze(req: AnalyzeRequest) -> AnalyzeResponse:
+    if not computed:
+        return BatchAnalyzeResponse(results=[])
+    if features_only:
+        scored = [None] * len(computed)
+    else:
+        scored = score_and_explain_batch(_model(), [c[4] for c in computed], mode=_shap_mode(explain))
+
+    return BatchAnalyzeResponse(results=[_to_response(*c, s) for c, s in zip(computed, scored)])
+
+
+def _model() -> ModelBundle:
     global MODEL
     if MODEL is None:
-        MODEL = train_model(seed=42)
+        MODEL = load_or_train_model(seed=42)
+    return MODEL
 
-    df = pd.DataFrame([t.model_dump() for t in req.transactions])
 
-    industry, factor, profit, monthly_income = classify_industry_and_profit(df)
-    features = _transactions_to_features(df, factor, profit)
+def _shap_mode(explain: ExplainLevel | None) -> str | None:
+    # None keeps the server default (CREDITNEXT_SHAP_MODE).
+    return EXPLAIN_LEVELS[explain] if explain is not None else None
 
-    scored = score_and_explain(MODEL, features)
-    credit_score = int(scored["credit_score"])
-    grade = _score_to_grade(credit_score)
 
-    return AnalyzeResponse(
+def _to_response(
+    industry: str,
+    factor: float,
+    profit: float,
+    monthly_income: float,
+    features: dict[str, float],
+    scored: dict | None,
+) -> AnalyzeResponse:
+    response = AnalyzeResponse(
         industry=industry,
         industry_factor=float(factor),
         proxy_net_profit=float(profit),
         monthly_income_est=float(monthly_income),
         features={k: float(v) for k, v in features.items()},
-        credit_score=credit_score,
-        risk_grade=grade,
-        recommended_loan_amount=_recommended_loan(float(monthly_income), grade),
-        shap={
-            "base_value": float(scored.get("base_value", 0.0)),
-            "contributions": scored.get("contributions", {}),
-            "p_default": float(scored.get("p_default", 0.0)),
-        },
     )
+    if scored is None:
+        return response
+
+    credit_score = int(scored["credit_score"])
+    grade = _score_to_grade(credit_score)
+    response.credit_score = credit_score
+    response.risk_grade = grade
+    response.recommended_loan_amount = _recommended_loan(float(monthly_income), grade)
+    response.p_default = float(scored["p_default"])
+    if "contributions" in scored:
+        response.shap = {
+            "base_value": float(scored["base_value"]),
+            "contributions": scored["contributions"],
+            "p_default": float(scored["p_default"]),
+        }
+    return response
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    from api.tracing import record_span, span
+except ImportError:
+    from tracing import record_span, span
+
+
+# Seconds; spans sub-millisecond scoring up to multi-second OCR/LLM calls.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_REGISTRY: list["_Metric"] = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def labels(self, *values: object):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_str(self, key: tuple[str, ...], extra: tuple[tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> list[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_child(self, key, child) -> list[str]:
+        return [f"{self.name}{self._label_str(key)} {_fmt(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if i < len(self.counts):
+                self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_child(self, key, child) -> list[str]:
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{self._label_str(key, (('le', _fmt(bound)),))} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._label_str(key, (('le', '+Inf'),))} {count}")
+        lines.append(f"{self.name}_sum{self._label_str(key)} {_fmt(total)}")
+        lines.append(f"{self.name}_count{self._label_str(key)} {count}")
+        return lines
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- CreditNext metrics -------------------------------------------------------
+# Per process: with several uvicorn workers each exposes its own series, so
+# scrape every worker (or run one worker per container).
+
+STAGE_SECONDS = Histogram(
+    "creditnext_stage_seconds",
+    "Duration of each OCR/scoring pipeline stage.",
+    ("stage",),
+)
+HTTP_REQUESTS = Counter(
+    "creditnext_http_requests_total",
+    "HTTP requests by route template, method and status.",
+    ("route", "method", "status"),
+)
+HTTP_SECONDS = Histogram(
+    "creditnext_http_request_seconds",
+    "HTTP request latency by route template.",
+    ("route",),
+)
+OCR_FALLBACKS = Counter(
+    "creditnext_ocr_mock_fallback_total",
+    "Uploads answered with mock_typhoon_ocr transactions, by reason.",
+    ("reason",),
+)
+SHAP_FALLBACKS = Counter(
+    "creditnext_shap_fallback_total",
+    "Scoring calls that fell back to simulated contributions, by SHAP mode.",
+    ("mode",),
+)
+CACHE_LOOKUPS = Counter(
+    "creditnext_cache_lookups_total",
+    "OCR result cache lookups by table and result (hit/miss).",
+    ("table", "result"),
+)
+RECONCILE_RESULTS = Counter(
+    "creditnext_balance_reconcile_total",
+    "LLM-extracted chunks by running-balance check outcome (ok/repaired/retried/failed/unchecked).",
+    ("result",),
+)
+UPSTREAM_RESPONSES = Counter(
+    "creditnext_upstream_responses_total",
+    "OCR/LLM provider attempts by host and status code (or transport_error/circuit_open).",
+    ("host", "status"),
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into `creditnext_stage_seconds{stage=name}` and a trace span of the same name."""
+
+    t0 = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - t0)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage timed elsewhere (e.g. inside a CPU executor worker)."""
+
+    STAGE_SECONDS.labels(name).observe(seconds)
+    record_span(name, seconds * 1000.0)
@@ -1,20 +1,122 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
 
 import numpy as np
 
+try:
+    from api.explain import (
+        build_interventional_explainer,
+        forest_contributions,
+        interventional_contributions,
+        SHAP_MODES,
+        shap_mode,
+        tree_contributions,
+        TreeExplanation,
+    )
+    from api.forest import FOREST_FILE, CompiledForest, compile_booster, is_faithful, validate
+    from api.log import get_logger
+    from api.metrics import SHAP_FALLBACKS, stage
+except ImportError:
+    from explain import (
+        build_interventional_explainer,
+        forest_contributions,
+        interventional_contributions,
+        SHAP_MODES,
+        shap_mode,
+        tree_contributions,
+        TreeExplanation,
+    )
+    from forest import FOREST_FILE, CompiledForest, compile_booster, is_faithful, validate
+    from log import get_logger
+    from metrics import SHAP_FALLBACKS, stage
+
+
+logger = get_logger("model")
+
+
+# Bump whenever the on-disk layout below changes; older artifacts are retrained.
+# 3: forest.npz carries node covers for path-dependent SHAP.
+MODEL_FORMAT_VERSION = 3
+
+# Above this many rows an already-loaded booster predicts faster than the forest
+# (NumPy gathers grow with rows x trees; XGBoost's C++ loop does not pay per call).
+FOREST_MAX_BATCH = 32
+
+MANIFEST_FILE = "manifest.json"
+BOOSTER_FILE = "booster.ubj"
+BACKGROUND_FILE = "background.npy"
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "credit_model")
+
+
+class ModelArtifactError(ValueError):
+    """Raised when a model artifact is missing pieces, stale or corrupted."""
+
 
 @dataclass
 class ModelBundle:
-    model: object
+    # XGBClassifier; None until `classifier()` parses `booster_raw` (keeps xgboost out of startup).
+    model: object | None
     scaler: object
     feature_order: list[str]
     shap_explainer: object | None
     X_background: np.ndarray
+    metadata: dict = field(default_factory=dict)
+    # Full training matrix used by the interventional explainer (memory-mapped when loaded).
+    shap_background: np.ndarray | None = None
+    # NumPy copy of the booster for p_default (see api.forest); None if it failed validation.
+    forest: CompiledForest | None = None
+    # UBJ booster bytes from the artifact, parsed on first `classifier()` call.
+    booster_raw: bytes | None = None
+
+    def classifier(self):
+        """The XGBClassifier, loaded from `booster_raw` on first use (imports xgboost)."""
+
+        if self.model is None:
+            from xgboost import XGBClassifier
+
+            model = XGBClassifier()
+            model.load_model(bytearray(self.booster_raw))
+            self.model = model
+        return self.model
+
+    def predict_default(self, x_s: np.ndarray) -> np.ndarray:
+        """P(default) per scaled row, from the compiled forest when there is one.
+
+        Batches over `FOREST_MAX_BATCH` rows go to the booster if something
+        already loaded it; the forest never imports xgboost just to be faster.
+        """
+
+        use_forest = self.forest is not None and (self.model is None or len(x_s) <= FOREST_MAX_BATCH)
+        predictor = self.forest if use_forest else self.classifier()
+        return predictor.predict_proba(x_s)[:, 1].astype(float)
+
+    def explain_path_dependent(self, x_s: np.ndarray) -> TreeExplanation:
+        """Path-dependent TreeSHAP, from the compiled forest when it has node covers."""
 
+        if self.forest is not None and self.forest.explains:
+            return forest_contributions(self.forest, x_s)
+        return tree_contributions(self.classifier(), x_s)
 
-def train_model(seed: int = 42) -> ModelBundle:
+
+@dataclass
+class FittedScaler:
+    """Array-only equivalent of a fitted `StandardScaler` (mean/scale)."""
+
+    mean_: np.ndarray
+    scale_: np.ndarray
+
+    def transform(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=float) - self.mean_) / self.scale_
+
+
+def train_model(seed: int = 42, artifact_path: str | None = None) -> ModelBundle:
+    """Train the synthetic credit model; optionally persist it to `artifact_path`."""
     rng = np.random.default_rng(seed)
 
     feature_order = [
@@ -68,56 +170,227 @@ def train_model(seed: int = 42) -> ModelBundle:
     )
     model.fit(X_train_s, y_train)
 
-    # SHAP explainer (TreeExplainer/Explainer auto)
-    shap_explainer = None
-    try:
-        import shap
-
-        shap_explainer = shap.Explainer(model, X_train_s)
-    except Exception:
-        shap_explainer = None
-
     # Keep small background for stable SHAP plotting
     X_bg = X_train_s[: min(256, X_train_s.shape[0])]
 
-    return ModelBundle(
+    forest = compile_booster(model.get_booster())
+    forest_report = validate(forest, model, X_train_s)
+    if not is_faithful(forest_report):
+        logger.warning("Compiled forest disagrees with the booster; serving with xgboost", extra=forest_report)
+        forest = None
+
+    bundle = ModelBundle(
         model=model,
         scaler=scaler,
         feature_order=feature_order,
-        shap_explainer=shap_explainer,
+        # Built lazily, only when interventional explanations are requested.
+        shap_explainer=None,
         X_background=X_bg,
+        metadata={"seed": int(seed), "n_train": int(X_train_s.shape[0]), "forest": forest_report},
+        shap_background=X_train_s,
+        forest=forest,
     )
+    if artifact_path:
+        try:
+            save_model(bundle, artifact_path)
+        except OSError as e:
+            # Read-only filesystem (e.g. serverless): serve the in-memory model anyway.
+            logger.warning("Could not persist model artifact", extra={"path": artifact_path, "error": str(e)})
+    return bundle
 
 
-def score_and_explain(bundle: ModelBundle, features: dict) -> dict:
-    x = np.array([[features[k] for k in bundle.feature_order]], dtype=float)
-    x_s = bundle.scaler.transform(x)
+def save_model(bundle: ModelBundle, path: str) -> dict:
+    """Write `bundle` as a versioned artifact directory and return its manifest.
+
+    Layout: native XGBoost UBJ booster, its compiled NumPy forest (`.npz`, when
+    it passed validation), `.npy` SHAP background (memory-mappable) and a JSON
+    manifest with scaler parameters, feature order, training metadata, the
+    forest validation report and a SHA-256 over the binary files. Each file is written to a temp name and
+    renamed into place, manifest last, so concurrent readers never see a torn file.
+    """
+
+    import xgboost
+
+    os.makedirs(path, exist_ok=True)
+
+    booster_raw = bundle.booster_raw or bytes(bundle.classifier().get_booster().save_raw(raw_format="ubj"))
+    background = np.ascontiguousarray(
+        bundle.shap_background if bundle.shap_background is not None else bundle.X_background, dtype=np.float64
+    )
 
-    p_default = float(bundle.model.predict_proba(x_s)[0, 1])
-    credit_score = int(np.clip(900 - (p_default * 600), 300, 900))
+    _atomic_write(os.path.join(path, BOOSTER_FILE), booster_raw)
+    forest_path = os.path.join(path, FOREST_FILE)
+    if bundle.forest is not None:
+        forest_tmp = os.path.join(path, f".{FOREST_FILE}.{os.getpid()}.tmp")
+        with open(forest_tmp, "wb") as fh:
+            bundle.forest.save(fh)
+        os.replace(forest_tmp, forest_path)
+    elif os.path.exists(forest_path):
+        os.remove(forest_path)
+    bg_tmp = os.path.join(path, f".{BACKGROUND_FILE}.{os.getpid()}.tmp")
+    with open(bg_tmp, "wb") as fh:
+        np.save(fh, background)
+    os.replace(bg_tmp, os.path.join(path, BACKGROUND_FILE))
 
-    contributions = {}
-    base_value = 0.0
+    manifest = {
+        "format_version": MODEL_FORMAT_VERSION,
+        "created_at": int(time.time()),
+        "xgboost_version": xgboost.__version__,
+        "seed": bundle.metadata.get("seed"),
+        "n_train": bundle.metadata.get("n_train"),
+        "feature_order": list(bundle.feature_order),
+        "scaler": {
+            "mean": [float(v) for v in bundle.scaler.mean_],
+            "scale": [float(v) for v in bundle.scaler.scale_],
+        },
+        "background_rows": int(background.shape[0]),
+        "forest": bundle.metadata.get("forest") if bundle.forest is not None else None,
+        "sha256": _artifact_checksum(path),
+    }
+    _atomic_write(os.path.join(path, MANIFEST_FILE), json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def load_model(path: str) -> ModelBundle:
+    """Load an artifact written by `save_model`.
+
+    The SHAP background is memory-mapped read-only, so every worker on a host
+    shares the same pages. Raises `FileNotFoundError` if there is no artifact and
+    `ModelArtifactError` if it is stale or fails its checksum.
+    """
+
+    with open(os.path.join(path, MANIFEST_FILE), "rb") as fh:
+        manifest = json.loads(fh.read().decode("utf-8"))
+
+    if manifest.get("format_version") != MODEL_FORMAT_VERSION:
+        raise ModelArtifactError(f"Unsupported model format version: {manifest.get('format_version')}")
+    if manifest.get("sha256") != _artifact_checksum(path):
+        raise ModelArtifactError("Model artifact checksum mismatch")
+
+    # xgboost is only imported once something needs the booster itself (the
+    # interventional explainer); p_default and path-dependent SHAP use the forest.
+    with open(os.path.join(path, BOOSTER_FILE), "rb") as fh:
+        booster_raw = fh.read()
+
+    scaler = FittedScaler(
+        mean_=np.asarray(manifest["scaler"]["mean"], dtype=float),
+        scale_=np.asarray(manifest["scaler"]["scale"], dtype=float),
+    )
+    background = np.load(os.path.join(path, BACKGROUND_FILE), mmap_mode="r")
+    forest = CompiledForest.load(os.path.join(path, FOREST_FILE)) if manifest.get("forest") else None
+
+    return ModelBundle(
+        model=None,
+        scaler=scaler,
+        feature_order=list(manifest["feature_order"]),
+        shap_explainer=None,
+        X_background=background[: min(256, background.shape[0])],
+        metadata={
+            "seed": manifest.get("seed"),
+            "n_train": manifest.get("n_train"),
+            "sha256": manifest.get("sha256"),
+            "created_at": manifest.get("created_at"),
+            "forest": manifest.get("forest"),
+        },
+        shap_background=background,
+        forest=forest,
+        booster_raw=booster_raw,
+    )
+
+
+def load_or_train_model(path: str | None = None, seed: int = 42) -> ModelBundle:
+    """Load the persisted model, retraining (and re-persisting) on a miss.
+
+    `path` defaults to `CREDITNEXT_MODEL_PATH`, then to `api/artifacts/credit_model`.
+    """
+
+    path = path or os.environ.get("CREDITNEXT_MODEL_PATH") or DEFAULT_MODEL_PATH
+    try:
+        bundle = load_model(path)
+        if bundle.metadata.get("seed") == seed:
+            return bundle
+    except (FileNotFoundError, ModelArtifactError, KeyError, ValueError):
+        pass
+
+    return train_model(seed=seed, artifact_path=path)
 
-    if bundle.shap_explainer is not None:
+
+def _artifact_checksum(path: str) -> str:
+    h = hashlib.sha256()
+    for name in (BOOSTER_FILE, BACKGROUND_FILE, FOREST_FILE):
+        if name == FOREST_FILE and not os.path.exists(os.path.join(path, name)):
+            continue
+        with open(os.path.join(path, name), "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_write(target: str, data: bytes) -> None:
+    tmp = os.path.join(os.path.dirname(target), f".{os.path.basename(target)}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, target)
+
+
+def score_and_explain(bundle: ModelBundle, features: dict, mode: str | None = None) -> dict:
+    return score_and_explain_batch(bundle, [features], mode=mode)[0]
+
+
+def score_and_explain_batch(bundle: ModelBundle, features: list[dict], mode: str | None = None) -> list[dict]:
+    """Score many feature dicts with one model call.
+
+    `mode` is one of `explain.SHAP_MODES` (default: `CREDITNEXT_SHAP_MODE`). In
+    "path_dependent" mode p_default and contributions come from the compiled
+    forest (the booster only for artifacts without one); any explainer failure
+    falls back to simulated contributions. In "none" mode results carry no
+    `base_value`/`contributions`. Neither mode imports xgboost.
+    """
+
+    if not features:
+        return []
+
+    x = np.array([[f[k] for k in bundle.feature_order] for f in features], dtype=float)
+    x_s = bundle.scaler.transform(x)
+
+    explanation = None
+    mode = mode or shap_mode()
+    if mode not in SHAP_MODES:
+        raise ValueError(f"mode must be one of {SHAP_MODES}, got {mode!r}")
+    if mode != "none":
         try:
-            shap_values = bundle.shap_explainer(x_s)
-            base_value = float(shap_values.base_values[0])
-            vals = shap_values.values[0]
-            contributions = {k: float(v) for k, v in zip(bundle.feature_order, vals)}
+            # path_dependent also yields p_default, so it is all "shap".
+            with stage("shap"):
+                if mode == "path_dependent":
+                    explanation = bundle.explain_path_dependent(x_s)
+                else:
+                    if bundle.shap_explainer is None:
+                        background = bundle.shap_background if bundle.shap_background is not None else bundle.X_background
+                        bundle.shap_explainer = build_interventional_explainer(bundle.classifier(), background)
+                    explanation = interventional_contributions(bundle.shap_explainer, bundle.predict_default, x_s)
         except Exception:
-            contributions = _simulated_contributions(features)
-            base_value = 0.0
+            logger.warning("SHAP failed, using simulated contributions", exc_info=True, extra={"mode": mode})
+            SHAP_FALLBACKS.labels(mode).inc()
+            explanation = None
+
+    if explanation is not None:
+        p_default = explanation.p_default
     else:
-        contributions = _simulated_contributions(features)
-        base_value = 0.0
+        with stage("predict"):
+            p_default = bundle.predict_default(x_s)
+    credit_score = np.clip(900 - (p_default * 600), 300, 900).astype(int)
 
-    return {
-        "credit_score": credit_score,
-        "p_default": p_default,
-        "base_value": base_value,
-        "contributions": contributions,
-    }
+    out = []
+    for i, f in enumerate(features):
+        scored = {"credit_score": int(credit_score[i]), "p_default": float(p_default[i])}
+        if explanation is not None:
+            scored["base_value"] = float(explanation.base_values[i])
+            scored["contributions"] = {k: float(v) for k, v in zip(bundle.feature_order, explanation.values[i])}
+        elif mode != "none":
+            scored["base_value"] = 0.0
+            scored["contributions"] = _simulated_contributions(f)
+        out.append(scored)
+    return out
 
 
 def _simulated_contributions(features: dict) -> dict:
@@ -134,3 +407,12 @@ def _simulated_contributions(features: dict) -> dict:
         "proxy_net_profit": (np.log1p(proxy_net_profit) - 8.5) * 0.55,
         "cashflow_strength": (cashflow_strength - 8.0) * 0.35,
     }
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Pre-build the artifact (e.g. at image build time): python -m api.model [path]
+    out = sys.argv[1] if len(sys.argv) > 1 else (os.environ.get("CREDITNEXT_MODEL_PATH") or DEFAULT_MODEL_PATH)
+    train_model(seed=42, artifact_path=out)
+    print(f"Wrote model artifact to {out}")
@@ -1,104 +1,77 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-import hashlib
 import re
 import base64
-from datetime import date, datetime, timedelta
-from typing import Any
-
-import httpx
-import pytesseract
-from PIL import Image
+import time
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
 import io
 
-
-def extract_transactions_from_pdf_text(text: str) -> list[dict[str, Any]]:
-    """Extract transactions from PDF text content.
-    
-    This is a simple heuristic-based extraction for Thai bank statements.
-    Looks for patterns like dates, amounts, and descriptions.
-    """
-    transactions = []
-    
-    # Common Thai transaction patterns
-    income_keywords = ["โอนเข้า", "รับเงิน", "ค่าจ้าง", "รายรับ", "ขาย", "เงินเดือน", "ลูกค้าโอน"]
-    expense_keywords = ["โอนออก", "จ่าย", "ซื้อ", "ค่า", "ถอนเงิน", "โอนให้"]
-    
-    # Try to find transaction patterns (very basic)
-    lines = text.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Look for amounts (Thai Baht format: can be 1,234.56 or 1234.56)
-        amount_match = re.search(r'(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)', line)
-        
-        # Look for dates (DD/MM/YYYY, DD-MM-YYYY, etc.)
-        date_match = re.search(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', line)
-        
-        if amount_match:
-            amount_str = amount_match.group(1).replace(',', '')
-            try:
-                amount = float(amount_str)
-                
-                # Determine transaction type based on keywords
-                trans_type = "Expense"  # Default conservative
-                for keyword in income_keywords:
-                    if keyword in line:
-                        trans_type = "Income"
-                        break
-                
-                # Extract date
-                trans_date = datetime.now().strftime("%Y-%m-%d")
-                if date_match:
-                    date_str = date_match.group(1)
-                    try:
-                        # Try to parse Thai date format
-                        for fmt in ["%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y"]:
-                            try:
-                                parsed_date = datetime.strptime(date_str, fmt)
-                                trans_date = parsed_date.strftime("%Y-%m-%d")
-                                break
-                            except:
-                                continue
-                    except:
-                        pass
-                
-                # Extract description (remove date and amount)
-                description = line
-                if date_match:
-                    description = description.replace(date_match.group(0), "").strip()
-                if amount_match:
-                    description = description.replace(amount_match.group(0), "").strip()
-                
-                # Clean up description
-                description = re.sub(r'\s+', ' ', description).strip()
-                if not description:
-                    description = "รายการ" + ("รับเงิน" if trans_type == "Income" else "จ่ายเงิน")
-                
-                # Limit description length
-                if len(description) > 50:
-                    description = description[:50] + "..."
-                
-                transactions.append({
-                    "date": trans_date,
-                    "description": description,
-                    "amount": float(amount),
-                    "type": trans_type,
-                })
-                
-            except ValueError:
-                continue
-    
-    # If no transactions found, return empty list
-    return transactions
-
-
-def mock_typhoon_ocr(image_bytes: bytes) -> list[dict[str, Any]]:
+try:
+    from api.cache import cache_key, document_digest, file_digest, get_cache
+    from api.chunking import chunk_ocr_text
+    from api.executor import get_cpu_executor
+    from api.jsonstream import ArrayItemStreamParser
+    from api.log import get_logger
+    from api.metrics import RECONCILE_RESULTS, observe_stage, stage
+    from api.ocr_engine import get_ocr_engine, resolve_engine_name
+    from api.preprocess import PreprocessConfig, preprocess_for_ocr
+    from api.reconcile import Reconciliation, reconcile
+    from api.statement_parser import opening_balance, parse_statement_text
+    from api.tracing import span
+    from api.upstream import get_upstream
+except ImportError:
+    from cache import cache_key, document_digest, file_digest, get_cache
+    from chunking import chunk_ocr_text
+    from executor import get_cpu_executor
+    from jsonstream import ArrayItemStreamParser
+    from log import get_logger
+    from metrics import RECONCILE_RESULTS, observe_stage, stage
+    from ocr_engine import get_ocr_engine, resolve_engine_name
+    from preprocess import PreprocessConfig, preprocess_for_ocr
+    from reconcile import Reconciliation, reconcile
+    from statement_parser import opening_balance, parse_statement_text
+    from tracing import span
+    from upstream import get_upstream
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+logger = get_logger("ocr")
+
+# Part of every cache key: bump PROMPT_VERSION whenever the extraction prompt
+# (or how text is split across prompts) changes so cached transactions from
+# the old prompt stop matching.
+PROMPT_VERSION = "4"
+OPENAI_LLM_MODEL = "gpt-4o"
+# Grayscale/deskew/crop/downscale/binarize before Tesseract (`CREDITNEXT_OCR_*`).
+OCR_PREPROCESS = PreprocessConfig.from_env()
+TESSERACT_ENGINE = f"tesseract:tha+eng:{OCR_PREPROCESS.signature()}"
+
+# Output caps per structuring call. The JSON for a row takes more tokens than
+# the row's OCR text, so input chunks are budgeted at a third of the cap to
+# keep responses from being cut off mid-array.
+OPENAI_MAX_TOKENS = 4096
+TYPHOON_MAX_TOKENS = 1200
+OPENAI_CHUNK_TOKENS = int(os.environ.get("CREDITNEXT_OPENAI_CHUNK_TOKENS", OPENAI_MAX_TOKENS // 3))
+TYPHOON_CHUNK_TOKENS = int(os.environ.get("CREDITNEXT_TYPHOON_CHUNK_TOKENS", TYPHOON_MAX_TOKENS // 3))
+
+# Overridable so the providers can be swapped for a local stub server.
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+TYPHOON_BASE_URL = os.environ.get("TYPHOON_BASE_URL", "https://api.opentyphoon.ai/v1").rstrip("/")
+
+
+def extract_transactions_from_pdf_text(text: str, bank: str | None = None) -> list[dict[str, Any]]:
+    """Transactions from statement text via the bank-layout parser (`api/statement_parser.py`)."""
+
+    return parse_statement_text(text, bank).transactions
+
+
+def mock_typhoon_ocr(image_bytes: bytes, digest: str | None = None) -> list[dict[str, Any]]:
     """Simulated Typhoon OCR (Thai-optimized).
 
     Production note:
@@ -109,10 +82,11 @@ def mock_typhoon_ocr(image_bytes: bytes) -> list[dict[str, Any]]:
         TYPHOON_API_KEY = os.environ["TYPHOON_API_KEY"]
         requests.post("https://typhoon.example/v1/ocr", headers={"Authorization": ...})
 
-    For demo: return deterministic Thai transactions derived from image hash.
+    For demo: return deterministic Thai transactions derived from image hash
+    (`digest`, when the caller already has it).
     """
 
-    h = hashlib.sha256(image_bytes).hexdigest()
+    h = digest or document_digest(image_bytes)
     seed = int(h[:8], 16)
     base = date(2025, 12, 1) + timedelta(days=(seed % 21))
 
@@ -151,7 +125,7 @@ def _creditnext_extraction_system_prompt() -> str:
     )
 
 
-def _creditnext_extraction_user_prompt(ocr_text: str, bank: str | None = None) -> str:
+def _creditnext_extraction_user_prompt(ocr_text: str, bank: str | None = None, hint: str | None = None) -> str:
     # This prompt is intentionally strict: JSON-only output so the API can parse reliably.
     
     bank_specific_hints = ""
@@ -170,8 +144,10 @@ def _creditnext_extraction_user_prompt(ocr_text: str, bank: str | None = None) -
     
     return (
         f"Extract transactions from the OCR text. Output ONLY valid JSON (no markdown, no extra text).\n"
-        "Schema: {\"transactions\": [{\"date\":\"YYYY-MM-DD\",\"description\":\"<Thai text>\",\"amount\":<number>,\"type\":\"Income\"|\"Expense\"}]}\n"
+        "Schema: {\"transactions\": [{\"date\":\"YYYY-MM-DD\",\"description\":\"<Thai text>\",\"amount\":<number>,\"type\":\"Income\"|\"Expense\",\"balance\":<number>}]}\n"
         "Rules:\n"
+        "- One entry per statement row, in statement order; never merge, skip or repeat rows.\n"
+        "- balance is the running balance printed on the row (ยอดคงเหลือ/Balance); omit it when the row has none.\n"
         "- Use ISO date format. If date missing, infer a plausible date and keep it consistent; never leave blank.\n"
         "- amount must be a number (THB). If you see commas, remove them.\n"
         "- type classification:\n"
@@ -180,7 +156,8 @@ def _creditnext_extraction_user_prompt(ocr_text: str, bank: str | None = None) -
         "- Keep description in Thai; keep it short and meaningful.\n"
         "- If uncertain, classify as Expense (conservative).\n"
         f"{bank_specific_hints}"
-        "OCR TEXT:\n"
+        + (f"\nPREVIOUS ATTEMPT FAILED THE BALANCE CHECK:\n{hint}\n\n" if hint else "")
+        + "OCR TEXT:\n"
         + ocr_text
     )
 
@@ -202,7 +179,7 @@ async def typhoon_ocr_extract_text(
     Mirrors the client-side example you provided, but runs server-side.
     """
 
-    url = "https://api.opentyphoon.ai/v1/ocr"
+    url = f"{TYPHOON_BASE_URL}/ocr"
     data = {
         "model": model,
         "task_type": task_type,
@@ -216,13 +193,12 @@ async def typhoon_ocr_extract_text(
 
     files = {"file": ("document", image_bytes)}
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(
-            url,
-            headers={"Authorization": f"Bearer {api_key}"},
-            data=data,
-            files=files,
-        )
+    resp = await get_upstream().post(
+        url,
+        headers={"Authorization": f"Bearer {api_key}"},
+        data=data,
+        files=files,
+    )
 
     resp.raise_for_status()
     payload = resp.json()
@@ -252,73 +228,371 @@ async def typhoon_ocr_extract_text(
 
 
 async def typhoon_llm_extract_transactions(ocr_text: str, *, api_key: str, bank: str | None = None) -> list[dict[str, Any]]:
-    """Use Typhoon chat completions to structure OCR text into transactions JSON."""
+    """Use Typhoon chat completions to structure OCR text into transactions JSON.
 
-    url = "https://api.opentyphoon.ai/v1/chat/completions"
-    body = {
+    Long text is split into `TYPHOON_CHUNK_TOKENS` chunks structured in parallel.
+    """
+
+    return await _extract_in_chunks(
+        chunk_ocr_text(ocr_text, TYPHOON_CHUNK_TOKENS),
+        lambda chunk: _typhoon_llm_extract_chunk(chunk, api_key=api_key, bank=bank),
+        lambda chunk, hint: _typhoon_llm_extract_chunk(chunk, api_key=api_key, bank=bank, hint=hint),
+    )
+
+
+async def _typhoon_llm_extract_chunk(
+    ocr_text: str, *, api_key: str, bank: str | None, hint: str | None = None
+) -> list[dict[str, Any]]:
+    url = f"{TYPHOON_BASE_URL}/chat/completions"
+    body = _typhoon_extraction_body(ocr_text, bank, hint=hint)
+
+    resp = await get_upstream().post(url, headers={"Authorization": f"Bearer {api_key}"}, json=body)
+
+    resp.raise_for_status()
+    data = resp.json()
+    choice = data.get("choices", [{}])[0]
+    content = choice.get("message", {}).get("content", "").strip()
+    return _parse_transactions_content(content, choice.get("finish_reason"))
+
+
+def _typhoon_extraction_body(
+    ocr_text: str, bank: str | None, stream: bool = False, hint: str | None = None
+) -> dict[str, Any]:
+    return {
         "model": "typhoon-v2.5-30b-a3b-instruct",
         "messages": [
             {"role": "system", "content": _creditnext_extraction_system_prompt()},
-            {"role": "user", "content": _creditnext_extraction_user_prompt(ocr_text, bank)},
+            {"role": "user", "content": _creditnext_extraction_user_prompt(ocr_text, bank, hint)},
         ],
         "temperature": 0.2,
-        "max_completion_tokens": 1200,
+        "max_completion_tokens": TYPHOON_MAX_TOKENS,
         "top_p": 0.6,
         "frequency_penalty": 0,
-        "stream": False,
+        "stream": stream,
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(url, headers={"Authorization": f"Bearer {api_key}"}, json=body)
 
-    resp.raise_for_status()
-    data = resp.json()
-    content = (
-        data.get("choices", [{}])[0]
-        .get("message", {})
-        .get("content", "")
-        .strip()
+async def tesseract_ocr_extract_text(image_bytes: bytes, engine: str | None = None) -> str:
+    """Use Tesseract OCR to extract text from image (in the CPU executor).
+
+    `engine` picks the backend (`api/ocr_engine.py`, default `CREDITNEXT_OCR_ENGINE`).
+    """
+    try:
+        with stage("tesseract"):
+            text = await get_cpu_executor().run(tesseract_image_bytes_to_text, image_bytes, engine)
+        logger.debug("Tesseract OCR done", extra={"image_bytes": len(image_bytes), "text_chars": len(text)})
+        return text
+    except Exception:
+        logger.exception("Tesseract OCR failed")
+        return ""
+
+
+def tesseract_image_bytes_to_text(image_bytes: bytes, engine: str | None = None) -> str:
+    # Blocking; runs in `get_cpu_executor()` workers.
+    from PIL import Image
+
+    image, dpi = preprocess_for_ocr(Image.open(io.BytesIO(image_bytes)), OCR_PREPROCESS)
+    return _tesseract_image_to_text(image, dpi, engine)
+
+
+def _tesseract_image_to_text(image: Image.Image, dpi: int | None = None, engine: str | None = None) -> str:
+    # Each worker process keeps its engine (and, with tesserocr, the loaded
+    # Thai/English models) for the next page.
+    return get_ocr_engine(engine).image_to_text(image, dpi)
+
+
+# --- Multi-page PDF pipeline -------------------------------------------------
+
+# Scanned pages are rendered at the resolution Tesseract reads Thai best at
+# (see `PreprocessConfig`); A4 at 300 DPI is also its `max_width`, so the
+# render is never rescaled before OCR.
+PDF_RENDER_DPI = int(os.environ.get("CREDITNEXT_PDF_DPI", "300"))
+LLM_CONCURRENCY = int(os.environ.get("CREDITNEXT_LLM_CONCURRENCY", "4"))
+# Pages whose embedded text has at least this many non-space characters are
+# treated as digitally generated and never rasterized.
+MIN_TEXT_LAYER_CHARS = int(os.environ.get("CREDITNEXT_MIN_TEXT_LAYER_CHARS", "50"))
+
+_LLM_SEMAPHORE: asyncio.Semaphore | None = None
+
+# on_page(page_info, page_transactions, page_count)
+PageCallback = Callable[[dict[str, Any], list[dict[str, Any]], int], Awaitable[None]]
+# on_transaction(page_number, transaction)
+TransactionCallback = Callable[[int, dict[str, Any]], Awaitable[None]]
+
+
+class PdfPasswordError(ValueError):
+    """Encrypted PDF uploaded without (or with the wrong) password."""
+
+
+def decrypt_pdf(pdf_path: str, password: str | None = None, decrypted_path: str | None = None) -> tuple[str, int]:
+    """Return (path of a PDF poppler can open, page count).
+
+    Unencrypted uploads are used in place. Encrypted ones are decrypted into
+    `decrypted_path`, page by page straight to disk, because poppler cannot
+    open the original without the password. Blocking; runs in
+    `get_cpu_executor()` workers, which only exchange paths with the API process.
+    """
+
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(pdf_path)
+    if not reader.is_encrypted:
+        return pdf_path, len(reader.pages)
+    if not password:
+        raise PdfPasswordError("PDF is encrypted. Please provide a password.")
+    if not reader.decrypt(password):
+        raise PdfPasswordError("Invalid password.")
+
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    out = decrypted_path or f"{pdf_path}.decrypted.pdf"
+    with open(out, "wb") as f:
+        writer.write(f)
+    return out, len(reader.pages)
+
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    global _LLM_SEMAPHORE
+    if _LLM_SEMAPHORE is None:
+        _LLM_SEMAPHORE = asyncio.Semaphore(max(LLM_CONCURRENCY, 1))
+    return _LLM_SEMAPHORE
+
+
+def ocr_pdf_page(
+    pdf: str | bytes,
+    page_number: int,
+    dpi: int = PDF_RENDER_DPI,
+    ocr_scanned: bool = True,
+    engine: str | None = None,
+) -> dict[str, Any]:
+    """Get the text of one (1-based) page of a decrypted PDF.
+
+    Uses the page's embedded text layer when it has real content; only scanned
+    pages are rasterized and run through Tesseract (skipped entirely when
+    `ocr_scanned` is False). `source` reports which path was taken.
+
+    `pdf` is a file path (the API passes the spooled upload, so workers read
+    only the page they need) or the document's bytes. Runs inside
+    `get_cpu_executor()` workers, so it only takes/returns picklable data.
+    """
+
+    from pypdf import PdfReader
+
+    t0 = time.perf_counter()
+    text = PdfReader(pdf if isinstance(pdf, str) else io.BytesIO(pdf)).pages[page_number - 1].extract_text() or ""
+    t1 = time.perf_counter()
+
+    result: dict[str, Any] = {"page": page_number, "text_ms": round((t1 - t0) * 1000.0, 1)}
+    if has_text_layer(text):
+        result.update(source="text_layer", text=text.strip())
+        return result
+    if not ocr_scanned:
+        result.update(source="skipped", text="")
+        return result
+
+    from pdf2image import convert_from_bytes, convert_from_path
+
+    # One page at a time, straight to grayscale (cheaper; preprocessing drops colour anyway).
+    render = convert_from_path if isinstance(pdf, str) else convert_from_bytes
+    images = render(pdf, dpi=dpi, first_page=page_number, last_page=page_number, grayscale=OCR_PREPROCESS.enabled)
+    t2 = time.perf_counter()
+    image, ocr_dpi = preprocess_for_ocr(images[0], OCR_PREPROCESS, dpi) if images else (None, None)
+    # Free the full-resolution render before Tesseract allocates its own buffers.
+    del images
+    t3 = time.perf_counter()
+    text = _tesseract_image_to_text(image, ocr_dpi, engine) if image is not None else ""
+    t4 = time.perf_counter()
+
+    result.update(
+        source="ocr",
+        text=text,
+        render_ms=round((t2 - t1) * 1000.0, 1),
+        preprocess_ms=round((t3 - t2) * 1000.0, 1),
+        ocr_ms=round((t4 - t3) * 1000.0, 1),
     )
-    if not content:
-        return []
+    return result
+
+
+def has_text_layer(text: str) -> bool:
+    return len(re.sub(r"\s+", "", text or "")) >= MIN_TEXT_LAYER_CHARS
+
+
+async def real_openai_pdf_to_transactions(
+    pdf: str | bytes,
+    page_count: int,
+    bank: str | None = None,
+    on_page: PageCallback | None = None,
+    on_transaction: TransactionCallback | None = None,
+    ocr_engine: str | None = None,
+    digest: str | None = None,
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Multi-page variant of `real_openai_ocr_to_transactions` for decrypted PDFs.
+
+    Every page is processed concurrently in the process pool: text-layer pages
+    skip rasterization, scanned pages are rendered and OCR'd. Page text is then
+    parsed by the bank-layout parser; pages it types completely and whose
+    running balance reconciles skip the LLM. Other pages are structured by the
+    LLM (long pages in several chunks) with at most `CREDITNEXT_LLM_CONCURRENCY`
+    calls in flight. Without `OPENAI_API_KEY` the parser's rows are used as
+    they are and scanned pages are skipped.
+
+    `on_page(page_info, page_transactions, page_count)` is awaited as each page
+    finishes (in completion order), for progress reporting. When
+    `on_transaction(page_number, txn)` is given, the LLM response is streamed
+    and each transaction is reported as soon as it is parsed. `ocr_engine`
+    is passed to the workers as in `real_openai_ocr_to_transactions`.
+
+    `pdf` is a decrypted PDF's path (workers open it themselves; nothing is
+    copied per page) or its bytes. `digest` content-addresses the cache and
+    defaults to a SHA-256 of the document.
+
+    Returns (merged transactions in page order, per-page source and timings).
+    """
 
-    parsed = json.loads(content)
-    txns = parsed.get("transactions", [])
-    if not isinstance(txns, list):
-        return []
-    return txns
+    api_key = os.environ.get("OPENAI_API_KEY", "").strip()
+    ocr_engine = resolve_engine_name(ocr_engine)
+
+    executor = get_cpu_executor()
+    # Opening the cache (first call) and hashing read the disk: keep both off the event loop.
+    cache = await asyncio.to_thread(get_cache)
+    if digest is None:
+        digest = await asyncio.to_thread(file_digest, pdf) if isinstance(pdf, str) else document_digest(pdf)
+    engine = ocr_cache_engine(ocr_engine, pdf=True)
+
+    async def process_page(page_number: int) -> dict[str, Any]:
+        t0 = time.perf_counter()
+        result: dict[str, Any] = {"page": page_number, "transactions": []}
+        try:
+            text_key = cache_key(digest, page_number, engine)
+            cached = await cache.aget_text(text_key) if cache else None
+            if cached is not None:
+                page = {"source": cached["source"], "text": cached["text"], "text_cached": True}
+            else:
+                page = await executor.run(
+                    ocr_pdf_page, pdf, page_number, PDF_RENDER_DPI, bool(api_key), ocr_engine
+                )
+                # Timed inside the worker process; recorded here where the metrics live.
+                for key, stage_name in (
+                    ("text_ms", "text_layer"),
+                    ("render_ms", "rasterize"),
+                    ("preprocess_ms", "ocr_preprocess"),
+                    ("ocr_ms", "tesseract"),
+                ):
+                    if key in page:
+                        observe_stage(stage_name, page[key] / 1000.0)
+                if cache and page["source"] != "skipped":
+                    await cache.aput_text(text_key, {"source": page["source"], "text": page["text"]})
+            text = page.pop("text")
+            result.update({k: v for k, v in page.items() if k != "page"})
+            parsed = None
+            if text:
+                with stage("statement_parse"):
+                    parsed = parse_statement_text(text, bank)
+                result["layout"] = parsed.layout
+            if parsed is not None and (parsed.trusted or not api_key):
+                # Rows typed by the layout whose running balance chains are as
+                # good as the LLM's; untrusted parses only stand in without a key.
+                result["extractor"] = "parser"
+                result["transactions"] = parsed.transactions
+                if parsed.balance_checked:
+                    result.update(balance_checked=parsed.balance_checked, balance_gaps=len(parsed.balance_mismatches))
+                if on_transaction is not None:
+                    for txn in parsed.transactions:
+                        await on_transaction(page_number, txn)
+            elif text:
+                result["extractor"] = "llm"
+                txns_key = _transactions_cache_key(digest, page_number, engine, bank)
+                txns = await cache.aget_transactions(txns_key) if cache else None
+                if txns is not None:
+                    result["transactions_cached"] = True
+                else:
+                    t_llm = time.perf_counter()
+                    if on_transaction is not None:
+
+                        async def on_txn(txn: dict[str, Any]) -> None:
+                            result.setdefault("llm_first_ms", round((time.perf_counter() - t_llm) * 1000.0, 1))
+                            await on_transaction(page_number, txn)
+
+                        txns = await openai_llm_stream_transactions(text, api_key=api_key, bank=bank, on_txn=on_txn)
+                    else:
+                        txns = await openai_llm_extract_transactions(text, api_key=api_key, bank=bank)
+                    result["llm_ms"] = round((time.perf_counter() - t_llm) * 1000.0, 1)
+                    if cache and txns:
+                        await cache.aput_transactions(txns_key, txns)
+                result["transactions"] = txns
+                # Chunks were reconciled (and re-requested) one by one; this
+                # reports what is left across chunk boundaries of the page.
+                report = reconcile(txns, opening_balance(text))
+                if report.checked:
+                    result.update(balance_checked=report.checked, balance_gaps=len(report.gaps))
+                if result.get("transactions_cached") and on_transaction is not None:
+                    for txn in txns:
+                        await on_transaction(page_number, txn)
+        except Exception as e:
+            logger.exception("PDF page failed", extra={"page": page_number})
+            result["error"] = str(e)
+        result["total_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        if on_page is not None:
+            info = {k: v for k, v in result.items() if k != "transactions"}
+            await on_page(dict(info, transactions=len(result["transactions"])), result["transactions"], page_count)
+        return result
+
+    async def traced_page(page_number: int) -> dict[str, Any]:
+        with span("pdf_page", page=page_number):
+            return await process_page(page_number)
+
+    results = await asyncio.gather(*(traced_page(n) for n in range(1, page_count + 1)))
+
+    per_page = [r.pop("transactions") for r in results]
+    for r, page_txns in zip(results, per_page):
+        r["transactions"] = len(page_txns)
+    return merge_page_transactions(per_page), results
+
+
+def merge_page_transactions(pages: list[list[dict[str, Any]]]) -> list[dict[str, Any]]:
+    """Concatenate per-page transactions in page order, dropping page overlap.
+
+    Statements often repeat the last rows of a page at the top of the next one
+    (carried-over lines, or the same row read twice at a page break). For each
+    boundary the longest run that ends page N and starts page N+1 is kept once;
+    identical rows elsewhere are genuine repeats and are preserved.
+    """
 
+    merged: list[dict[str, Any]] = []
+    for page in pages:
+        page = list(page or [])
+        overlap = _boundary_overlap([_txn_key(t) for t in merged], [_txn_key(t) for t in page])
+        merged.extend(page[overlap:])
+    return merged
 
-async def tesseract_ocr_extract_text(image_bytes: bytes) -> str:
-    """Use Tesseract OCR to extract text from image."""
-    print(f"[DEBUG] tesseract_ocr_extract_text called with {len(image_bytes)} bytes")
-    
+
+def _boundary_overlap(prev_keys: list[tuple], next_keys: list[tuple]) -> int:
+    for k in range(min(len(prev_keys), len(next_keys)), 0, -1):
+        if prev_keys[-k:] == next_keys[:k]:
+            return k
+    return 0
+
+
+def _txn_key(t: dict[str, Any]) -> tuple:
     try:
-        # Convert bytes to PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Use Tesseract with Thai language support
-        # lang='tha+eng' means use both Thai and English
-        text = pytesseract.image_to_string(image, lang='tha+eng')
-        
-        print(f"[DEBUG] Tesseract extracted text length: {len(text)}")
-        if text:
-            print(f"[DEBUG] Text preview (first 500 chars): {text[:500]}...")
-        
-        return text.strip()
-    except Exception as e:
-        print(f"[ERROR] Tesseract OCR failed: {e}")
-        return ""
+        amount = round(float(t.get("amount", 0.0)), 2)
+    except (TypeError, ValueError):
+        amount = t.get("amount")
+    return (
+        str(t.get("date", "")).strip(),
+        re.sub(r"\s+", " ", str(t.get("description", ""))).strip().lower(),
+        amount,
+        str(t.get("type", "")),
+    )
 
 
 async def openai_vision_extract_text(image_bytes: bytes, *, api_key: str) -> str:
     """Use OpenAI GPT-4 Vision to extract text from PDF images."""
-    print(f"[DEBUG] openai_vision_extract_text called with {len(image_bytes)} bytes")
-    
     # Convert bytes to base64
     base64_image = base64.b64encode(image_bytes).decode('utf-8')
     
-    url = "https://api.openai.com/v1/chat/completions"
+    url = f"{OPENAI_BASE_URL}/chat/completions"
     body = {
         "model": "gpt-4o",
         "messages": [
@@ -345,128 +619,371 @@ Format: Plain text, line by line as it appears in the image."""
         "max_tokens": 4096
     }
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(
-            url,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json=body
-        )
+    resp = await get_upstream().post(
+        url,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        json=body
+    )
     
     resp.raise_for_status()
     data = resp.json()
     content = data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
     
-    print(f"[DEBUG] Extracted text length: {len(content)}")
-    if content:
-        print(f"[DEBUG] Text preview: {content[:200]}...")
-    
+    logger.debug("Vision OCR done", extra={"image_bytes": len(image_bytes), "text_chars": len(content)})
     return content
 
 
 async def openai_llm_extract_transactions(ocr_text: str, *, api_key: str, bank: str | None = None) -> list[dict[str, Any]]:
-    """Use OpenAI GPT-4 to structure OCR text into transactions JSON."""
-    print(f"[DEBUG] openai_llm_extract_transactions called for bank={bank}")
-    
-    url = "https://api.openai.com/v1/chat/completions"
-    body = {
-        "model": "gpt-4o",
-        "messages": [
-            {"role": "system", "content": _creditnext_extraction_system_prompt()},
-            {"role": "user", "content": _creditnext_extraction_user_prompt(ocr_text, bank)},
-        ],
-        "temperature": 0.2,
-        "max_tokens": 4096,
-        "response_format": {"type": "json_object"}
-    }
+    """Use OpenAI GPT-4 to structure OCR text into transactions JSON.
+
+    Long text is split into `OPENAI_CHUNK_TOKENS` chunks structured in parallel.
+    """
+
+    return await _extract_in_chunks(
+        chunk_ocr_text(ocr_text, OPENAI_CHUNK_TOKENS),
+        lambda chunk: _openai_llm_extract_chunk(chunk, api_key=api_key, bank=bank),
+        lambda chunk, hint: _openai_llm_extract_chunk(chunk, api_key=api_key, bank=bank, hint=hint),
+    )
+
+
+async def _openai_llm_extract_chunk(
+    ocr_text: str, *, api_key: str, bank: str | None, hint: str | None = None
+) -> list[dict[str, Any]]:
+    url = f"{OPENAI_BASE_URL}/chat/completions"
+    body = _openai_extraction_body(ocr_text, bank, hint=hint)
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(
-            url,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json=body
-        )
+    resp = await get_upstream().post(
+        url,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        json=body
+    )
     
     resp.raise_for_status()
     data = resp.json()
-    content = data.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-    
-    print(f"[DEBUG] LLM response length: {len(content)}")
+    choice = data.get("choices", [{}])[0]
+    content = choice.get("message", {}).get("content", "").strip()
     
+    txns = _parse_transactions_content(content, choice.get("finish_reason"))
+    logger.debug("LLM structuring done", extra={"response_chars": len(content), "transactions": len(txns)})
+    return txns
+
+
+async def _extract_in_chunks(
+    chunks: list[str],
+    extract_chunk: Callable[[str], Awaitable[list[dict[str, Any]]]],
+    retry_chunk: Callable[[str, str], Awaitable[list[dict[str, Any]]]] | None = None,
+) -> list[dict[str, Any]]:
+    # Every chunk call takes an `_llm_semaphore` slot, so chunks of one page and
+    # pages of one document share the same `CREDITNEXT_LLM_CONCURRENCY` bound.
+    async def run(chunk: str) -> list[dict[str, Any]]:
+        async with _llm_semaphore():
+            with stage("llm"):
+                txns = await extract_chunk(chunk)
+        if retry_chunk is None:
+            return txns
+        return await _reconcile_chunk(chunk, txns, retry_chunk)
+
+    per_chunk = await asyncio.gather(*(run(c) for c in chunks))
+    if len(per_chunk) > 1:
+        logger.debug("Structured chunks in parallel", extra={"chunks": len(per_chunk)})
+    # Chunks are in statement order; keep it, since running balances depend on it.
+    return merge_page_transactions(per_chunk)
+
+
+async def _reconcile_chunk(
+    chunk: str, txns: list[dict[str, Any]], retry_chunk: Callable[[str, str], Awaitable[list[dict[str, Any]]]]
+) -> list[dict[str, Any]]:
+    """Check one chunk's rows against its balance column; re-request only this chunk on a gap.
+
+    Inverted types and repeated rows are repaired in place. A chunk that still
+    does not reconcile is extracted once more with the gaps described in the
+    prompt, and whichever attempt has fewer gaps is kept.
+    """
+
+    opening = opening_balance(chunk)
+    with stage("reconcile"):
+        report = reconcile(txns, opening, repair=True)
+    if report.checked == 0:
+        RECONCILE_RESULTS.labels("unchecked").inc()
+        return report.transactions
+    if report.ok:
+        RECONCILE_RESULTS.labels("repaired" if report.repaired else "ok").inc()
+        return report.transactions
+
+    async with _llm_semaphore():
+        with stage("llm_retry"):
+            retried = await retry_chunk(chunk, _describe_gaps(report))
+    with stage("reconcile"):
+        second = reconcile(retried, opening, repair=True)
+    best = second if second.checked and len(second.gaps) < len(report.gaps) else report
+    RECONCILE_RESULTS.labels("retried" if best.ok else "failed").inc()
+    if not best.ok:
+        logger.warning(
+            "Balance check still failing after retry",
+            extra={"gaps": len(best.gaps), "checked": best.checked, "transactions": len(best.transactions)},
+        )
+    return best.transactions
+
+
+def _describe_gaps(report: Reconciliation) -> str:
+    lines = []
+    for gap in report.gaps[:5]:
+        t = report.transactions[gap.index]
+        lines.append(
+            f"- row {t['date']} \"{t['description']}\" {t['amount']:.2f}: printed balance {gap.printed:.2f}, "
+            f"but the rows before it give {gap.expected:.2f} (off by {gap.difference:+.2f}; a row may be missing, "
+            "repeated, misread or have the wrong type)"
+        )
+    return "\n".join(lines)
+
+
+def _parse_transactions_content(content: str, finish_reason: str | None = None) -> list[dict[str, Any]]:
     if not content:
         return []
-    
-    parsed = json.loads(content)
-    txns = parsed.get("transactions", [])
+    try:
+        parsed = json.loads(content)
+        txns = parsed.get("transactions", []) if isinstance(parsed, dict) else []
+    except ValueError:
+        # Output cut off mid-array (max tokens): keep every row that closed.
+        txns = ArrayItemStreamParser("transactions").feed(content)
+        logger.warning(
+            "Truncated LLM JSON, salvaged completed rows",
+            extra={"finish_reason": finish_reason, "transactions": len(txns)},
+        )
     if not isinstance(txns, list):
         return []
-    
-    print(f"[DEBUG] Extracted {len(txns)} transactions from LLM")
+    return [t for t in (normalize_transaction(raw) for raw in txns) if t is not None]
+
+
+def _openai_extraction_body(
+    ocr_text: str, bank: str | None, stream: bool = False, hint: str | None = None
+) -> dict[str, Any]:
+    return {
+        "model": OPENAI_LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": _creditnext_extraction_system_prompt()},
+            {"role": "user", "content": _creditnext_extraction_user_prompt(ocr_text, bank, hint)},
+        ],
+        "temperature": 0.2,
+        "max_tokens": OPENAI_MAX_TOKENS,
+        "response_format": {"type": "json_object"},
+        "stream": stream,
+    }
+
+
+async def openai_llm_stream_transactions(
+    ocr_text: str,
+    *,
+    api_key: str,
+    bank: str | None = None,
+    on_txn: Callable[[dict[str, Any]], Awaitable[None]],
+) -> list[dict[str, Any]]:
+    """Streaming `openai_llm_extract_transactions`.
+
+    `on_txn(txn)` is awaited for each transaction as soon as it closes (chunks
+    stream concurrently, so rows of different chunks interleave); the merged,
+    date-ordered list is returned at the end.
+    """
+
+    url = f"{OPENAI_BASE_URL}/chat/completions"
+    return await _extract_in_chunks(
+        chunk_ocr_text(ocr_text, OPENAI_CHUNK_TOKENS),
+        lambda chunk: _collect_stream(
+            _stream_chat_transactions(url, api_key, _openai_extraction_body(chunk, bank, stream=True)), on_txn
+        ),
+        # Retries are not streamed: the rows already reported stay, and the
+        # final list (sent with `done`) is the reconciled one.
+        lambda chunk, hint: _openai_llm_extract_chunk(chunk, api_key=api_key, bank=bank, hint=hint),
+    )
+
+
+async def typhoon_llm_stream_transactions(
+    ocr_text: str,
+    *,
+    api_key: str,
+    bank: str | None = None,
+    on_txn: Callable[[dict[str, Any]], Awaitable[None]],
+) -> list[dict[str, Any]]:
+    """Streaming `typhoon_llm_extract_transactions`."""
+
+    url = f"{TYPHOON_BASE_URL}/chat/completions"
+    return await _extract_in_chunks(
+        chunk_ocr_text(ocr_text, TYPHOON_CHUNK_TOKENS),
+        lambda chunk: _collect_stream(
+            _stream_chat_transactions(url, api_key, _typhoon_extraction_body(chunk, bank, stream=True)), on_txn
+        ),
+        lambda chunk, hint: _typhoon_llm_extract_chunk(chunk, api_key=api_key, bank=bank, hint=hint),
+    )
+
+
+async def _collect_stream(
+    stream: AsyncIterator[dict[str, Any]], on_txn: Callable[[dict[str, Any]], Awaitable[None]]
+) -> list[dict[str, Any]]:
+    txns = []
+    async for txn in stream:
+        txns.append(txn)
+        await on_txn(txn)
     return txns
 
 
-async def real_openai_ocr_to_transactions(image_bytes: bytes, bank: str | None = None) -> list[dict[str, Any]]:
+async def _stream_chat_transactions(url: str, api_key: str, body: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+    # Chat-completions SSE: `data: {...choices[0].delta.content...}` lines, ended by `data: [DONE]`.
+    parser = ArrayItemStreamParser("transactions")
+    async with get_upstream().stream(
+        "POST",
+        url,
+        headers={"Authorization": f"Bearer {api_key}", "Accept": "text/event-stream"},
+        json=body,
+    ) as resp:
+        if resp.is_error:
+            await resp.aread()
+            resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            except (ValueError, KeyError, IndexError):
+                continue
+            for item in parser.feed(delta or ""):
+                txn = normalize_transaction(item)
+                if txn is not None:
+                    yield txn
+            if parser.done:
+                break
+
+
+def normalize_transaction(raw: Any) -> dict[str, Any] | None:
+    """Validate one LLM-extracted transaction into the `/analyze` schema, or None."""
+
+    if not isinstance(raw, dict):
+        return None
+    date_str = str(raw.get("date") or "").strip()
+    if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", date_str):
+        return None
+    try:
+        amount = abs(float(str(raw.get("amount", "")).replace(",", "")))
+    except ValueError:
+        return None
+    # Same conservative default as the prompt: anything unclear is an expense.
+    typ = "Income" if str(raw.get("type", "")).strip().lower() == "income" else "Expense"
+    txn = {
+        "date": date_str,
+        "description": str(raw.get("description") or "").strip(),
+        "amount": amount,
+        "type": typ,
+    }
+    try:
+        # Optional running balance, kept for reconciliation; may be negative (overdraft).
+        txn["balance"] = float(str(raw["balance"]).replace(",", ""))
+    except (KeyError, TypeError, ValueError):
+        pass
+    return txn
+
+
+async def real_openai_ocr_to_transactions(
+    image_bytes: bytes,
+    bank: str | None = None,
+    on_transaction: TransactionCallback | None = None,
+    ocr_engine: str | None = None,
+) -> list[dict[str, Any]]:
     """End-to-end: Tesseract OCR -> OpenAI GPT-4 structuring -> transactions.
 
     Uses Tesseract for OCR (no API key restrictions), then OpenAI GPT-4 for structuring.
+    `ocr_engine` selects the Tesseract backend ("auto", "tesserocr" or
+    "pytesseract"; default `CREDITNEXT_OCR_ENGINE`). With `on_transaction`,
+    the LLM response is streamed and each transaction is reported as soon as
+    it is parsed.
     """
-    print(f"[DEBUG] real_openai_ocr_to_transactions called with bank={bank}")
+    ocr_engine = resolve_engine_name(ocr_engine)
+    cache = await asyncio.to_thread(get_cache)
+    digest = document_digest(image_bytes)
+    engine = ocr_cache_engine(ocr_engine)
+    text_key = cache_key(digest, 0, engine)
     
     # Use Tesseract OCR instead of OpenAI Vision
-    print(f"[DEBUG] Using Tesseract OCR for text extraction")
-    ocr_text = await tesseract_ocr_extract_text(image_bytes)
+    cached = await cache.aget_text(text_key) if cache else None
+    if cached is not None:
+        ocr_text = cached["text"]
+    else:
+        ocr_text = await tesseract_ocr_extract_text(image_bytes, ocr_engine)
+        if cache and ocr_text:
+            await cache.aput_text(text_key, {"source": "ocr", "text": ocr_text})
     
     if not ocr_text:
-        print("[WARNING] No OCR text extracted from Tesseract")
+        logger.warning("No OCR text extracted from Tesseract")
         return []
     
     # Use OpenAI GPT-4 to structure the extracted text
     api_key = os.environ.get("OPENAI_API_KEY", "").strip()
     if not api_key:
-        print("[ERROR] OPENAI_API_KEY is not set")
-        # Still return OCR text even without GPT-4
-        # Try to parse with heuristics
+        logger.error("OPENAI_API_KEY is not set")
         return []
     
-    print(f"[DEBUG] OpenAI API key found: {api_key[:15]}...")
-    txns = await openai_llm_extract_transactions(ocr_text, api_key=api_key, bank=bank)
+    txns_key = _transactions_cache_key(digest, 0, engine, bank)
+    txns = await cache.aget_transactions(txns_key) if cache else None
+    if txns is not None:
+        if on_transaction is not None:
+            for txn in txns:
+                await on_transaction(0, txn)
+    elif on_transaction is not None:
+
+        async def on_txn(txn: dict[str, Any]) -> None:
+            await on_transaction(0, txn)
+
+        txns = await openai_llm_stream_transactions(ocr_text, api_key=api_key, bank=bank, on_txn=on_txn)
+    else:
+        txns = await openai_llm_extract_transactions(ocr_text, api_key=api_key, bank=bank)
+    if cache and txns:
+        await cache.aput_transactions(txns_key, txns)
     
-    print(f"[DEBUG] Total extracted {len(txns)} transactions")
+    logger.debug("Image OCR pipeline done", extra={"transactions": len(txns)})
     return txns
 
 
+def ocr_cache_engine(ocr_engine: str, pdf: bool = False) -> str:
+    """The `engine` part of OCR cache keys for a resolved backend name.
+
+    Backends read the same page differently, so text cached by one must not be
+    served for another; PDF keys also carry the render DPI and text-layer cutoff.
+    """
+
+    engine = f"{TESSERACT_ENGINE}:{ocr_engine}"
+    return f"pdf:{engine}:{PDF_RENDER_DPI}:{MIN_TEXT_LAYER_CHARS}" if pdf else engine
+
+
+def _transactions_cache_key(digest: str, page: int, engine: str, bank: str | None) -> str:
+    return cache_key(digest, page, engine, OPENAI_LLM_MODEL, PROMPT_VERSION, (bank or "").lower())
+
+
 async def real_typhoon_ocr_to_transactions(image_bytes: bytes, bank: str | None = None) -> list[dict[str, Any]]:
     """End-to-end: real OCR -> LLM structuring -> transactions.
 
     Uses env var `TYPHOON_API_KEY`. If missing, raise RuntimeError.
     """
-    print(f"[DEBUG] real_typhoon_ocr_to_transactions called with bank={bank}")
     
     api_key = os.environ.get("TYPHOON_API_KEY", "").strip()
     if not api_key:
-        print("[ERROR] TYPHOON_API_KEY is not set")
+        logger.error("TYPHOON_API_KEY is not set")
         raise RuntimeError("TYPHOON_API_KEY is not set")
     
-    print(f"[DEBUG] API key found: {api_key[:10]}...")
-    print(f"[DEBUG] Calling typhoon_ocr_extract_text with {len(image_bytes)} bytes")
-    
-    ocr_text = await typhoon_ocr_extract_text(image_bytes, api_key=api_key)
-    
-    print(f"[DEBUG] OCR text length: {len(ocr_text) if ocr_text else 0}")
-    if ocr_text:
-        print(f"[DEBUG] OCR text preview: {ocr_text[:200]}...")
+    with stage("typhoon_ocr"):
+        ocr_text = await typhoon_ocr_extract_text(image_bytes, api_key=api_key)
     
     if not ocr_text:
-        print("[WARNING] No OCR text extracted")
+        logger.warning("No OCR text extracted")
         return []
 
-    print(f"[DEBUG] Calling typhoon_llm_extract_transactions")
     txns = await typhoon_llm_extract_transactions(ocr_text, api_key=api_key, bank=bank)
     
-    print(f"[DEBUG] Extracted {len(txns)} transactions")
+    logger.debug("Typhoon OCR pipeline done", extra={"text_chars": len(ocr_text), "transactions": len(txns)})
     return txns
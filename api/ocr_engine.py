@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+OCR_LANG = "tha+eng"
+# "auto" (tesserocr when installed, else pytesseract), "tesserocr" or "pytesseract".
+DEFAULT_ENGINE = os.environ.get("CREDITNEXT_OCR_ENGINE", "auto").strip().lower() or "auto"
+
+
+class OcrEngine:
+    """Turns one page image into text. Instances live for the life of a CPU worker process."""
+
+    name = "base"
+
+    def image_to_text(self, image: Image.Image, dpi: int | None = None) -> str:
+        raise NotImplementedError
+
+
+class PytesseractEngine(OcrEngine):
+    """The `tesseract` CLI through pytesseract: a new process, temp files and model load per page."""
+
+    name = "pytesseract"
+
+    def image_to_text(self, image: Image.Image, dpi: int | None = None) -> str:
+        import pytesseract
+
+        # Preprocessed images carry no DPI metadata, so pass the real one
+        # instead of letting Tesseract guess.
+        config = f"--dpi {dpi}" if dpi else ""
+        return pytesseract.image_to_string(image, lang=OCR_LANG, config=config).strip()
+
+
+class TesserocrEngine(OcrEngine):
+    """libtesseract in-process via tesserocr: the Thai/English models stay loaded between pages.
+
+    Pixels are handed over as a raw buffer (`SetImageBytes`), with no image
+    encoding or temp files. One `PyTessBaseAPI` is not thread-safe, hence the lock;
+    CPU workers run one task at a time, so it is never contended there.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self) -> None:
+        import tesserocr
+
+        self._api = tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+        self._lock = threading.Lock()
+
+    def image_to_text(self, image: Image.Image, dpi: int | None = None) -> str:
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        bpp = 1 if image.mode == "L" else 3
+        with self._lock:
+            self._api.SetImageBytes(image.tobytes(), image.width, image.height, bpp, image.width * bpp)
+            if dpi:
+                self._api.SetSourceResolution(int(dpi))
+            try:
+                return self._api.GetUTF8Text().strip()
+            finally:
+                self._api.Clear()
+
+    def close(self) -> None:
+        self._api.End()
+
+
+ENGINES: dict[str, type[OcrEngine]] = {e.name: e for e in (PytesseractEngine, TesserocrEngine)}
+
+_ENGINES: dict[str, OcrEngine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def resolve_engine_name(name: str | None = None) -> str:
+    """Concrete engine for `name` (default `CREDITNEXT_OCR_ENGINE`); "auto" prefers tesserocr."""
+
+    name = (name or DEFAULT_ENGINE).strip().lower()
+    if name == "auto":
+        return "tesserocr" if importlib.util.find_spec("tesserocr") is not None else "pytesseract"
+    if name not in ENGINES:
+        raise ValueError(f"Unknown OCR engine {name!r}; expected auto or one of {', '.join(ENGINES)}")
+    return name
+
+
+def get_ocr_engine(name: str | None = None) -> OcrEngine:
+    """This process's instance of the engine, created (models loaded) on first use."""
+
+    name = resolve_engine_name(name)
+    engine = _ENGINES.get(name)
+    if engine is None:
+        with _ENGINES_LOCK:
+            engine = _ENGINES.get(name)
+            if engine is None:
+                engine = _ENGINES[name] = ENGINES[name]()
+    return engine
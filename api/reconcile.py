@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+
+# Anything within half a satang is the same balance.
+BALANCE_TOLERANCE = 0.005
+
+
+@dataclass
+class BalanceGap:
+    """Row `index` whose printed balance does not follow from the rows before it."""
+
+    index: int
+    expected: float
+    printed: float
+
+    @property
+    def difference(self) -> float:
+        # A dropped row shows up as its own signed amount; a duplicated one as minus it.
+        return round(self.printed - self.expected, 2)
+
+
+@dataclass
+class Reconciliation:
+    transactions: list[dict[str, Any]]
+    # Rows whose printed balance was compared with the running total.
+    checked: int = 0
+    gaps: list[BalanceGap] = field(default_factory=list)
+    # Rows fixed in place: Income/Expense flipped, exact duplicates dropped.
+    repaired: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.gaps
+
+
+def reconcile(
+    txns: Iterable[dict[str, Any]], opening: float | None = None, *, repair: bool = False
+) -> Reconciliation:
+    """Check transactions against their `balance` column in one linear pass.
+
+    Rows without a balance are carried in the running total and verified by
+    the next printed balance. After a gap the chain re-anchors on the printed
+    balance, so each break is reported once. With `repair`, two LLM slips that
+    the balances pin down exactly are fixed instead of reported: a row whose
+    type is inverted, and a row repeated with the previous row's balance.
+    """
+
+    out: list[dict[str, Any]] = []
+    gaps: list[BalanceGap] = []
+    checked = repaired = 0
+    running = opening
+    anchored = opening is not None  # `running` is a printed balance, not a sum
+    for t in txns:
+        amount = float(t["amount"])
+        signed = amount if t.get("type") == "Income" else -amount
+        balance = t.get("balance")
+        if balance is None:
+            out.append(t)
+            running = None if running is None else running + signed
+            anchored = False
+            continue
+        balance = float(balance)
+        if running is not None:
+            checked += 1
+            if abs(running + signed - balance) > BALANCE_TOLERANCE:
+                if repair and anchored and abs(running - signed - balance) <= BALANCE_TOLERANCE:
+                    t = dict(t, type="Expense" if signed > 0 else "Income")
+                    repaired += 1
+                elif repair and anchored and out and abs(balance - running) <= BALANCE_TOLERANCE and _same_row(out[-1], t):
+                    repaired += 1
+                    continue
+                else:
+                    gaps.append(BalanceGap(index=len(out), expected=round(running + signed, 2), printed=balance))
+        out.append(t)
+        running, anchored = balance, True
+    return Reconciliation(transactions=out, checked=checked, gaps=gaps, repaired=repaired)
+
+
+def _same_row(a: dict[str, Any], b: dict[str, Any]) -> bool:
+    return all(a.get(k) == b.get(k) for k in ("date", "description", "amount", "type", "balance"))
@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from datetime import date
+from typing import Any
+
+try:
+    from api.reconcile import BALANCE_TOLERANCE, reconcile
+except ImportError:
+    from reconcile import BALANCE_TOLERANCE, reconcile
+
+
+# Rows are "<date> [time] <description...> <amounts...>" once the PDF text
+# layer has collapsed the table; layouts differ in how the direction of money
+# is shown (signed amounts, debit/credit columns, transaction codes) and how
+# years are written. Everything is compiled once at import.
+
+_MONEY = r"[+-]?(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2}"
+_MONEY_TOKEN = re.compile(rf"^(?:{_MONEY})$")
+# Empty debit/credit cells that survive text extraction.
+_EMPTY_CELL = frozenset({"-", "–", "—"})
+
+_THAI_MONTHS = {
+    "ม.ค.": 1, "มกราคม": 1, "ก.พ.": 2, "กุมภาพันธ์": 2, "มี.ค.": 3, "มีนาคม": 3,
+    "เม.ย.": 4, "เมษายน": 4, "พ.ค.": 5, "พฤษภาคม": 5, "มิ.ย.": 6, "มิถุนายน": 6,
+    "ก.ค.": 7, "กรกฎาคม": 7, "ส.ค.": 8, "สิงหาคม": 8, "ก.ย.": 9, "กันยายน": 9,
+    "ต.ค.": 10, "ตุลาคม": 10, "พ.ย.": 11, "พฤศจิกายน": 11, "ธ.ค.": 12, "ธันวาคม": 12,
+}
+_EN_MONTHS = {m: i for i, m in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1
+)}
+_MONTHS = {**_THAI_MONTHS, **_EN_MONTHS}
+_MONTH_ALT = "|".join(re.escape(m) for m in sorted(_MONTHS, key=len, reverse=True))
+
+_ROW_START = re.compile(
+    r"^\s*(?:"
+    r"(?P<d>\d{1,2})[/.-](?P<m>\d{1,2})[/.-](?P<y>\d{2}|\d{4})"
+    r"|(?P<iy>\d{4})-(?P<im>\d{2})-(?P<id>\d{2})"
+    rf"|(?P<td>\d{{1,2}})[\s-]*(?P<tm>{_MONTH_ALT})[a-z]*[\s-]*(?P<ty>\d{{2}}|\d{{4}})"
+    r")(?:\s+\d{1,2}[:.]\d{2}(?::\d{2})?)?(?=\s|$)",
+    re.IGNORECASE,
+)
+
+# Lines that carry a balance but are not transactions; matched on the
+# lower-cased line (cheaper than re.IGNORECASE on Thai text).
+_BALANCE_LINE = re.compile(
+    r"(?P<opening>ยอดยกมา|ยอดคงเหลือยกมา|brought\s+forward|balance\s+forward|opening\s+balance|\bb/f\b)"
+    r"|ยอดยกไป|carried\s+forward|closing\s+balance|\bc/f\b|^\s*(?:รวม|total)\b"
+)
+
+COMMON_CREDIT_KEYWORDS = (
+    "รับโอน", "โอนเข้า", "ฝากเงิน", "เงินฝาก", "รับเงิน", "ค่าจ้าง", "เงินเดือน", "ดอกเบี้ย", "รายรับ",
+    "deposit", "transfer in", "salary", "interest",
+)
+COMMON_DEBIT_KEYWORDS = (
+    "โอนออก", "โอนไป", "โอนเงิน", "ถอน", "จ่าย", "ชำระ", "ซื้อ", "เติมเงิน", "ค่าธรรมเนียม",
+    "withdraw", "payment", "transfer out", "fee",
+)
+
+@dataclass(frozen=True)
+class BankLayout:
+    name: str
+    # Lower-cased substrings that identify the bank's statements (full names and
+    # table headers: short codes like "SCB" also appear in transfer descriptions).
+    markers: tuple[str, ...] = ()
+    # Transaction-code tokens (right after the date/time) meaning money in / out.
+    credit_codes: frozenset[str] = frozenset({"CR"})
+    debit_codes: frozenset[str] = frozenset({"DR"})
+    # Rows ending in three amounts: is the withdrawal column before the deposit one?
+    debit_first: bool = True
+    # How two-digit years are written: "be" (68 = 2568 BE) or "ce" (25 = 2025).
+    two_digit_era: str = "ce"
+    credit_keywords: tuple[str, ...] = ()
+    debit_keywords: tuple[str, ...] = ()
+
+
+# Keys match the `bank` hints accepted by the OCR/LLM pipeline.
+BANK_LAYOUTS: dict[str, BankLayout] = {
+    layout.name: layout
+    for layout in (
+        BankLayout(
+            "scb",
+            markers=("ธนาคารไทยพาณิชย์", "siam commercial bank", "ถอน/โอนออก"),
+            credit_codes=frozenset({"X1", "CR"}),
+            debit_codes=frozenset({"X2", "DR"}),
+            credit_keywords=("รายการฝาก",),
+            debit_keywords=("รายการถอน",),
+        ),
+        BankLayout(
+            "kbank",
+            markers=("ธนาคารกสิกรไทย", "kasikornbank", "k plus statement"),
+            credit_keywords=("รับโอนเงิน", "ฝากเงินสด"),
+            debit_keywords=("ชำระเงิน", "ถอนเงินสด", "โอนเงิน"),
+        ),
+        BankLayout(
+            "bbl",
+            markers=("ธนาคารกรุงเทพ", "bangkok bank"),
+            credit_keywords=("เครดิต",),
+            debit_keywords=("เดบิต",),
+        ),
+        BankLayout(
+            "ktb",
+            markers=("ธนาคารกรุงไทย", "krungthai bank", "รายการเดินบัญชี"),
+            two_digit_era="be",
+        ),
+        BankLayout(
+            "bay",
+            markers=("ธนาคารกรุงศรีอยุธยา", "bank of ayudhya", "krungsri"),
+            credit_keywords=("เครดิต",),
+            debit_keywords=("เดบิต",),
+        ),
+        BankLayout(
+            "tmb",
+            markers=("ทหารไทยธนชาต", "tmbthanachart", "ttb bank"),
+        ),
+        BankLayout(
+            "gsb",
+            markers=("ธนาคารออมสิน", "government savings bank"),
+            debit_first=False,
+            two_digit_era="be",
+        ),
+        BankLayout(
+            "baac",
+            markers=("ธ.ก.ส.", "ธนาคารเพื่อการเกษตรและสหกรณ์การเกษตร", "baac"),
+            debit_first=False,
+            two_digit_era="be",
+            credit_keywords=("ฝาก",),
+            debit_keywords=("ถอน",),
+        ),
+    )
+}
+GENERIC_LAYOUT = BankLayout("generic")
+
+
+@dataclass
+class StatementParse:
+    layout: str
+    transactions: list[dict[str, Any]]
+    # Rows whose balance was checked against the previous one, and the
+    # indexes (into `transactions`) of rows where the running balance broke.
+    balance_checked: int = 0
+    balance_mismatches: list[int] = field(default_factory=list)
+    # Rows whose Income/Expense came from keywords alone, and those of them
+    # matching both or neither keyword list (typed Expense).
+    keyword_typed: int = 0
+    keyword_ambiguous: int = 0
+
+    @property
+    def trusted(self) -> bool:
+        """Safe to use without an LLM: every row typed from the layout and the balances chain."""
+
+        return (
+            bool(self.transactions)
+            and not self.balance_mismatches
+            and self.keyword_typed == 0
+            and self.keyword_ambiguous == 0
+        )
+
+
+def detect_layout(text: str, bank: str | None = None) -> BankLayout:
+    """Layout for `bank` when given and known, else the first whose markers appear in `text`."""
+
+    if bank and bank.lower() in BANK_LAYOUTS:
+        return BANK_LAYOUTS[bank.lower()]
+    lowered = text.lower()
+    for layout in BANK_LAYOUTS.values():
+        if any(marker in lowered for marker in layout.markers):
+            return layout
+    return GENERIC_LAYOUT
+
+
+def parse_statement_text(text: str, bank: str | None = None) -> StatementParse:
+    """Transactions from statement text, typed and checked against the running balance.
+
+    Rows keep their statement `balance` when it is printed; amounts are
+    positive and `type` is Income/Expense. Lines without a leading date
+    (headers, totals, notes) are ignored.
+    """
+
+    layout = detect_layout(text, bank)
+    keywords = _direction_keywords(layout)
+
+    txns: list[dict[str, Any]] = []
+    keyword_typed = keyword_ambiguous = 0
+    prev_balance: float | None = None
+    opening: float | None = None
+
+    for line in text.splitlines():
+        marker = _BALANCE_LINE.search(line.lower())
+        if marker is not None:
+            if marker.group("opening"):
+                prev_balance = _last_money(line, prev_balance)
+                if not txns:
+                    opening = prev_balance
+            continue
+        m = _ROW_START.match(line)
+        if m is None:
+            continue
+        day = _row_date(m, layout)
+        if day is None:
+            continue
+
+        tokens = line[m.end() :].split()
+        amounts: list[str] = []
+        while tokens and (_MONEY_TOKEN.match(tokens[-1]) or tokens[-1] in _EMPTY_CELL):
+            amounts.append(tokens.pop())
+        amounts.reverse()
+        money = [a for a in amounts if a not in _EMPTY_CELL]
+        if not money:
+            continue
+
+        balance = None
+        is_credit: bool | None = None
+        if len(amounts) >= 3:
+            # debit | credit | balance; the empty side is "-" or 0.00.
+            first, second, balance = _money(amounts[-3]), _money(amounts[-2]), _money(amounts[-1])
+            debit, credit = (first, second) if layout.debit_first else (second, first)
+            if debit and not credit:
+                amount, is_credit = debit, False
+            elif credit and not debit:
+                amount, is_credit = credit, True
+            else:
+                continue
+        else:
+            raw = money[0]
+            amount = _money(raw)
+            if len(money) == 2:
+                balance = _money(money[1])
+            if raw[0] in "+-":
+                is_credit = raw[0] == "+"
+        if amount is None or amount == 0.0:
+            continue
+
+        code = tokens[0].upper() if tokens else ""
+        if is_credit is None and code in layout.credit_codes:
+            is_credit = True
+        elif is_credit is None and code in layout.debit_codes:
+            is_credit = False
+        if code in layout.credit_codes or code in layout.debit_codes:
+            tokens = tokens[1:]
+        description = " ".join(tokens)
+
+        if is_credit is None and balance is not None and prev_balance is not None:
+            if abs(prev_balance + abs(amount) - balance) <= BALANCE_TOLERANCE:
+                is_credit = True
+            elif abs(prev_balance - abs(amount) - balance) <= BALANCE_TOLERANCE:
+                is_credit = False
+        if is_credit is None:
+            keyword_typed += 1
+            is_credit = _keyword_credit(description, keywords)
+            if is_credit is None:
+                # Unknown rows count as Expense (conservative, like the LLM prompt).
+                keyword_ambiguous += 1
+                is_credit = False
+
+        txn: dict[str, Any] = {
+            "date": day.isoformat(),
+            "description": description or ("รายการรับเงิน" if is_credit else "รายการจ่ายเงิน"),
+            "amount": abs(amount),
+            "type": "Income" if is_credit else "Expense",
+        }
+        if balance is not None:
+            txn["balance"] = balance
+            prev_balance = balance
+        elif prev_balance is not None:
+            prev_balance += abs(amount) if is_credit else -abs(amount)
+        txns.append(txn)
+
+    report = reconcile(txns, opening)
+    return StatementParse(
+        layout=layout.name,
+        transactions=txns,
+        balance_checked=report.checked,
+        balance_mismatches=[gap.index for gap in report.gaps],
+        keyword_typed=keyword_typed,
+        keyword_ambiguous=keyword_ambiguous,
+    )
+
+
+def opening_balance(text: str) -> float | None:
+    """The brought-forward balance printed before the first row of `text`, if any."""
+
+    for line in text.splitlines():
+        if is_opening_line(line):
+            return _last_money(line, None)
+        if is_row_line(line):
+            return None
+    return None
+
+
+def is_row_line(line: str) -> bool:
+    """Whether `line` starts a transaction row (begins with a date)."""
+
+    return _ROW_START.match(line) is not None
+
+
+def is_opening_line(line: str) -> bool:
+    marker = _BALANCE_LINE.search(line.lower())
+    return marker is not None and marker.group("opening") is not None
+
+
+def row_balance(line: str) -> float | None:
+    """The running balance printed on a row line: its last amount, if it has two (amount, balance)."""
+
+    if not is_row_line(line) or sum(1 for token in line.split() if _MONEY_TOKEN.match(token)) < 2:
+        return None
+    return _last_money(line, None)
+
+
+def _row_date(m: re.Match, layout: BankLayout) -> date | None:
+    if m.group("d"):
+        d, mo, y = int(m.group("d")), int(m.group("m")), m.group("y")
+    elif m.group("iy"):
+        d, mo, y = int(m.group("id")), int(m.group("im")), m.group("iy")
+    else:
+        d, mo, y = int(m.group("td")), _MONTHS[m.group("tm").lower()], m.group("ty")
+    year = int(y)
+    if len(y) == 2:
+        year += 2500 if layout.two_digit_era == "be" else 2000
+    if year > 2400:
+        year -= 543  # Buddhist era
+    try:
+        return date(year, mo, d)
+    except ValueError:
+        return None
+
+
+def _money(token: str) -> float | None:
+    if token in _EMPTY_CELL:
+        return None
+    return float(token.replace(",", ""))
+
+
+def _last_money(line: str, default: float | None) -> float | None:
+    for token in reversed(line.split()):
+        if _MONEY_TOKEN.match(token):
+            return _money(token)
+    return default
+
+
+@lru_cache(maxsize=None)
+def _direction_keywords(layout: BankLayout) -> tuple[re.Pattern, dict[str, bool]]:
+    # keyword -> is_credit; a keyword in both lists counts as credit.
+    sides = {k: False for k in layout.debit_keywords + COMMON_DEBIT_KEYWORDS}
+    sides.update({k: True for k in layout.credit_keywords + COMMON_CREDIT_KEYWORDS})
+    pattern = re.compile("|".join(re.escape(k) for k in sorted(sides, key=len, reverse=True)))
+    return pattern, sides
+
+
+def _keyword_credit(description: str, keywords: tuple[re.Pattern, dict[str, bool]]) -> bool | None:
+    """True/False when only credit/debit keywords match; None when both or neither do.
+
+    Keywords are matched leftmost-longest without overlaps, so "รับโอนเงิน"
+    counts as the credit "รับโอน", not also as the debit "โอนเงิน".
+    """
+
+    pattern, sides = keywords
+    found = {sides[m.group(0)] for m in pattern.finditer(description.lower())}
+    return found.pop() if len(found) == 1 else None
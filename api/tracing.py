@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+
+# W3C trace context: version-traceid-parentid-flags.
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    sampled: bool
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> dict[str, Any]:
+        """The span in OTLP/JSON field naming, one object per exported line."""
+
+        out: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        return out
+
+
+class _StageTimes:
+    """Per-request totals by span name, for the `Server-Timing` header."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.totals: dict[str, list[float]] = {}
+
+    def add(self, name: str, ms: float) -> None:
+        with self._lock:
+            entry = self.totals.setdefault(name, [0.0, 0])
+            entry[0] += ms
+            entry[1] += 1
+
+
+_CURRENT: contextvars.ContextVar[Span | None] = contextvars.ContextVar("creditnext_span", default=None)
+_STAGES: contextvars.ContextVar[_StageTimes | None] = contextvars.ContextVar("creditnext_stages", default=None)
+
+
+class _FileExporter:
+    def __init__(self, stream) -> None:
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_otlp(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+
+_EXPORTER: _FileExporter | None = None
+_EXPORTER_READY = False
+
+
+def _exporter() -> _FileExporter | None:
+    """From `CREDITNEXT_TRACE_EXPORTER`: none (default), console (stderr) or file (`CREDITNEXT_TRACE_FILE`)."""
+
+    global _EXPORTER, _EXPORTER_READY
+    if not _EXPORTER_READY:
+        kind = os.environ.get("CREDITNEXT_TRACE_EXPORTER", "none").strip().lower()
+        if kind == "console":
+            _EXPORTER = _FileExporter(sys.stderr)
+        elif kind == "file":
+            path = os.environ.get("CREDITNEXT_TRACE_FILE") or "creditnext-traces.jsonl"
+            _EXPORTER = _FileExporter(open(path, "a", encoding="utf-8"))
+        _EXPORTER_READY = True
+    return _EXPORTER
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """(trace_id, parent_span_id, sampled) from a `traceparent` header, or None."""
+
+    m = _TRACEPARENT.match((header or "").strip().lower())
+    if not m or m.group(1) == "0" * 32 or m.group(2) == "0" * 16:
+        return None
+    return m.group(1), m.group(2), bool(int(m.group(3), 16) & 1)
+
+
+@contextmanager
+def start_request(name: str, traceparent: str | None = None, **attributes: Any) -> Iterator[Span]:
+    """Root span for one request, continuing the caller's trace when `traceparent` is valid."""
+
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id, sampled = secrets.token_hex(16), None, True
+    root = Span(name, trace_id, secrets.token_hex(8), parent_id, sampled, attributes=dict(attributes))
+    span_token = _CURRENT.set(root)
+    stages_token = _STAGES.set(_StageTimes())
+    try:
+        yield root
+    except BaseException as e:
+        root.error = type(e).__name__
+        raise
+    finally:
+        _finish(root)
+        _CURRENT.reset(span_token)
+        _STAGES.reset(stages_token)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """Child span of the current one; a no-op outside a traced request."""
+
+    parent = _CURRENT.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, secrets.token_hex(8), parent.span_id, parent.sampled, attributes=attributes)
+    token = _CURRENT.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = type(e).__name__
+        raise
+    finally:
+        _CURRENT.reset(token)
+        _finish(child)
+
+
+def record_span(name: str, duration_ms: float, **attributes: Any) -> None:
+    """Add an already-finished child span, e.g. a stage timed in an executor worker."""
+
+    parent = _CURRENT.get()
+    if parent is None:
+        return
+    end = time.time_ns()
+    _finish(
+        Span(
+            name,
+            parent.trace_id,
+            secrets.token_hex(8),
+            parent.span_id,
+            parent.sampled,
+            start_ns=end - int(duration_ms * 1e6),
+            end_ns=end,
+            attributes=attributes,
+        )
+    )
+
+
+def _finish(s: Span) -> None:
+    if s.end_ns is None:
+        s.end_ns = time.time_ns()
+    stages = _STAGES.get()
+    if stages is not None and s.parent_id is not None and _CURRENT.get() is not s:
+        stages.add(s.name, s.duration_ms)
+    exporter = _exporter()
+    if exporter is not None and s.sampled:
+        exporter.export(s)
+
+
+def server_timing(root: Span) -> str:
+    """`Server-Timing` value: summed duration per stage name, plus the request total.
+
+    Stages that ran concurrently (pages, LLM chunks) are summed, so their
+    total can exceed `total`; `desc` gives the number of calls.
+    """
+
+    parts = []
+    stages = _STAGES.get()
+    for name, (ms, count) in (stages.totals.items() if stages is not None else ()):
+        part = f"{_token(name)};dur={ms:.1f}"
+        if count > 1:
+            part += f';desc="{count}x"'
+        parts.append(part)
+    parts.append(f"total;dur={root.duration_ms:.1f}")
+    return ", ".join(parts)
+
+
+def _token(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def _otlp_value(v: Any) -> dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from fastapi import UploadFile
+
+
+MAX_UPLOAD_BYTES = int(float(os.environ.get("CREDITNEXT_MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+# Where uploads are spooled; the system temp dir by default.
+UPLOAD_DIR = os.environ.get("CREDITNEXT_UPLOAD_DIR") or None
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """Upload exceeds `CREDITNEXT_MAX_UPLOAD_MB` (mapped to HTTP 413)."""
+
+
+@dataclass
+class SpooledUpload:
+    """An upload copied to a temp file, so workers open it by path instead of receiving its bytes.
+
+    `digest` is the SHA-256 of the upload, computed while spooling. `close()`
+    removes the file and every `scratch_path` handed out for it.
+    """
+
+    path: str
+    filename: str
+    size: int
+    digest: str
+    _scratch: list[str] = field(default_factory=list, repr=False)
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.filename.lower().endswith(".pdf")
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def scratch_path(self, suffix: str) -> str:
+        """A path next to the upload (e.g. its decrypted copy), deleted with it."""
+
+        path = f"{self.path}.{suffix}"
+        self._scratch.append(path)
+        return path
+
+    def close(self) -> None:
+        for path in [self.path, *self._scratch]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._scratch.clear()
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledUpload:
+    """Copy `file` to a temp file in `CHUNK_SIZE` pieces, hashing as it goes.
+
+    At most one chunk is in memory at a time. Raises `UploadTooLarge` as soon
+    as more than `max_bytes` have arrived; the partial file is removed.
+    """
+
+    filename = file.filename or ""
+    fd, path = tempfile.mkstemp(prefix="creditnext-", suffix=os.path.splitext(filename)[1][:10], dir=UPLOAD_DIR)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload is larger than {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return SpooledUpload(path=path, filename=filename, size=size, digest=digest.hexdigest())
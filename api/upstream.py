@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator
+
+try:
+    from api.log import get_logger
+    from api.metrics import UPSTREAM_RESPONSES
+except ImportError:
+    from log import get_logger
+    from metrics import UPSTREAM_RESPONSES
+
+if TYPE_CHECKING:
+    import httpx
+
+
+logger = get_logger("upstream")
+
+# Statuses worth retrying: rate limiting and transient upstream failures.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without contacting the host while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Per-host breaker: opens after `failure_threshold` consecutive failures.
+
+    While open every call fails fast; after `reset_timeout` seconds a single
+    trial request is let through (half-open) and its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def acquire(self) -> tuple[bool, bool]:
+        """`allow()`, plus whether the caller now holds the half-open trial slot."""
+
+        trial = self.state == "half_open"
+        allowed = self.allow()
+        return allowed, allowed and trial
+
+    def release_trial(self) -> None:
+        """Free the trial slot of a request that ended without an outcome.
+
+        Cancellation, unexpected errors and 429s neither close nor re-open the
+        circuit; without this the breaker would stay half-open with its only
+        slot taken, and refuse the host forever.
+        """
+
+        self._trial_in_flight = False
+
+
+class UpstreamClient:
+    """Shared keep-alive HTTP client for the OCR/LLM providers.
+
+    Wraps one `httpx.AsyncClient` (HTTP/2 when `h2` is installed) so TLS
+    connections are reused across requests, caps in-flight requests per host,
+    retries 429/5xx and transport errors with jittered exponential backoff
+    (honouring `Retry-After`), and trips a per-host circuit breaker on
+    repeated 5xx/transport failures. `transport` lets callers point it at a
+    local stub server or an `httpx.MockTransport`.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 60.0,
+        max_connections: int = 50,
+        max_connections_per_host: int = 10,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        retry_after_max: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        http2: bool | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        import httpx
+
+        if http2 is None:
+            http2 = importlib.util.find_spec("h2") is not None
+        self.max_connections_per_host = max_connections_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send with retries; returns the final response (possibly a 4xx/5xx).
+
+        Raises `CircuitOpenError` when the host's breaker is open and the last
+        `httpx.TransportError` when retries are exhausted.
+        """
+
+        import httpx  # already loaded by __init__; keeps module import cheap
+
+        host = httpx.URL(url).host
+        breaker = self.breaker(host)
+        allowed, trial = breaker.acquire()
+        if not allowed:
+            UPSTREAM_RESPONSES.labels(host, "circuit_open").inc()
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        attempt = 0
+        try:
+            while True:
+                try:
+                    async with self._slot(host):
+                        resp = await self._client.request(method, url, **kwargs)
+                except httpx.TransportError:
+                    UPSTREAM_RESPONSES.labels(host, "transport_error").inc()
+                    breaker.record_failure()
+                    trial = False
+                    if attempt >= self.max_retries:
+                        raise
+                    allowed, trial = breaker.acquire()
+                    if not allowed:
+                        raise
+                    delay = self._backoff(attempt)
+                else:
+                    UPSTREAM_RESPONSES.labels(host, resp.status_code).inc()
+                    if resp.status_code not in RETRY_STATUSES:
+                        breaker.record_success()
+                        return resp
+                    # Rate limiting is not an outage: retry it, but don't trip the breaker.
+                    if resp.status_code == 429:
+                        if trial:
+                            breaker.release_trial()
+                    else:
+                        breaker.record_failure()
+                    trial = False
+                    if attempt >= self.max_retries:
+                        return resp
+                    allowed, trial = breaker.acquire()
+                    if not allowed:
+                        return resp
+                    retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                    delay = min(retry_after, self.retry_after_max) if retry_after is not None else self._backoff(attempt)
+                    await resp.aclose()
+                attempt += 1
+                await asyncio.sleep(delay)
+        except BaseException:
+            # Cancelled, or an error other than a transport failure: no verdict on the host.
+            if trial:
+                breaker.release_trial()
+            raise
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Like `request`, but yields the response with its body unread.
+
+        Retries apply only until response headers arrive; once the body starts
+        streaming, errors propagate to the caller. The per-host slot is held
+        until the stream is closed.
+        """
+
+        import httpx  # already loaded by __init__; keeps module import cheap
+
+        host = httpx.URL(url).host
+        breaker = self.breaker(host)
+        allowed, trial = breaker.acquire()
+        if not allowed:
+            UPSTREAM_RESPONSES.labels(host, "circuit_open").inc()
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        attempt = 0
+        try:
+            while True:
+                delay = None
+                async with self._slot(host):
+                    try:
+                        resp = await self._client.send(self._client.build_request(method, url, **kwargs), stream=True)
+                    except httpx.TransportError:
+                        UPSTREAM_RESPONSES.labels(host, "transport_error").inc()
+                        breaker.record_failure()
+                        trial = False
+                        if attempt >= self.max_retries:
+                            raise
+                        allowed, trial = breaker.acquire()
+                        if not allowed:
+                            raise
+                        delay = self._backoff(attempt)
+                    else:
+                        UPSTREAM_RESPONSES.labels(host, resp.status_code).inc()
+                        retry = False
+                        if resp.status_code in RETRY_STATUSES:
+                            if resp.status_code == 429:
+                                if trial:
+                                    breaker.release_trial()
+                            else:
+                                breaker.record_failure()
+                            trial = False
+                            if attempt < self.max_retries:
+                                retry, trial = breaker.acquire()
+                        else:
+                            breaker.record_success()
+                            trial = False
+                        if retry:
+                            retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                            delay = min(retry_after, self.retry_after_max) if retry_after is not None else self._backoff(attempt)
+                            await resp.aclose()
+                        else:
+                            try:
+                                yield resp
+                            finally:
+                                await resp.aclose()
+                            return
+                attempt += 1
+                await asyncio.sleep(delay)
+        except BaseException:
+            if trial:
+                breaker.release_trial()
+            raise
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[host]
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _slot(self, host: str) -> asyncio.Semaphore:
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return self._host_slots[host]
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from many workers from synchronising.
+        return random.uniform(0.0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_UPSTREAM: UpstreamClient | None = None
+_UPSTREAM_LOOP: asyncio.AbstractEventLoop | None = None
+# Close tasks for clients replaced on a loop change; held so they aren't garbage collected.
+_CLOSING: set[asyncio.Task] = set()
+
+
+def get_upstream() -> UpstreamClient:
+    """The process-wide client, created on first use inside the running loop.
+
+    httpx pools are bound to the event loop they were first used on, so a
+    call from a different loop (scripts, tests) gets a fresh client and the
+    old one is closed.
+    """
+
+    global _UPSTREAM, _UPSTREAM_LOOP
+    loop = asyncio.get_running_loop()
+    if _UPSTREAM is None or _UPSTREAM_LOOP is not loop:
+        if _UPSTREAM is not None:
+            _close_stale(_UPSTREAM, _UPSTREAM_LOOP)
+        _UPSTREAM = UpstreamClient(
+            timeout=float(os.environ.get("CREDITNEXT_HTTP_TIMEOUT", "60")),
+            max_connections_per_host=int(os.environ.get("CREDITNEXT_HTTP_MAX_CONNECTIONS_PER_HOST", "10")),
+            max_retries=int(os.environ.get("CREDITNEXT_HTTP_MAX_RETRIES", "3")),
+        )
+        _UPSTREAM_LOOP = loop
+    return _UPSTREAM
+
+
+def _close_stale(client: UpstreamClient, loop: asyncio.AbstractEventLoop | None) -> None:
+    """Close a client left behind by another loop, on that loop while it still runs.
+
+    A loop that has stopped can't finish closing its connections; closing the
+    client from here still empties its pool, and the sockets go with the loop.
+    """
+
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(_aclose_quietly(client), loop)
+        return
+    task = asyncio.get_running_loop().create_task(_aclose_quietly(client))
+    _CLOSING.add(task)
+    task.add_done_callback(_CLOSING.discard)
+
+
+async def _aclose_quietly(client: UpstreamClient) -> None:
+    try:
+        await client.aclose()
+    except Exception:
+        logger.debug("Closing a stale upstream client failed", exc_info=True)
+
+
+async def startup_upstream() -> None:
+    """Build the client ahead of the first provider call (imports httpx)."""
+
+    get_upstream()
+
+
+async def shutdown_upstream() -> None:
+    global _UPSTREAM, _UPSTREAM_LOOP
+    if _UPSTREAM is not None:
+        await _UPSTREAM.aclose()
+    _UPSTREAM = None
+    _UPSTREAM_LOOP = None
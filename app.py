@@ -1,16 +1,14 @@
 import json
 from datetime import datetime
 
-import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 
-from src.credit_model import (
-    CreditModelArtifacts,
-    ScoreResult,
-    train_dummy_credit_model,
-)
+from api.cache import document_digest
+from api.features import TransactionColumns, build_features, summarize_cashflow
+from api.model import ModelBundle, load_or_train_model
+from src.credit_model import ScoreResult, render_waterfall_png, score_with_bundle
 from src.industry import classify_industry_and_profit
 from src.ocr import mock_typhoon_ocr
 from src.ui import inject_global_css, render_app_header, render_home
@@ -33,47 +31,36 @@ def _init_state() -> None:
     st.session_state.setdefault("monthly_income_est", None)
     st.session_state.setdefault("features", None)
     st.session_state.setdefault("score_result", None)
-    st.session_state.setdefault("model_artifacts", None)
 
 
 def _goto(route: str) -> None:
     st.session_state["route"] = route
 
 
+@st.cache_resource(show_spinner=False)
+def _model_bundle() -> ModelBundle:
+    # One model per process, shared by every session: the API's on-disk artifact
+    # (CREDITNEXT_MODEL_PATH), trained and persisted only if it is missing.
+    return load_or_train_model(seed=42)
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def _ocr_transactions(digest: str, _image_bytes: bytes) -> list[dict]:
+    # Keyed by content hash; the leading underscore keeps Streamlit from hashing the bytes again.
+    return mock_typhoon_ocr(_image_bytes)
+
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def _waterfall_png(
+    features: tuple[tuple[str, float], ...], base_value: float, contributions: tuple[tuple[str, float], ...]
+) -> bytes | None:
+    # The model is fixed per process, so the chart only depends on the feature vector.
+    return render_waterfall_png(_model_bundle().feature_order, dict(features), base_value, dict(contributions))
+
+
 def _transactions_to_features(df: pd.DataFrame, industry_factor: float, proxy_net_profit: float) -> dict:
-    income = df.loc[df["type"] == "Income", "amount"].sum()
-    expense = df.loc[df["type"] == "Expense", "amount"].sum()
-
-    total = max(income + expense, 1.0)
-    expense_ratio = float(expense / total)
-
-    # Consistency proxy: lower volatility in daily net flows is better.
-    df_day = df.copy()
-    df_day["date"] = pd.to_datetime(df_day["date"], errors="coerce")
-    df_day = df_day.dropna(subset=["date"])  # defensive
-    if len(df_day) == 0:
-        consistency = 0.5
-    else:
-        df_day["signed_amount"] = np.where(df_day["type"] == "Income", df_day["amount"], -df_day["amount"])
-        daily = df_day.groupby(df_day["date"].dt.date)["signed_amount"].sum()
-        if len(daily) <= 1:
-            consistency = 0.7
-        else:
-            vol = float(np.std(daily.values))
-            avg = float(np.mean(np.abs(daily.values)))
-            consistency = float(1.0 - (vol / (avg + 1e-6)))
-            consistency = float(np.clip(consistency, 0.0, 1.0))
-
-    # Cashflow strength in log-scale to reduce sensitivity.
-    cashflow_strength = float(np.log1p(max(proxy_net_profit, 0.0)))
-
-    return {
-        "expense_ratio": expense_ratio,
-        "consistency": consistency,
-        "industry_factor": float(industry_factor),
-        "proxy_net_profit": float(proxy_net_profit),
-        "cashflow_strength": cashflow_strength,
-    }
+    # Same single-pass feature engine as the API.
+    return build_features(summarize_cashflow(TransactionColumns.from_frame(df)), industry_factor, proxy_net_profit)
 
 
 def _score_to_grade(score: int) -> str:
@@ -124,12 +111,18 @@ def _render_score_gauge(score: int) -> None:
     st.plotly_chart(fig, use_container_width=True)
 
 
-def _render_shap_explain(score_result: ScoreResult) -> None:
+def _render_shap_explain(score_result: ScoreResult, features: dict) -> None:
     st.markdown("<div class='section-title'>Why this score?</div>", unsafe_allow_html=True)
 
-    if score_result.shap_waterfall_fig is not None:
-        st.pyplot(score_result.shap_waterfall_fig, clear_figure=True)
-        return
+    if score_result.feature_contributions:
+        png = _waterfall_png(
+            tuple(sorted(features.items())),
+            score_result.base_value,
+            tuple(sorted(score_result.feature_contributions.items())),
+        )
+        if png is not None:
+            st.image(png, use_container_width=True)
+            return
 
     # Fallback: simulated contribution bars.
     contrib = score_result.feature_contributions
@@ -199,7 +192,6 @@ def render_assessment() -> None:
                 "monthly_income_est",
                 "features",
                 "score_result",
-                "model_artifacts",
             ]:
                 st.session_state[k] = None
             st.rerun()
@@ -211,7 +203,8 @@ def render_assessment() -> None:
                 with st.spinner("Simulating Typhoon OCR on Thai bills..."):
                     txns = []
                     for f in files:
-                        txns.extend(mock_typhoon_ocr(f.getvalue()))
+                        data = f.getvalue()
+                        txns.extend(_ocr_transactions(document_digest(data), data))
 
                     df = pd.DataFrame(txns)
                     st.session_state["transactions"] = df
@@ -225,10 +218,7 @@ def render_assessment() -> None:
                     features = _transactions_to_features(df, factor, profit)
                     st.session_state["features"] = features
 
-                    artifacts = train_dummy_credit_model(seed=42)
-                    st.session_state["model_artifacts"] = artifacts
-
-                    score_result = artifacts.score(features)
+                    score_result = score_with_bundle(_model_bundle(), features)
                     st.session_state["score_result"] = score_result
 
                 st.success("Analysis complete.")
@@ -282,7 +272,7 @@ def render_assessment() -> None:
         )
 
         st.markdown("<div class='spacer'></div>", unsafe_allow_html=True)
-        _render_shap_explain(score_result)
+        _render_shap_explain(score_result, st.session_state["features"])
 
         st.markdown("</div>", unsafe_allow_html=True)
 
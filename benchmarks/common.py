@@ -0,0 +1,150 @@
+"""Timing, result files and baseline comparison shared by the benchmark scripts."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable
+
+import numpy as np
+
+
+RESULT_FORMAT_VERSION = 1
+# Latency stats compared against a baseline; higher is worse for all of them.
+COMPARED_STATS = ("p50_ms", "p95_ms")
+
+
+def synthetic_statement(n_rows: int, seed: int = 0) -> list[dict[str, Any]]:
+    """`n_rows` plausible transactions over ~6 months, as `/analyze` accepts them."""
+
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    incomes = ["ค่าจ้าง งานออกแบบ", "รับโอนจาก ลูกค้า", "ขายของ ตลาดนัด", "freelance payout"]
+    expenses = ["ค่าวัตถุดิบ", "ค่าเช่าแผง", "โอนให้แม่", "ชำระค่าไฟฟ้า", "ถอนเงินสด ATM"]
+    rows = []
+    for _ in range(n_rows):
+        income = rng.random() < 0.45
+        rows.append(
+            {
+                "date": (start + timedelta(days=rng.randrange(182))).isoformat(),
+                "description": rng.choice(incomes if income else expenses),
+                "amount": round(rng.uniform(20.0, 15000.0 if income else 6000.0), 2),
+                "type": "Income" if income else "Expense",
+            }
+        )
+    return rows
+
+
+def measure(fn: Callable[[], Any], *, min_time: float = 0.5, min_repeat: int = 5, max_repeat: int = 1000) -> list[float]:
+    """Call `fn` after one warm-up until `min_time` seconds and `min_repeat` calls; returns ms per call."""
+
+    fn()
+    samples: list[float] = []
+    started = time.perf_counter()
+    while len(samples) < max_repeat and (len(samples) < min_repeat or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+def summarize(samples_ms: list[float], wall_seconds: float | None = None, **extra: Any) -> dict[str, Any]:
+    """Latency percentiles plus throughput (calls/s over `wall_seconds`, or serial)."""
+
+    a = np.asarray(samples_ms, dtype=float)
+    if a.size == 0:
+        return {"n": 0, **extra}
+    wall = wall_seconds if wall_seconds is not None else float(a.sum()) / 1000.0
+    return {
+        "n": int(a.size),
+        "mean_ms": round(float(a.mean()), 4),
+        "p50_ms": round(float(np.percentile(a, 50)), 4),
+        "p95_ms": round(float(np.percentile(a, 95)), 4),
+        "p99_ms": round(float(np.percentile(a, 99)), 4),
+        "max_ms": round(float(a.max()), 4),
+        "throughput_per_s": round(a.size / wall, 2) if wall > 0 else None,
+        **extra,
+    }
+
+
+def run_metadata() -> dict[str, Any]:
+    meta: dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    try:
+        import xgboost
+
+        meta["xgboost"] = xgboost.__version__
+    except ImportError:
+        pass
+    try:
+        meta["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return meta
+
+
+def add_output_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.20,
+        help="allowed slowdown vs the baseline before a case counts as a regression (default 0.20 = 20%%)",
+    )
+
+
+def finish(args: argparse.Namespace, suite: str, results: dict[str, dict[str, Any]]) -> int:
+    """Print, optionally save and compare results; returns the process exit code."""
+
+    print(f"{'case':<36} {'n':>6} {'p50_ms':>10} {'p95_ms':>10} {'p99_ms':>10} {'per_s':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:<36} {r.get('n', 0):>6} {r.get('p50_ms', float('nan')):>10.3f} "
+            f"{r.get('p95_ms', float('nan')):>10.3f} {r.get('p99_ms', float('nan')):>10.3f} "
+            f"{r.get('throughput_per_s') or 0:>10.1f}"
+        )
+
+    document = {"format_version": RESULT_FORMAT_VERSION, "suite": suite, "meta": run_metadata(), "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {args.out}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get("results", {}), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} vs {args.baseline}")
+    return 1 if regressions else 0
+
+
+def compare(results: dict[str, dict[str, Any]], baseline: dict[str, dict[str, Any]], tolerance: float) -> list[str]:
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for stat in COMPARED_STATS:
+            old, new = base.get(stat), r.get(stat)
+            if old and new is not None and new > old * (1.0 + tolerance):
+                regressions.append(f"{name} {stat}: {old:.3f} -> {new:.3f} ms ({new / old - 1.0:+.0%})")
+    return regressions
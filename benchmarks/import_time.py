@@ -0,0 +1,143 @@
+"""Cold-start benchmark: import cost per package and time to first response.
+
+    python -m benchmarks.import_time [--repeat 5] [--top 15] [--budget-ms 1000] \
+        [--out results.json] [--baseline baseline.json]
+
+Every sample is a fresh interpreter. `python -X importtime -c "import api.main"`
+gives the per-package table (self time of every module, grouped by top-level
+package, so the rows add up to the total); a second child process times
+`import api.main`, the startup hook and the first `/analyze` call. The run
+fails when the median import + startup ("ready") exceeds `--budget-ms`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.common import add_output_args, finish, summarize, synthetic_statement
+
+
+# Where a serverless cold start has to be ready by: import + startup hook.
+DEFAULT_BUDGET_MS = 1000.0
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+# Runs in the child: times each cold-start phase and reports which heavy
+# stacks ended up imported.
+_PHASES = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+from api import main
+t1 = time.perf_counter()
+asyncio.run(main._startup())
+t2 = time.perf_counter()
+main.analyze(main.AnalyzeRequest(transactions=json.loads(sys.argv[1])))
+t3 = time.perf_counter()
+heavy = ["pandas", "sklearn", "xgboost", "shap", "matplotlib", "numba", "PIL", "pytesseract", "httpx", "pypdf"]
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000.0,
+    "startup_ms": (t2 - t1) * 1000.0,
+    "first_analyze_ms": (t3 - t2) * 1000.0,
+    "loaded_at_ready": [m for m in heavy if m in sys.modules],
+}))
+"""
+
+
+def _child_env() -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    env.pop("CREDITNEXT_PRELOAD", None)
+    return env
+
+
+def import_profile() -> tuple[dict[str, float], float]:
+    """(self ms per top-level package, total ms) for one cold `import api.main`."""
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.main"],
+        capture_output=True,
+        text=True,
+        env=_child_env(),
+        check=True,
+    )
+    per_package: dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        per_package[name.split(".")[0]] += self_us / 1000.0
+        if len(indent) <= 1:
+            total += cumulative_us / 1000.0
+    return dict(per_package), total
+
+
+def phases(transactions: list[dict]) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _PHASES, json.dumps(transactions)],
+        capture_output=True,
+        text=True,
+        env=_child_env(),
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="median import + startup budget")
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    # Warm the OS file cache and make sure the model artifact exists, so the
+    # samples measure imports rather than disk reads or training.
+    phases(synthetic_statement(50))
+
+    per_package: dict[str, list[float]] = defaultdict(list)
+    import_totals = []
+    for _ in range(args.repeat):
+        packages, total = import_profile()
+        import_totals.append(total)
+        for name, ms in packages.items():
+            per_package[name].append(ms)
+
+    print(f"{'package':<24} {'median_ms':>10}")
+    ranked = sorted(per_package.items(), key=lambda kv: -float(np.median(kv[1])))
+    for name, samples in ranked[: args.top]:
+        print(f"{name:<24} {float(np.median(samples)):>10.1f}")
+    print(f"{'(total, -X importtime)':<24} {float(np.median(import_totals)):>10.1f}")
+
+    runs = [phases(synthetic_statement(50)) for _ in range(args.repeat)]
+    loaded = runs[-1]["loaded_at_ready"]
+    print(f"Heavy modules loaded by the first /analyze: {', '.join(loaded) or 'none'}")
+
+    ready = [r["import_ms"] + r["startup_ms"] for r in runs]
+    results = {
+        "cold.import_api_main": summarize([r["import_ms"] for r in runs]),
+        "cold.startup": summarize([r["startup_ms"] for r in runs]),
+        "cold.ready": summarize(ready, budget_ms=args.budget_ms),
+        "cold.first_analyze": summarize([r["first_analyze_ms"] for r in runs]),
+    }
+    status = finish(args, "import_time", results)
+
+    median_ready = float(np.median(ready))
+    if median_ready > args.budget_ms:
+        print(f"OVER BUDGET: ready in {median_ready:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        return 1
+    print(f"Ready in {median_ready:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
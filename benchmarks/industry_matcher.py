@@ -0,0 +1,98 @@
+"""Compiled keyword matcher vs the previous one-`re.search`-per-keyword scan.
+
+    python -m benchmarks.industry_matcher [--rows 1000 10000] [--keywords 20 200 1000]
+
+Two baselines reproduce the removed `_has_any` path: `has_any` joins every
+description and runs one `re.search` per keyword until an industry hits
+(booleans only, fast when an early keyword matches, worst case on statements
+with no hits); `per_kw_count` runs one `re.findall` per keyword to get the
+same per-industry hit counts the compiled matcher returns.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import time
+
+from api.industry import DEFAULT_KEYWORDS_PATH, KeywordClassifier
+
+
+def has_any_baseline(text: str, keywords: list[str]) -> bool:
+    for kw in keywords:
+        if re.search(re.escape(kw.lower()), text):
+            return True
+    return False
+
+
+def classify_baseline(descriptions: list[str], industries: list[tuple[str, float, dict[str, float]]]) -> str:
+    text = " ".join(descriptions).lower()
+    for name, _, keywords in industries:
+        if has_any_baseline(text, list(keywords)):
+            return name
+    return "Other"
+
+
+def count_baseline(descriptions: list[str], industries: list[tuple[str, float, dict[str, float]]]) -> dict[str, int]:
+    text = "\n".join(descriptions).lower()
+    return {
+        name: sum(len(re.findall(re.escape(kw.lower()), text)) for kw in keywords)
+        for name, _, keywords in industries
+    }
+
+
+def synthetic_industries(n_keywords: int, seed: int = 0) -> list[tuple[str, float, dict[str, float]]]:
+    # Real config first, padded with distinct never-matching keywords so the
+    # baseline has to scan the whole text for most of them.
+    with open(DEFAULT_KEYWORDS_PATH, encoding="utf-8") as f:
+        config = json.load(f)
+    industries = [(ind["name"], float(ind["factor"]), dict(ind["keywords"])) for ind in config["industries"]]
+    rng = random.Random(seed)
+    i = 0
+    while sum(len(k) for _, _, k in industries) < n_keywords:
+        industries[i % len(industries)][2][f"ร้าน{rng.randrange(10**9)}"] = 0.5
+        i += 1
+    return industries
+
+
+def synthetic_descriptions(n_rows: int, with_hits: bool = True, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = ["รับโอนจาก นาย ก", "โอนเงิน PromptPay", "ชำระค่าไฟฟ้า", "ถอนเงินสด ATM"]
+    if with_hits:
+        words += ["ค่าจ้าง งานออกแบบ", "ขายของ ตลาดนัด"]
+    return [rng.choice(words) + f" {rng.randrange(10**6)}" for _ in range(n_rows)]
+
+
+def _best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--keywords", type=int, nargs="+", default=[20, 200, 1000])
+    args = parser.parse_args()
+
+    print(f"{'text':>8} {'rows':>7} {'keywords':>9} {'has_any_ms':>11} {'per_kw_count_ms':>16} {'compiled_ms':>12}")
+    for n_keywords in args.keywords:
+        industries = synthetic_industries(n_keywords)
+        classifier = KeywordClassifier(industries)
+        for with_hits in (True, False):
+            for n_rows in args.rows:
+                descriptions = synthetic_descriptions(n_rows, with_hits)
+                has_any_ms = _best_of(lambda: classify_baseline(descriptions, industries))
+                count_ms = _best_of(lambda: count_baseline(descriptions, industries))
+                compiled_ms = _best_of(lambda: classifier.classify(descriptions))
+                text = "hits" if with_hits else "no_hits"
+                print(f"{text:>8} {n_rows:>7} {n_keywords:>9} {has_any_ms:>11.2f} {count_ms:>16.2f} {compiled_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""In-process load generator for the FastAPI app.
+
+    python -m benchmarks.load [--endpoint analyze ocr] [--concurrency 8] [--requests 400] \
+        [--rows 200] [--ocr-file statement.pdf] [--out results.json] [--baseline baseline.json]
+
+Requests go through `httpx.ASGITransport`, so no server or network is
+involved: the numbers cover routing, validation, features, scoring and (for
+`/ocr`) the OCR pipeline. `OPENAI_API_KEY`/`TYPHOON_API_KEY` are cleared, so
+`/ocr` uploads an image and gets mock transactions unless `--ocr-file` points
+at a PDF (text-layer pages are then parsed in the CPU executor).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable
+
+import httpx
+
+from benchmarks.common import add_output_args, finish, summarize, synthetic_statement
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    send: Callable[[httpx.AsyncClient], Any],
+    concurrency: int,
+    total: int,
+) -> tuple[list[float], float, Counter]:
+    """Keep `concurrency` requests in flight until `total` have completed."""
+
+    samples: list[float] = []
+    statuses: Counter = Counter()
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            try:
+                resp = await send(client)
+                statuses[resp.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                continue
+            samples.append((time.perf_counter() - t0) * 1000.0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started, statuses
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, Any]]:
+    for var in ("OPENAI_API_KEY", "TYPHOON_API_KEY"):
+        os.environ.pop(var, None)
+
+    from api import main as api_main
+
+    await api_main._startup()
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        transport = httpx.ASGITransport(app=api_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            senders: dict[str, Callable[[httpx.AsyncClient], Any]] = {}
+
+            payload = {"transactions": synthetic_statement(args.rows)}
+            senders[f"analyze.rows_{args.rows}"] = lambda c: c.post("/analyze", json=payload)
+
+            if args.ocr_file:
+                with open(args.ocr_file, "rb") as f:
+                    upload = (os.path.basename(args.ocr_file), f.read())
+            else:
+                # Mock OCR is seeded from the upload hash, so one fixed upload is enough.
+                upload = ("statement.png", os.urandom(64 * 1024))
+            senders["ocr." + ("file" if args.ocr_file else "mock")] = lambda c: c.post(
+                "/ocr", files={"file": upload}
+            )
+
+            for name, send in senders.items():
+                if name.split(".")[0] not in args.endpoint:
+                    continue
+                await drive(client, send, args.concurrency, min(args.warmup, args.requests))
+                samples, wall, statuses = await drive(client, send, args.concurrency, args.requests)
+                results[name] = summarize(
+                    samples,
+                    wall,
+                    concurrency=args.concurrency,
+                    statuses={str(k): v for k, v in sorted(statuses.items(), key=str)},
+                )
+                print(f"  {name}: {dict(statuses)}", file=sys.stderr)
+    finally:
+        await api_main._shutdown()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoint", nargs="+", choices=["analyze", "ocr"], default=["analyze", "ocr"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=200, help="transactions per /analyze request")
+    parser.add_argument("--ocr-file", help="upload this file to /ocr instead of random image bytes")
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    return finish(args, "load", results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Microbenchmarks for statement parsing, feature extraction, scoring and SHAP.
+
+    python -m benchmarks.micro [--rows 10 100 1000 10000 100000] [--train] \
+        [--out results.json] [--baseline baseline.json]
+
+Each case is timed after a warm-up call for at least `--min-time` seconds.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import sys
+
+from api.features import TransactionColumns, build_features, summarize_cashflow
+from api.industry import classify_industry_and_profit
+from api.model import load_or_train_model, score_and_explain, score_and_explain_batch, train_model
+from api.statement_parser import parse_statement_text
+
+from benchmarks.common import add_output_args, finish, measure, summarize, synthetic_statement
+
+
+def extract_features(rows: list[dict]) -> dict[str, float]:
+    # Mirrors the /analyze request path.
+    cols = TransactionColumns.from_records(rows)
+    summary = summarize_cashflow(cols)
+    _, factor, profit, _ = classify_industry_and_profit(cols, summary)
+    return build_features(summary, factor, profit)
+
+
+def statement_text(rows: list[dict]) -> str:
+    # The rows as an SCB e-statement text layer: signed amount, running balance.
+    lines, balance = ["ถอน/โอนออก ฝาก/โอนเขา"], 100000.0
+    for r in sorted(rows, key=lambda r: r["date"]):
+        y, m, d = r["date"].split("-")
+        income = r["type"] == "Income"
+        balance += r["amount"] if income else -r["amount"]
+        sign, code = ("+", "X1") if income else ("-", "X2")
+        lines.append(f"{d}/{m}/{y} 10:15:00 {code} ENET {r['description']} {sign}{r['amount']:,.2f} {balance:,.2f}")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--batch", type=int, default=100, help="applicants per batch-scoring call")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend per case")
+    parser.add_argument("--train", action="store_true", help="also time train_model (several seconds per run)")
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    bundle = load_or_train_model(seed=42)
+    results = {}
+
+    def run(name: str, fn, **kw) -> None:
+        results[name] = summarize(measure(fn, min_time=args.min_time, **kw))
+        print(f"  {name}: p50 {results[name]['p50_ms']:.3f} ms", file=sys.stderr)
+
+    for n in args.rows:
+        rows = synthetic_statement(n, seed=n)
+        text = statement_text(rows)
+        run(f"parse.rows_{n}", lambda: parse_statement_text(text))
+        run(f"features.rows_{n}", lambda: extract_features(rows))
+        run(f"analyze.rows_{n}", lambda: score_and_explain(bundle, extract_features(rows), mode="path_dependent"))
+
+    features = extract_features(synthetic_statement(200))
+    batch = [extract_features(synthetic_statement(50, seed=i)) for i in range(args.batch)]
+    run("score.none", lambda: score_and_explain(bundle, features, mode="none"))
+    run(f"score_batch_{args.batch}.none", lambda: score_and_explain_batch(bundle, batch, mode="none"))
+    run("score.path_dependent", lambda: score_and_explain(bundle, features, mode="path_dependent"))
+    x_s = bundle.scaler.transform([[features[k] for k in bundle.feature_order]])
+    x_batch = bundle.scaler.transform([[f[k] for k in bundle.feature_order] for f in batch])
+    run("predict.xgboost", lambda: bundle.classifier().predict_proba(x_s))
+    run(f"predict_batch_{args.batch}.xgboost", lambda: bundle.classifier().predict_proba(x_batch))
+    if bundle.forest is not None:
+        run("predict.forest", lambda: bundle.forest.predict_proba(x_s))
+        run(f"predict_batch_{args.batch}.forest", lambda: bundle.forest.predict_proba(x_batch))
+    run(f"score_batch_{args.batch}.path_dependent", lambda: score_and_explain_batch(bundle, batch, mode="path_dependent"))
+    if importlib.util.find_spec("shap") is not None:
+        run("score.interventional", lambda: score_and_explain(bundle, features, mode="interventional"))
+        run(
+            f"score_batch_{args.batch}.interventional",
+            lambda: score_and_explain_batch(bundle, batch, mode="interventional"),
+        )
+    else:
+        print("  shap not installed: skipping interventional cases", file=sys.stderr)
+
+    if args.train:
+        run("train_model", lambda: train_model(seed=42), min_repeat=3, max_repeat=3)
+
+    return finish(args, "micro", results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Memory high-water mark of one large `/ocr` upload.
+
+    python -m benchmarks.ocr_memory [--pages 200] [--pdf statement.pdf] [--budget-mb 64] \
+        [--out results.json] [--baseline baseline.json]
+
+Starts `uvicorn api.main:app` in a subprocess, warms it up with a small
+upload (worker processes spawned, modules imported), resets the kernel's
+peak-RSS counters (`/proc/<pid>/clear_refs`) and then streams a generated
+text-layer statement of `--pages` pages (or `--pdf`) from disk. Reports the
+growth of the API process's peak RSS (`VmHWM`) and the largest CPU worker's
+peak. The run fails when the API process grows by more than `--budget-mb`.
+Linux only; runs without `OPENAI_API_KEY`, so pages go through the statement
+parser and no LLM.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import add_output_args, finish, summarize
+
+
+DEFAULT_BUDGET_MB = 64.0
+ROWS_PER_PAGE = 40
+
+
+def statement_pdf(path: str, pages: int) -> None:
+    """An SCB-style text-layer statement, `ROWS_PER_PAGE` rows a page, written to `path`."""
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    balance = 50000.0
+    with PdfPages(path) as pdf:
+        for page in range(pages):
+            fig = plt.figure(figsize=(8.27, 11.69))
+            for row in range(ROWS_PER_PAGE):
+                n = page * ROWS_PER_PAGE + row
+                amount = 100.0 + (n * 37) % 900
+                income = n % 3 == 0
+                balance += amount if income else -amount
+                day = 1 + n % 28
+                line = (
+                    f"{day:02d}/11/2025 10:{n % 60:02d}:00 {'X1' if income else 'X2'} ENET transfer {n} "
+                    f"{'+' if income else '-'}{amount:,.2f} {balance:,.2f}"
+                )
+                fig.text(0.05, 0.95 - row * 0.022, line, fontsize=8, family="monospace")
+            pdf.savefig(fig)
+            plt.close(fig)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _children(pid: int) -> list[int]:
+    out = []
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                out.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return out
+
+
+def _reset_peak(pid: int) -> None:
+    # "5" resets VmHWM to the current RSS (Linux >= 4.0).
+    with open(f"/proc/{pid}/clear_refs", "w") as f:
+        f.write("5")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200, help="pages in the generated statement")
+    parser.add_argument("--pdf", help="upload this PDF instead of a generated one")
+    parser.add_argument("--budget-mb", type=float, default=DEFAULT_BUDGET_MB, help="allowed API peak-RSS growth")
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix="creditnext-bench-")
+    small = os.path.join(workdir, "small.pdf")
+    statement_pdf(small, 2)
+    path = args.pdf
+    if path is None:
+        path = os.path.join(workdir, "statement.pdf")
+        statement_pdf(path, args.pages)
+    upload_mb = os.path.getsize(path) / (1024 * 1024)
+
+    port = _free_port()
+    env = dict(os.environ, CREDITNEXT_CACHE_DISABLED="1", CREDITNEXT_LOG_LEVEL="WARNING")
+    env.pop("OPENAI_API_KEY", None)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"], env=env
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(timeout=600.0) as client:
+            for _ in range(200):
+                try:
+                    client.get(f"{base}/health")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            with open(small, "rb") as f:
+                client.post(f"{base}/ocr", files={"file": ("small.pdf", f, "application/pdf")}).raise_for_status()
+
+            workers = _children(server.pid)
+            for pid in [server.pid, *workers]:
+                _reset_peak(pid)
+            rss_before = _status_kb(server.pid, "VmRSS")
+
+            t0 = time.perf_counter()
+            with open(path, "rb") as f:
+                resp = client.post(f"{base}/ocr", files={"file": ("statement.pdf", f, "application/pdf")})
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            resp.raise_for_status()
+            body = resp.json()
+
+            server_peak_mb = (_status_kb(server.pid, "VmHWM") - rss_before) / 1024.0
+            worker_peak_mb = max((_status_kb(pid, "VmHWM") / 1024.0 for pid in _children(server.pid)), default=0.0)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    pages = len(body.get("pages", []))
+    print(
+        f"{pages} pages, {upload_mb:.1f} MB upload, {len(body['transactions'])} transactions: "
+        f"API peak RSS +{server_peak_mb:.1f} MB, largest worker peak {worker_peak_mb:.1f} MB"
+    )
+    results = {
+        f"memory.ocr_pages_{pages}": summarize(
+            [elapsed_ms],
+            upload_mb=round(upload_mb, 2),
+            api_peak_growth_mb=round(server_peak_mb, 1),
+            worker_peak_mb=round(worker_peak_mb, 1),
+        )
+    }
+    status = finish(args, "ocr_memory", results)
+    if server_peak_mb > args.budget_mb:
+        print(f"OVER BUDGET: API peak RSS grew {server_peak_mb:.1f} MB (budget {args.budget_mb:.0f} MB)")
+        return 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""OCR preprocessing benchmark: Tesseract time and character accuracy per page.
+
+    python -m benchmarks.ocr_preprocess [--pdf web/decrypted_test.pdf ...] [--dpi 150 200 300] \
+        [--engine pytesseract tesserocr] [--out results.json] [--baseline baseline.json]
+
+The sample statements are digitally generated, so each page's embedded text
+layer is the reference: every page is rasterized at each `--dpi`, OCR'd with
+and without preprocessing (`api/preprocess.py`) by each `--engine`
+(`api/ocr_engine.py`), and compared against it.
+Accuracy is the share of reference characters (whitespace ignored) found in
+order in the OCR text. Needs the Tesseract binary with Thai data and poppler.
+"""
+
+from __future__ import annotations
+
+import argparse
+import difflib
+import io
+import re
+import shutil
+import sys
+import time
+
+from api.ocr import OCR_PREPROCESS, _tesseract_image_to_text
+from api.ocr_engine import ENGINES, resolve_engine_name
+from api.preprocess import PreprocessConfig, preprocess_for_ocr
+
+from benchmarks.common import add_output_args, finish, summarize
+
+
+DEFAULT_PDFS = ["web/decrypted_test.pdf"]
+
+
+def char_accuracy(reference: str, text: str) -> float:
+    ref = re.sub(r"\s+", "", reference)
+    hyp = re.sub(r"\s+", "", text)
+    if not ref:
+        return 1.0
+    matcher = difflib.SequenceMatcher(None, ref, hyp, autojunk=False)
+    return sum(block.size for block in matcher.get_matching_blocks()) / len(ref)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", nargs="+", default=DEFAULT_PDFS, help="text-layer PDFs to rasterize and OCR")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[150, 200, 300], help="render resolutions")
+    parser.add_argument(
+        "--engine", nargs="+", choices=["auto", *ENGINES], default=["auto"], help="Tesseract backends to compare"
+    )
+    add_output_args(parser)
+    args = parser.parse_args()
+
+    if shutil.which("tesseract") is None or shutil.which("pdftoppm") is None:
+        print("tesseract and poppler (pdftoppm) must be installed", file=sys.stderr)
+        return 2
+
+    from pdf2image import convert_from_bytes
+    from pypdf import PdfReader
+
+    pages = []
+    for path in args.pdf:
+        with open(path, "rb") as f:
+            data = f.read()
+        for i, page in enumerate(PdfReader(io.BytesIO(data)).pages, start=1):
+            pages.append((f"{path}:{i}", data, i, page.extract_text() or ""))
+
+    variants = {"raw": PreprocessConfig(enabled=False), "pre": OCR_PREPROCESS}
+    engines = list(dict.fromkeys(resolve_engine_name(e) for e in args.engine))
+    results = {}
+    for engine in engines:
+        for dpi in args.dpi:
+            for name, config in variants.items():
+                ocr_ms, pre_ms, accuracy = [], [], []
+                for label, data, number, reference in pages:
+                    image = convert_from_bytes(
+                        data, dpi=dpi, first_page=number, last_page=number, grayscale=config.enabled
+                    )[0]
+                    t0 = time.perf_counter()
+                    prepared, ocr_dpi = preprocess_for_ocr(image, config, dpi)
+                    t1 = time.perf_counter()
+                    text = _tesseract_image_to_text(prepared, ocr_dpi, engine)
+                    t2 = time.perf_counter()
+                    pre_ms.append((t1 - t0) * 1000.0)
+                    ocr_ms.append((t2 - t1) * 1000.0)
+                    accuracy.append(char_accuracy(reference, text))
+                    print(
+                        f"  {engine} dpi={dpi} {name} {label}: preprocess {pre_ms[-1]:.0f} ms, "
+                        f"tesseract {ocr_ms[-1]:.0f} ms, accuracy {accuracy[-1]:.3f}, "
+                        f"{prepared.width}x{prepared.height}",
+                        file=sys.stderr,
+                    )
+                total = [a + b for a, b in zip(pre_ms, ocr_ms)]
+                results[f"ocr.{engine}.dpi_{dpi}.{name}"] = summarize(
+                    total,
+                    preprocess_p50_ms=round(sorted(pre_ms)[len(pre_ms) // 2], 1),
+                    char_accuracy=round(sum(accuracy) / len(accuracy), 4),
+                )
+
+    print(f"{'case':<36} {'char_accuracy':>14} {'preprocess_ms':>14}")
+    for case, r in results.items():
+        print(f"{case:<36} {r['char_accuracy']:>14.4f} {r['preprocess_p50_ms']:>14.1f}")
+    return finish(args, "ocr_preprocess", results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import io
+import threading
 from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
@@ -64,6 +66,55 @@ class CreditModelArtifacts:
         )
 
 
+def score_with_bundle(bundle: Any, features: dict) -> ScoreResult:
+    """Score with the API's persisted model (an `api.model.ModelBundle`).
+
+    Contributions are the API's default path-dependent TreeSHAP; no figure is
+    drawn here (see `render_waterfall_png`).
+    """
+
+    from api.model import score_and_explain
+
+    scored = score_and_explain(bundle, features)
+    return ScoreResult(
+        credit_score=int(scored["credit_score"]),
+        base_value=float(scored.get("base_value", 0.0)),
+        feature_contributions=dict(scored.get("contributions", {})),
+    )
+
+
+# pyplot keeps one global "current figure", so concurrent sessions must not draw at once.
+_PLOT_LOCK = threading.Lock()
+
+
+def render_waterfall_png(
+    feature_order: list[str], features: dict, base_value: float, contributions: Dict[str, float]
+) -> bytes | None:
+    """SHAP waterfall chart as PNG bytes, or None if shap/matplotlib are unavailable."""
+
+    try:
+        import matplotlib.pyplot as plt
+        import shap
+    except ImportError:
+        return None
+
+    explanation = shap.Explanation(
+        values=np.array([contributions[k] for k in feature_order], dtype=float),
+        base_values=float(base_value),
+        data=np.array([features[k] for k in feature_order], dtype=float),
+        feature_names=list(feature_order),
+    )
+    buf = io.BytesIO()
+    with _PLOT_LOCK:
+        fig = plt.figure(figsize=(7.0, 3.8), dpi=140)
+        try:
+            shap.plots.waterfall(explanation, show=False)
+            fig.savefig(buf, format="png", bbox_inches="tight")
+        finally:
+            plt.close(fig)
+    return buf.getvalue()
+
+
 def train_dummy_credit_model(seed: int = 42) -> CreditModelArtifacts:
     """Train a small on-the-fly credit model on synthetic data.
 
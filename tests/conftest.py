@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+# Keep test runs away from the developer's OCR cache and provider keys.
+os.environ.setdefault("CREDITNEXT_CACHE_DISABLED", "1")
+os.environ.pop("OPENAI_API_KEY", None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from api.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def bundle():
+    from api.model import load_or_train_model
+
+    return load_or_train_model(seed=42)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+DESCRIPTIONS = ["ค่าจ้าง งานออกแบบ", "ขายของ ออนไลน์", "ร้านอาหาร", "โอนเงิน", "ค่าไฟฟ้า", "Grab food"]
+
+
+def _statement(rng: random.Random) -> list[dict]:
+    # Each applicant uses one date format; the batch mixes them.
+    fmt = rng.choice(["iso", "dmy", "datetime"])
+    rows = []
+    for _ in range(rng.randint(1, 12)):
+        day, month = rng.randint(1, 28), rng.randint(1, 6)
+        date = {
+            "iso": f"2025-{month:02d}-{day:02d}",
+            "dmy": f"{day:02d}/{month:02d}/2025",
+            "datetime": f"2025-{month:02d}-{day:02d} 10:15:00",
+        }[fmt]
+        rows.append(
+            {
+                "date": date,
+                "description": rng.choice(DESCRIPTIONS),
+                "amount": round(rng.uniform(10, 5000), 2),
+                "type": rng.choice(["Income", "Expense"]),
+            }
+        )
+    return rows
+
+
+def _assert_same(a, b) -> None:
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for k in a:
+            _assert_same(a[k], b[k])
+    elif isinstance(a, list):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            _assert_same(x, y)
+    elif isinstance(a, float):
+        assert a == pytest.approx(b, rel=1e-6, abs=1e-9)
+    else:
+        assert a == b
+
+
+def test_batch_matches_single_with_mixed_date_formats(client):
+    a = [
+        {"date": "05/01/2025", "description": "ค่าจ้าง", "amount": 100.0, "type": "Income"},
+        {"date": "10/01/2025", "description": "โอนเงิน", "amount": 100.0, "type": "Income"},
+    ]
+    b = [
+        {"date": "2025-01-05", "description": "ขายของ", "amount": 100.0, "type": "Income"},
+        {"date": "2025-01-20", "description": "ขายของ", "amount": 100.0, "type": "Income"},
+    ]
+    single = [client.post("/analyze", json={"transactions": t}).json() for t in (a, b)]
+    for order in ([a, b], [b, a]):
+        batch = client.post("/analyze/batch", json={"applicants": [{"transactions": t} for t in order]}).json()
+        expected = single if order[0] is a else single[::-1]
+        _assert_same(batch["results"], expected)
+
+
+@pytest.mark.parametrize("explain", ["none", "fast"])
+def test_random_batches_match_single(client, explain):
+    rng = random.Random(7)
+    for _ in range(20):
+        applicants = [_statement(rng) for _ in range(rng.randint(1, 5))]
+        batch = client.post(
+            f"/analyze/batch?explain={explain}", json={"applicants": [{"transactions": t} for t in applicants]}
+        ).json()["results"]
+        single = [client.post(f"/analyze?explain={explain}", json={"transactions": t}).json() for t in applicants]
+        _assert_same(batch, single)
+
+
+def test_batch_keeps_applicants_without_transactions(client):
+    batch = client.post("/analyze/batch", json={"applicants": [{"transactions": []}]}).json()["results"]
+    assert batch == [client.post("/analyze", json={"transactions": []}).json()]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import stat
+import sys
+
+import pytest
+
+from api.cache import ResultCache, default_cache_path
+
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@posix_only
+def test_default_path_is_private_per_user(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    cache = ResultCache()
+    cache.put_text("k", {"source": "ocr", "text": "เงินเดือน 30,000"})
+    try:
+        assert cache.path == default_cache_path() == str(tmp_path / "creditnext" / "ocr-cache.sqlite3")
+        assert _mode(tmp_path / "creditnext") == 0o700
+        for suffix in ("", "-wal", "-shm"):
+            assert _mode(cache.path + suffix) == 0o600
+    finally:
+        cache.close()
+
+
+@posix_only
+def test_existing_permissive_files_are_tightened(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    directory = tmp_path / "creditnext"
+    directory.mkdir(mode=0o755)
+    os.chmod(directory, 0o755)
+    (directory / "ocr-cache.sqlite3").touch()
+    os.chmod(directory / "ocr-cache.sqlite3", 0o644)
+    cache = ResultCache()
+    cache.close()
+    assert _mode(directory) == 0o700
+    assert _mode(directory / "ocr-cache.sqlite3") == 0o600
+
+
+@posix_only
+def test_explicit_path_is_created_private(tmp_path):
+    path = tmp_path / "nested" / "cache.sqlite3"
+    cache = ResultCache(str(path))
+    cache.close()
+    assert _mode(path) == 0o600
+    assert _mode(path.parent) == 0o700
+
+
+def test_async_round_trip_and_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+
+    async def main():
+        assert await cache.aget_transactions("k") is None
+        await cache.aput_transactions("k", [{"amount": 1.0}])
+        await cache.aput_text("t", {"source": "ocr", "text": "x"})
+        return await cache.aget_transactions("k"), await cache.aget_text("t")
+
+    try:
+        assert asyncio.run(main()) == ([{"amount": 1.0}], {"source": "ocr", "text": "x"})
+        cache.ttl_seconds = -1
+        assert cache.get_transactions("k") is None
+    finally:
+        cache.close()
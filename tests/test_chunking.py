@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import re
+
+from api.chunking import chunk_ocr_text, estimate_tokens
+from api.ocr import _extract_in_chunks
+from api.reconcile import reconcile
+from api.statement_parser import opening_balance
+
+HEADER = ["ธนาคารทดสอบ จำกัด (มหาชน)", "Account 123-4-56789-0", "Date Description Withdrawal Deposit Balance"]
+ROW = re.compile(r"^(\d{2})/(\d{2})/(\d{4}) (.+?) (\d[\d,]*\.\d{2}) (\d[\d,]*\.\d{2})$")
+
+
+def _statement(rows: int, opening: float = 1000.0) -> tuple[str, list[dict]]:
+    lines = HEADER + [f"Balance brought forward {opening:,.2f}"]
+    balance = opening
+    txns = []
+    for i in range(rows):
+        amount = float(100 + i)
+        income = i % 3 != 0
+        balance += amount if income else -amount
+        day = i % 28 + 1
+        description = f"{'รับโอน' if income else 'ชำระ'} รายการ {i}"
+        lines.append(f"{day:02d}/01/2025 {description} {amount:,.2f} {balance:,.2f}")
+        txns.append(
+            {
+                "date": f"2025-01-{day:02d}",
+                "description": description,
+                "amount": amount,
+                "type": "Income" if income else "Expense",
+                "balance": round(balance, 2),
+            }
+        )
+    return "\n".join(lines), txns
+
+
+def _read_rows(chunk: str, by_line: dict[str, dict]) -> list[dict]:
+    """Stand-in for the LLM: the transactions whose row lines are in `chunk`."""
+
+    return [dict(by_line[line]) for line in chunk.split("\n") if ROW.match(line)]
+
+
+def _split(rows: int = 120, max_tokens: int = 300) -> tuple[str, list[dict], list[str]]:
+    text, txns = _statement(rows)
+    return text, txns, chunk_ocr_text(text, max_tokens)
+
+
+def test_short_text_is_a_single_chunk():
+    text, _ = _statement(5)
+    assert chunk_ocr_text(text, 10_000) == [text]
+    assert chunk_ocr_text("\n\n" + text + "\n", 10_000) == [text]
+    assert chunk_ocr_text("", 100) == []
+
+
+def test_whole_pages_are_packed_together():
+    page_a, _ = _statement(3)
+    page_b, _ = _statement(3, opening=500.0)
+    assert chunk_ocr_text(f"{page_a}\f{page_b}", 10_000) == [f"{page_a}\n{page_b}"]
+    assert chunk_ocr_text(f"{page_a}\f{page_b}", estimate_tokens(page_a) + 5) == [page_a, page_b]
+
+
+def test_long_page_is_split_between_lines():
+    text, _, chunks = _split()
+    assert len(chunks) > 3
+    lines = text.split("\n")
+    carried = set(HEADER)
+    previous_end = None
+    for chunk in chunks:
+        body = [line for line in chunk.split("\n") if line not in carried and not line.startswith("Balance brought forward")]
+        # Every chunk is a run of whole original lines...
+        start = lines.index(body[0])
+        assert lines[start : start + len(body)] == body
+        # ...overlapping the previous chunk by two lines.
+        if previous_end is not None:
+            assert start == previous_end - 2
+        previous_end = start + len(body)
+        assert estimate_tokens(chunk) <= 300 + len(chunk.split("\n"))
+    assert previous_end == len(lines)
+
+
+def test_continuation_chunks_carry_header_and_balance():
+    _, txns, chunks = _split()
+    assert opening_balance(chunks[0]) == 1000.0
+    for chunk in chunks[1:]:
+        lines = chunk.split("\n")
+        assert lines[: len(HEADER)] == HEADER
+        carried = lines[len(HEADER)]
+        assert carried.startswith("Balance brought forward")
+        first_row = ROW.match(lines[len(HEADER) + 1])
+        # The carried balance is the one printed just before the chunk's first row.
+        index = next(i for i, t in enumerate(txns) if t["description"] == first_row.group(4))
+        assert opening_balance(chunk) == txns[index - 1]["balance"]
+
+
+def test_every_chunk_reconciles_from_its_carried_balance():
+    text, txns, chunks = _split()
+    by_line = {line: t for line, t in zip(text.split("\n")[len(HEADER) + 1 :], txns)}
+    for chunk in chunks:
+        report = reconcile(_read_rows(chunk, by_line), opening_balance(chunk))
+        assert report.ok, chunk
+        # Every row is checked, including the first one of continuation chunks.
+        assert report.checked == len(_read_rows(chunk, by_line))
+
+
+def test_chunk_results_keep_statement_order():
+    # Newest first, with a row the model returned without a date.
+    text, txns = _statement(120)
+    lines = text.split("\n")
+    rows = list(zip(lines[len(HEADER) + 1 :], txns))
+    rows[40] = (rows[40][0], dict(rows[40][1], date=""))
+    newest_first = "\n".join(lines[: len(HEADER) + 1] + [line for line, _ in reversed(rows)])
+    by_line = dict(rows)
+
+    async def extract(chunk: str) -> list[dict]:
+        await asyncio.sleep(0.001 * (len(chunk) % 7))  # chunks finish out of order
+        return _read_rows(chunk, by_line)
+
+    merged = asyncio.run(_extract_in_chunks(chunk_ocr_text(newest_first, 300), extract))
+    assert merged == [t for _, t in reversed(rows)]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from api.executor import CpuExecutor, ExecutorSaturated
+
+
+@pytest.fixture
+def executor():
+    executor = CpuExecutor(max_workers=1, max_pending=2)
+    yield executor
+    executor.shutdown()
+
+
+def test_run_bounds_tasks_in_the_pool(executor):
+    peak = 0
+
+    async def main():
+        nonlocal peak
+        # One large document: many pages from a single admitted request.
+        with executor.admit():
+            pages = [asyncio.create_task(executor.run(time.sleep, 0.01)) for _ in range(20)]
+            while not all(p.done() for p in pages):
+                peak = max(peak, executor.pending)
+                await asyncio.sleep(0.001)
+            await asyncio.gather(*pages)
+
+    asyncio.run(main())
+    assert 0 < peak <= executor.max_pending
+    assert executor.pending == executor.waiting == executor.admitted == 0
+
+
+def test_admit_counts_queued_tasks_not_requests(executor):
+    async def main():
+        with executor.admit():
+            pages = [asyncio.create_task(executor.run(time.sleep, 0.05)) for _ in range(10)]
+            await asyncio.sleep(0)
+            # Only one request is admitted, but its pages fill the queue.
+            assert executor.backlog == 10
+            with pytest.raises(ExecutorSaturated):
+                with executor.admit():
+                    pass
+            await asyncio.gather(*pages)
+        with executor.admit():
+            assert await executor.run(sum, [1, 2, 3]) == 6
+
+    asyncio.run(main())
+
+
+def test_admit_still_caps_requests(executor):
+    with executor.admit(), executor.admit():
+        with pytest.raises(ExecutorSaturated):
+            with executor.admit():
+                pass
+    assert executor.admitted == 0
+
+
+def test_cancelled_tasks_release_their_slots(executor):
+    async def main():
+        pages = [asyncio.create_task(executor.run(time.sleep, 0.2)) for _ in range(6)]
+        await asyncio.sleep(0.05)
+        for page in pages:
+            page.cancel()
+        await asyncio.gather(*pages, return_exceptions=True)
+        assert executor.backlog == 0
+        assert await asyncio.wait_for(executor.run(sum, [1, 2]), timeout=30) == 3
+
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from api.explain import forest_contributions, max_abs_deviation_from_shap, tree_contributions
+from api.model import score_and_explain_batch
+
+pytest.importorskip("xgboost")
+
+# Native path-dependent TreeSHAP must match the shap package to this tolerance.
+SHAP_TOLERANCE = 1e-4
+
+
+def _rows(bundle, n: int = 500) -> np.ndarray:
+    return np.asarray(bundle.shap_background[:n], dtype=float)
+
+
+def test_native_contributions_match_shap_package(bundle):
+    pytest.importorskip("shap")
+    assert max_abs_deviation_from_shap(bundle.classifier(), _rows(bundle)) < SHAP_TOLERANCE
+
+
+def test_contributions_sum_to_the_booster_margin(bundle):
+    rows = _rows(bundle, 200)
+    explained = tree_contributions(bundle.classifier(), rows)
+    proba = bundle.classifier().predict_proba(rows)[:, 1]
+    margin = explained.values.sum(axis=1) + explained.base_values
+    np.testing.assert_allclose(1.0 / (1.0 + np.exp(-margin)), proba, atol=1e-6)
+    np.testing.assert_allclose(explained.p_default, proba, atol=1e-6)
+
+
+def test_modes_agree_on_p_default(bundle):
+    raw = _rows(bundle, 20) * bundle.scaler.scale_ + bundle.scaler.mean_
+    features = [dict(zip(bundle.feature_order, row)) for row in raw]
+    fast = score_and_explain_batch(bundle, features, mode="path_dependent")
+    bare = score_and_explain_batch(bundle, features, mode="none")
+    for a, b in zip(fast, bare):
+        # Both come from the compiled forest.
+        assert a["p_default"] == b["p_default"]
+        assert set(a["contributions"]) == set(bundle.feature_order)
+        assert "contributions" not in b
+
+
+def test_forest_contributions_match_booster(bundle):
+    rows = _rows(bundle)
+    native = forest_contributions(bundle.forest, rows)
+    booster = tree_contributions(bundle.classifier(), rows)
+    np.testing.assert_allclose(native.values, booster.values, atol=1e-5)
+    np.testing.assert_allclose(native.base_values, booster.base_values, atol=1e-5)
+    np.testing.assert_allclose(native.p_default, booster.p_default, atol=1e-6)
+
+
+def test_default_explain_level_does_not_import_xgboost(bundle):
+    # A fresh interpreter, as a worker serving /analyze?explain=fast would be.
+    script = (
+        "import sys\n"
+        "from api.model import load_or_train_model, score_and_explain\n"
+        "bundle = load_or_train_model(seed=42)\n"
+        "features = dict.fromkeys(bundle.feature_order, 0.5)\n"
+        "scored = score_and_explain(bundle, features, mode='path_dependent')\n"
+        "assert len(scored['contributions']) == len(bundle.feature_order), scored\n"
+        "assert 'xgboost' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
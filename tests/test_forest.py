@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import dataclasses
+
+import numpy as np
+import pytest
+
+from api.forest import CONTRIBUTION_TOLERANCE, CompiledForest, compile_booster, is_faithful, validate
+
+pytest.importorskip("xgboost")
+
+
+def _probe(bundle, nan_share: float = 0.0) -> np.ndarray:
+    rows = np.asarray(bundle.shap_background, dtype=float)
+    rng = np.random.default_rng(0)
+    probe = np.vstack([rows, rng.normal(size=(2000, rows.shape[1])) * 3.0])
+    if nan_share:
+        probe[rng.random(probe.shape) < nan_share] = np.nan
+    return probe
+
+
+@pytest.mark.parametrize("nan_share", [0.0, 0.01])
+def test_compiled_forest_matches_booster(bundle, nan_share):
+    forest = compile_booster(bundle.classifier().get_booster())
+    report = validate(forest, bundle.classifier(), _probe(bundle, nan_share))
+    assert report["margin_mismatches"] == 0
+    assert is_faithful(report), report
+
+
+def test_artifact_forest_matches_booster(bundle):
+    # The forest shipped in the artifact, not just a fresh compile.
+    assert bundle.forest is not None
+    assert is_faithful(validate(bundle.forest, bundle.classifier(), _probe(bundle, 0.01)))
+
+
+def test_single_rows_match_booster(bundle):
+    # /analyze scores one row at a time; the float32 sum must stay sequential there too.
+    for row in _probe(bundle, 0.01)[::50]:
+        assert validate(bundle.forest, bundle.classifier(), row[None])["margin_mismatches"] == 0
+
+
+def test_single_row_and_blocked_batches_agree(bundle):
+    forest = bundle.forest
+    probe = _probe(bundle)[:700]
+    whole = forest.predict_margin(probe)
+    one_by_one = np.concatenate([forest.predict_margin(row) for row in probe[:50]])
+    np.testing.assert_array_equal(whole[:50], one_by_one)
+
+
+def test_save_load_round_trip(bundle, tmp_path):
+    path = tmp_path / "forest.npz"
+    with open(path, "wb") as f:
+        bundle.forest.save(f)
+    loaded = CompiledForest.load(str(path))
+    probe = _probe(bundle)[:300]
+    np.testing.assert_array_equal(loaded.predict_margin(probe), bundle.forest.predict_margin(probe))
+    np.testing.assert_array_equal(loaded.contributions(probe)[0], bundle.forest.contributions(probe)[0])
+
+
+def test_contributions_match_pred_contribs(bundle):
+    from xgboost import DMatrix
+
+    probe = _probe(bundle, 0.01)
+    reference = bundle.classifier().get_booster().predict(DMatrix(probe.astype(np.float32)), pred_contribs=True)
+    values, bias = bundle.forest.contributions(probe)
+    np.testing.assert_allclose(values, reference[:, :-1], atol=CONTRIBUTION_TOLERANCE)
+    np.testing.assert_allclose(bias, reference[:, -1], atol=CONTRIBUTION_TOLERANCE)
+    # Efficiency: contributions and bias add up to the margin.
+    np.testing.assert_allclose(values.sum(axis=1) + bias, bundle.forest.predict_margin(probe), atol=1e-5)
+
+
+def test_single_row_contributions_match_blocks(bundle):
+    probe = _probe(bundle, 0.01)[:100]
+    whole = bundle.forest.contributions(probe)[0]
+    one_by_one = np.concatenate([bundle.forest.contributions(row)[0] for row in probe[:20]])
+    np.testing.assert_allclose(whole[:20], one_by_one, rtol=0, atol=1e-12)
+
+
+def test_validation_reports_contribution_error(bundle):
+    report = validate(bundle.forest, bundle.classifier(), _probe(bundle)[:500])
+    assert report["max_abs_contribution_error"] <= CONTRIBUTION_TOLERANCE
+    assert bundle.metadata["forest"]["max_abs_contribution_error"] <= CONTRIBUTION_TOLERANCE
+
+
+def test_forest_without_covers_does_not_explain(bundle, tmp_path):
+    forest = dataclasses.replace(bundle.forest, cover=None)
+    assert not forest.explains
+    with pytest.raises(ValueError):
+        forest.contributions(_probe(bundle)[:1])
+    path = tmp_path / "forest.npz"
+    with open(path, "wb") as f:
+        forest.save(f)
+    assert CompiledForest.load(str(path)).cover is None
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import random
+
+from api.industry import KeywordClassifier, classify_industry, get_classifier
+
+
+def _baseline(descriptions: list[str]) -> tuple[str, float]:
+    # The original two-rule classifier: Freelance wins whenever it has a hit.
+    text = " ".join(descriptions).lower()
+    freelance = any(kw in text for kw in ("ค่าจ้าง", "freelance"))
+    retail = any(kw in text for kw in ("วัตถุดิบ", "ขายของ"))
+    if freelance:
+        return "Freelance", 0.50
+    if retail:
+        return "Retail", 0.20
+    return "Other", 0.10
+
+
+def test_freelance_wins_over_heavier_retail():
+    descriptions = ["ค่าจ้าง งานเดือนมกราคม"] + ["ขายของ ตลาดนัด shopee"] * 20
+    match = get_classifier().classify(descriptions)
+    assert match.scores["Retail"] > match.scores["Freelance"]
+    assert (match.industry, match.factor) == ("Freelance", 0.50)
+
+
+def test_matches_original_rules_on_original_keywords():
+    words = ["ค่าจ้าง", "freelance", "วัตถุดิบ", "ขายของ", "โอนเงิน", "ค่าไฟ", "ATM"]
+    rng = random.Random(13)
+    for _ in range(500):
+        descriptions = [" ".join(rng.choices(words, k=rng.randint(1, 3))) for _ in range(rng.randint(1, 15))]
+        assert classify_industry(descriptions) == _baseline(descriptions)
+
+
+def test_without_precedence_highest_score_wins():
+    classifier = KeywordClassifier([("A", 0.5, {"a": 1.0}), ("B", 0.2, {"b": 1.0})])
+    assert classifier.classify(["a b b"]).industry == "B"
+    precedence = KeywordClassifier([("A", 0.5, {"a": 1.0}), ("B", 0.2, {"b": 1.0})], precedence=["A"])
+    assert precedence.classify(["a b b"]).industry == "A"
+    assert precedence.classify(["b"]).industry == "B"
+    assert precedence.classify(["c"]).industry == "Other"
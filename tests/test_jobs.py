@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from api import main, uploads
+from api.jobs import JobManager, JobQueueFull, MemoryJobStore
+
+
+class FakeUpload:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _txn(day: int) -> dict:
+    return {"date": f"2025-01-{day:02d}", "description": f"row {day}", "amount": float(day), "type": "Income"}
+
+
+def _page_runner(pages: int, delay: float = 0.0):
+    """Stub runner: reports `pages` pages one by one, then the merged result."""
+
+    async def runner(upload, filename, password, bank, on_page=None):
+        try:
+            infos = []
+            for page in range(1, pages + 1):
+                await asyncio.sleep(delay)
+                info = {"page": page, "source": "text_layer"}
+                infos.append(info)
+                await on_page(info, [_txn(page)], pages)
+            return {"transactions": [_txn(p) for p in range(1, pages + 1)], "pages": infos}
+        finally:
+            upload.close()
+
+    return runner
+
+
+class RecordingStore(MemoryJobStore):
+    def __init__(self, fail_for: set[str] | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.saved: list[dict] = []
+        self.fail_for = fail_for if fail_for is not None else set()
+
+    async def save(self, job):
+        if job["filename"] in self.fail_for:
+            raise ConnectionError("store unreachable")
+        self.saved.append(json.loads(json.dumps(job)))
+        await super().save(job)
+
+
+async def _wait_for(manager: JobManager, job_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await manager.get(job_id)
+        if job is not None and job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_progress_is_saved_page_by_page():
+    store = RecordingStore()
+    upload = FakeUpload()
+
+    async def main_():
+        manager = JobManager(_page_runner(3), store=store, workers=1)
+        job = await manager.submit(upload, "statement.pdf", None, None)
+        assert job["status"] == "queued"
+        done = await _wait_for(manager, job["job_id"])
+        await manager.stop()
+        return done
+
+    done = asyncio.run(main_())
+    assert done["status"] == "done"
+    assert done["pages_total"] == done["pages_done"] == 3
+    assert [t["date"] for t in done["transactions"]] == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    assert upload.closed
+    progress = [(s["status"], s["pages_done"], len(s["transactions"])) for s in store.saved]
+    assert progress == [("queued", 0, 0), ("running", 0, 0), ("running", 1, 1), ("running", 2, 2), ("running", 3, 3), ("done", 3, 3)]
+    assert [s["version"] for s in store.saved[1:]] == [1, 2, 3, 4, 5]
+
+
+def test_submit_rejects_when_queue_is_full():
+    async def main_():
+        manager = JobManager(_page_runner(1), workers=0, max_queued=2)
+        uploads_ = [FakeUpload() for _ in range(3)]
+        await manager.submit(uploads_[0], "a.pdf", None, None)
+        await manager.submit(uploads_[1], "b.pdf", None, None)
+        with pytest.raises(JobQueueFull):
+            await manager.submit(uploads_[2], "c.pdf", None, None)
+        await manager.stop()
+        return uploads_
+
+    uploads_ = asyncio.run(main_())
+    # The rejected upload is the caller's to close; queued ones are closed by stop().
+    assert [u.closed for u in uploads_] == [True, True, False]
+
+
+def test_events_stream_progress_then_done():
+    async def main_():
+        manager = JobManager(_page_runner(3, delay=0.02), workers=1)
+        job = await manager.submit(FakeUpload(), "statement.pdf", None, None)
+        events = [chunk async for chunk in manager.events(job["job_id"], interval=0.001)]
+        await manager.stop()
+        return events
+
+    events = asyncio.run(main_())
+    parsed = []
+    for chunk in events:
+        head, data = chunk.strip().split("\n")
+        parsed.append((head.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    names = [name for name, _ in parsed]
+    assert names[-1] == "done" and set(names[:-1]) == {"progress"}
+    versions = [data["version"] for _, data in parsed]
+    assert versions == sorted(set(versions))
+    assert parsed[-1][1]["pages_done"] == 3
+
+
+def test_events_for_unknown_job():
+    async def main_():
+        manager = JobManager(_page_runner(1), workers=0)
+        return [chunk async for chunk in manager.events("missing")]
+
+    (chunk,) = asyncio.run(main_())
+    assert chunk.startswith("event: error\n")
+
+
+@pytest.mark.parametrize("outcome", ["raise", "error_result"])
+def test_runner_failure_marks_job_failed(outcome):
+    async def runner(upload, filename, password, bank, on_page=None):
+        upload.close()
+        if outcome == "raise":
+            raise RuntimeError("tesseract crashed")
+        return {"error": "Incorrect password"}
+
+    async def main_():
+        manager = JobManager(runner, workers=1)
+        job = await manager.submit(FakeUpload(), "statement.pdf", None, None)
+        failed = await _wait_for(manager, job["job_id"])
+        await manager.stop()
+        return failed
+
+    failed = asyncio.run(main_())
+    assert failed["status"] == "failed"
+    assert failed["error"] == ("tesseract crashed" if outcome == "raise" else "Incorrect password")
+
+
+def test_store_errors_do_not_kill_workers():
+    store = RecordingStore()
+    uploads_ = [FakeUpload() for _ in range(4)]
+
+    async def main_():
+        manager = JobManager(_page_runner(2), store=store, workers=1)
+        jobs = [await manager.submit(u, f"{i}.pdf", None, None) for i, u in enumerate(uploads_)]
+        # The store goes away for the first three jobs once they are queued.
+        store.fail_for.update({"0.pdf", "1.pdf", "2.pdf"})
+        done = await _wait_for(manager, jobs[3]["job_id"])
+        await manager.stop()
+        return done
+
+    done = asyncio.run(main_())
+    assert done["status"] == "done"
+    assert all(u.closed for u in uploads_)
+
+
+def test_stop_fails_queued_jobs_and_closes_their_uploads():
+    store = RecordingStore()
+
+    async def main_():
+        started = asyncio.Event()
+
+        async def runner(upload, filename, password, bank, on_page=None):
+            try:
+                started.set()
+                await asyncio.Event().wait()
+            finally:
+                upload.close()
+
+        manager = JobManager(runner, store=store, workers=1)
+        uploads_ = [FakeUpload() for _ in range(3)]
+        jobs = [await manager.submit(u, f"{i}.pdf", None, None) for i, u in enumerate(uploads_)]
+        await started.wait()
+        await manager.stop()
+        return uploads_, [await manager.get(j["job_id"]) for j in jobs]
+
+    uploads_, jobs = asyncio.run(main_())
+    assert all(u.closed for u in uploads_)
+    assert [j["status"] for j in jobs] == ["failed"] * 3
+    assert jobs[0]["error"] == "Server shut down before the job finished"
+    assert jobs[1]["error"] == jobs[2]["error"] == "Server shut down before the job started"
+
+
+def test_memory_store_expires_finished_jobs_only():
+    async def main_():
+        store = MemoryJobStore(ttl_seconds=60)
+        old = time.time() - 120
+        await store.save({"job_id": "done", "status": "done", "updated_at": old})
+        await store.save({"job_id": "running", "status": "running", "updated_at": old})
+        await store.save({"job_id": "fresh", "status": "failed", "updated_at": time.time()})
+        return [await store.get(job_id) for job_id in ("done", "running", "fresh")]
+
+    expired, running, fresh = asyncio.run(main_())
+    assert expired is None
+    assert running is not None and fresh is not None
+
+
+def test_jobs_endpoint_queue_full_and_shutdown_cleanup(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    # No workers: jobs stay queued, holding their spooled uploads.
+    manager = JobManager(main._run_ocr_job, workers=0, max_queued=1)
+    monkeypatch.setattr(main, "JOBS", manager)
+
+    first = client.post("/ocr/jobs", files={"file": ("a.pdf", b"%PDF-1.4 a", "application/pdf")})
+    assert first.status_code == 200
+    assert client.get(f"/ocr/jobs/{first.json()['job_id']}").json()["status"] == "queued"
+    full = client.post("/ocr/jobs", files={"file": ("b.pdf", b"%PDF-1.4 b", "application/pdf")})
+    assert full.status_code == 503
+    assert full.headers["Retry-After"] == "5"
+    assert len(list(tmp_path.iterdir())) == 1
+
+    client.portal.call(manager.stop)
+    assert list(tmp_path.iterdir()) == []
+    assert client.get(f"/ocr/jobs/{first.json()['job_id']}").json()["status"] == "failed"
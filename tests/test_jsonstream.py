@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+
+from api import upstream
+from api.jsonstream import ArrayItemStreamParser
+from api.ocr import _stream_chat_transactions
+
+ROWS = [
+    {"date": "2025-01-05", "description": 'ค่าจ้าง "งาน {A}" [1/2]', "amount": 1500.0, "type": "Income"},
+    {"date": "2025-01-06", "description": "back\\slash \\\" and } ] braces", "amount": 20.5, "type": "Expense"},
+    {"date": "2025-01-07", "description": "nested", "amount": 3, "type": "Income", "meta": {"tags": ["a", {"b": "}"}]}},
+    {"date": "2025-01-08", "description": "emoji 🙂 and ไทย", "amount": 99.99, "type": "Expense"},
+]
+
+# Decoys before the array: a nested "transactions" key and the word inside strings.
+DOCUMENT = json.dumps(
+    {
+        "note": "transactions: [ {not an item} ]",
+        "meta": {"transactions": [{"decoy": True}]},
+        "transactions": ROWS,
+        "after": [{"ignored": True}],
+    },
+    ensure_ascii=False,
+)
+
+
+def _split(text: str, rng: random.Random) -> list[str]:
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, min(40, len(text) - 1))))
+    return [text[a:b] for a, b in zip([0, *cuts], [*cuts, len(text)])]
+
+
+def _feed_all(chunks: list[str]) -> tuple[list, ArrayItemStreamParser]:
+    parser = ArrayItemStreamParser("transactions")
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items, parser
+
+
+def test_whole_document():
+    items, parser = _feed_all([DOCUMENT])
+    assert items == ROWS
+    assert parser.done
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_split_points(seed):
+    items, parser = _feed_all(_split(DOCUMENT, random.Random(seed)))
+    assert items == ROWS
+    assert parser.done
+
+
+def test_one_character_at_a_time():
+    items, _ = _feed_all(list(DOCUMENT))
+    assert items == ROWS
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = ArrayItemStreamParser("transactions")
+    first = json.dumps(ROWS[0], ensure_ascii=False)
+    assert parser.feed('{"transactions": [' + first[:-1]) == []
+    assert parser.feed("}") == [ROWS[0]]
+
+
+def test_truncated_stream_keeps_closed_items():
+    cut = DOCUMENT.index('"2025-01-08"')
+    items, parser = _feed_all(_split(DOCUMENT[:cut], random.Random(1)))
+    assert items == ROWS[:3]
+    assert not parser.done
+
+
+def _sse(document: str, rng: random.Random) -> bytes:
+    events = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": piece}}]}, ensure_ascii=False) + "\n\n"
+        for piece in _split(document, rng)
+    ]
+    return (": keep-alive\n\n" + "".join(events) + "data: [DONE]\n\n").encode("utf-8")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fake_sse_server_with_split_network_chunks(seed):
+    rng = random.Random(seed)
+    body = _sse(json.dumps({"transactions": ROWS}, ensure_ascii=False), rng)
+
+    async def chunks():
+        # Network reads split events, lines and multi-byte characters anywhere.
+        for piece in _split(body.decode("latin-1"), rng):
+            yield piece.encode("latin-1")
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=chunks())
+
+    async def main():
+        client = upstream.UpstreamClient(transport=httpx.MockTransport(handler), http2=False)
+        upstream._UPSTREAM, upstream._UPSTREAM_LOOP = client, asyncio.get_running_loop()
+        try:
+            stream = _stream_chat_transactions("https://llm.test/v1/chat/completions", "key", {"stream": True})
+            return [t async for t in stream]
+        finally:
+            await upstream.shutdown_upstream()
+
+    txns = asyncio.run(main())
+    expected = [(r["date"], float(r["amount"]), r["type"]) for r in ROWS]
+    assert [(t["date"], t["amount"], t["type"]) for t in txns] == expected
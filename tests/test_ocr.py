@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from api import ocr
+from api.cache import ResultCache, cache_key
+
+
+def test_engines_get_different_cache_keys():
+    for pdf in (False, True):
+        tesserocr = ocr.ocr_cache_engine("tesserocr", pdf=pdf)
+        pytesseract = ocr.ocr_cache_engine("pytesseract", pdf=pdf)
+        assert tesserocr != pytesseract
+        assert cache_key("digest", 1, tesserocr) != cache_key("digest", 1, pytesseract)
+        assert ocr._transactions_cache_key("digest", 1, tesserocr, None) != ocr._transactions_cache_key(
+            "digest", 1, pytesseract, None
+        )
+
+
+def test_cached_text_is_not_shared_between_engines(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    calls = []
+
+    async def fake_tesseract(image_bytes, engine=None):
+        calls.append(engine)
+        return f"text from {engine}"
+
+    monkeypatch.setattr(ocr, "get_cache", lambda: cache)
+    monkeypatch.setattr(ocr, "tesseract_ocr_extract_text", fake_tesseract)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    async def main():
+        for engine in ("pytesseract", "tesserocr", "pytesseract"):
+            await ocr.real_openai_ocr_to_transactions(b"image", ocr_engine=engine)
+
+    try:
+        asyncio.run(main())
+    finally:
+        cache.close()
+    # The second pytesseract call hits its own entry; tesserocr never sees it.
+    assert calls == ["pytesseract", "tesserocr"]
+
+
+def _row(day: int, description: str = "transfer", amount: float = 100.0, kind: str = "Income") -> dict:
+    return {"date": f"2025-01-{day:02d}", "description": description, "amount": amount, "type": kind}
+
+
+def test_rows_repeated_across_a_page_break_are_merged():
+    page_1 = [_row(1), _row(2), _row(3, "fee", 10.0, "Expense")]
+    # The next page re-reads the last two rows, with different spacing, case and amount format.
+    page_2 = [_row(2, " Transfer "), dict(_row(3, "FEE  ", kind="Expense"), amount="10.00"), _row(4)]
+    assert ocr.merge_page_transactions([page_1, page_2]) == page_1 + [_row(4)]
+
+
+def test_merge_keeps_genuine_repeats():
+    # Identical rows inside a page, and a boundary where only a non-trailing row matches.
+    page_1 = [_row(1), _row(1), _row(2)]
+    page_2 = [_row(1), _row(3)]
+    assert ocr.merge_page_transactions([page_1, page_2]) == page_1 + page_2
+    # An overlap is only trimmed at the start of the next page.
+    assert ocr.merge_page_transactions([[_row(1)], [_row(2), _row(1)]]) == [_row(1), _row(2), _row(1)]
+
+
+def test_merge_skips_empty_pages_and_chains_boundaries():
+    pages = [[_row(1), _row(2)], [], None, [_row(2), _row(3)], [_row(3)], [_row(3), _row(4)]]
+    assert ocr.merge_page_transactions(pages) == [_row(1), _row(2), _row(3), _row(4)]
+    assert ocr.merge_page_transactions([]) == []
+
+
+TEST_PDF = os.path.join(os.path.dirname(__file__), "..", "web", "decrypted_test.pdf")
+
+
+def _no_rendering(monkeypatch) -> None:
+    import pdf2image
+
+    def render(*args, **kwargs):
+        raise AssertionError("text-layer pages must not be rasterized")
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", render)
+    monkeypatch.setattr(pdf2image, "convert_from_bytes", render)
+
+
+def test_text_layer_pages_skip_rasterization(monkeypatch):
+    _no_rendering(monkeypatch)
+    with open(TEST_PDF, "rb") as f:
+        data = f.read()
+    for pdf in (TEST_PDF, data):
+        for page in (1, 2):
+            result = ocr.ocr_pdf_page(pdf, page)
+            assert result["source"] == "text_layer"
+            assert ocr.has_text_layer(result["text"])
+            assert "render_ms" not in result and "ocr_ms" not in result
+
+
+def test_pages_below_the_text_threshold_are_rendered(monkeypatch):
+    import pdf2image
+    from PIL import Image
+
+    rendered = []
+
+    def render(pdf, dpi, first_page, last_page, grayscale):
+        rendered.append((first_page, dpi))
+        return [Image.new("L", (200, 100), 255)]
+
+    monkeypatch.setattr(pdf2image, "convert_from_path", render)
+    monkeypatch.setattr(ocr, "_tesseract_image_to_text", lambda image, dpi, engine: "scanned text")
+    # Same page, but too little text to count as a text layer.
+    monkeypatch.setattr(ocr, "MIN_TEXT_LAYER_CHARS", 1_000_000)
+
+    assert ocr.ocr_pdf_page(TEST_PDF, 2, ocr_scanned=False)["source"] == "skipped"
+    assert rendered == []
+    result = ocr.ocr_pdf_page(TEST_PDF, 2, dpi=150)
+    assert (result["source"], result["text"]) == ("ocr", "scanned text")
+    assert rendered == [(2, 150)]
+    assert "render_ms" in result and "ocr_ms" in result
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from api.preprocess import PreprocessConfig, content_box, estimate_skew, otsu_threshold, preprocess_for_ocr
+
+# Text block of the synthetic page, in pixels of the 1600x2000 image.
+TEXT_LEFT, TEXT_RIGHT, TEXT_TOP, TEXT_BOTTOM = 300, 1300, 400, 1400
+
+
+def _page(angle: float = 0.0) -> Image.Image:
+    """A white page with lines of word-like bars, rotated by `angle` degrees."""
+
+    image = Image.new("L", (1600, 2000), 255)
+    draw = ImageDraw.Draw(image)
+    for i, y in enumerate(range(TEXT_TOP, TEXT_BOTTOM, 40)):
+        x = TEXT_LEFT
+        while x < TEXT_RIGHT:
+            width = 30 + (x * 7 + i * 13) % 50
+            draw.rectangle([x, y, min(x + width, TEXT_RIGHT), y + 12], fill=20)
+            x += width + 12
+    return image.rotate(angle, fillcolor=255, resample=Image.Resampling.BICUBIC) if angle else image
+
+
+def _levelness(image: Image.Image) -> float:
+    """Ink share of the fullest row: high when text lines are horizontal."""
+
+    return float((np.asarray(image) < 128).mean(axis=1).max())
+
+
+@pytest.mark.parametrize("angle", [3.0, -2.5, 0.0])
+def test_estimate_skew_levels_the_lines(angle):
+    page = _page(angle)
+    probe = page.resize((800, 1000), Image.Resampling.BOX)
+    threshold = otsu_threshold(np.asarray(page)[::4, ::4])
+    assert estimate_skew(probe, threshold, 5.0) == pytest.approx(-angle, abs=0.2)
+
+
+def test_content_box_pads_the_ink():
+    ink = np.zeros((200, 100), dtype=bool)
+    ink[50:60, 20:80] = True
+    assert content_box(ink) == (47, 63, 18, 82)
+    assert content_box(np.zeros((10, 10), dtype=bool)) is None
+
+
+def test_rotated_page_is_deskewed_and_cropped():
+    out, dpi = preprocess_for_ocr(_page(3.0), PreprocessConfig(), 300)
+    # Cropped to the text block plus padding, not the whole page.
+    assert abs(out.width - (TEXT_RIGHT - TEXT_LEFT)) < 60
+    assert abs(out.height - (TEXT_BOTTOM - TEXT_TOP)) < 60
+    assert dpi == 300
+    assert set(np.unique(np.asarray(out))) <= {0, 255}
+    skewed, _ = preprocess_for_ocr(_page(3.0), PreprocessConfig(deskew=False), 300)
+    assert _levelness(out) > 0.7 > _levelness(skewed)
+
+
+def test_rotation_crop_and_scale_are_one_resampling(monkeypatch):
+    page = _page(3.0)
+    cropped, _ = preprocess_for_ocr(page, PreprocessConfig(), 300)
+    resampled = []
+    for name in ("transform", "rotate", "crop", "resize"):
+        original = getattr(Image.Image, name)
+
+        def spy(self, *args, _name=name, _original=original, **kwargs):
+            resampled.append((_name, self.size))
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(Image.Image, name, spy)
+
+    out, dpi = preprocess_for_ocr(page, PreprocessConfig(max_width=500), 300)
+    assert out.width == 500
+    assert dpi == pytest.approx(300 * 500 / cropped.width, abs=1)
+    full_size = [call for call in resampled if call[1] == (1600, 2000)]
+    # The full-resolution page is only shrunk to the probe and resampled once.
+    assert [name for name, _ in full_size] == ["resize", "transform"]
+    assert all(size[0] <= 800 for name, size in resampled if name == "rotate")
+
+
+def test_width_cap_scales_the_dpi():
+    out, dpi = preprocess_for_ocr(_page(), PreprocessConfig(max_width=500, crop=False, deskew=False), 300)
+    assert out.size == (500, 625)
+    assert dpi == round(300 * 500 / 1600)
+
+
+def test_level_uncropped_page_is_not_resampled(monkeypatch):
+    def transform(*args, **kwargs):
+        raise AssertionError("nothing to rotate, crop or scale")
+
+    monkeypatch.setattr(Image.Image, "transform", transform)
+    out, dpi = preprocess_for_ocr(_page(), PreprocessConfig(crop=False, binarize=False), 300)
+    assert out.size == (1600, 2000) and dpi == 300
+
+
+def test_disabled_preprocessing_returns_the_image():
+    page = _page()
+    page.info["dpi"] = (300, 300)
+    assert preprocess_for_ocr(page, PreprocessConfig(enabled=False)) == (page, 300)
+    page.info["dpi"] = (72, 72)  # screenshot metadata is ignored
+    assert preprocess_for_ocr(page, PreprocessConfig(enabled=False)) == (page, None)
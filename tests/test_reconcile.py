@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from api.metrics import RECONCILE_RESULTS
+from api.ocr import _reconcile_chunk
+from api.reconcile import reconcile
+
+OPENING = 1000.0
+
+
+def _rows(*moves: tuple[str, float, str]) -> list[dict]:
+    """Rows with correct printed balances from (description, amount, type)."""
+
+    balance = OPENING
+    rows = []
+    for i, (description, amount, kind) in enumerate(moves):
+        balance += amount if kind == "Income" else -amount
+        rows.append(
+            {"date": f"2025-01-{i + 1:02d}", "description": description, "amount": amount, "type": kind, "balance": round(balance, 2)}
+        )
+    return rows
+
+
+STATEMENT = _rows(
+    ("salary", 500.0, "Income"),
+    ("rent", 300.0, "Expense"),
+    ("transfer in", 120.0, "Income"),
+    ("groceries", 45.5, "Expense"),
+    ("fee", 10.0, "Expense"),
+)
+CHUNK = "Balance brought forward 1,000.00\n" + "\n".join(
+    f"{t['date']} {t['description']} {t['amount']:.2f} {t['balance']:,.2f}" for t in STATEMENT
+)
+
+
+def _flipped(rows: list[dict], index: int) -> list[dict]:
+    rows = [dict(t) for t in rows]
+    rows[index]["type"] = "Expense" if rows[index]["type"] == "Income" else "Income"
+    return rows
+
+
+def _counts() -> dict[str, float]:
+    return {label: RECONCILE_RESULTS.labels(label).value for label in ("ok", "repaired", "retried", "failed", "unchecked")}
+
+
+def _run_chunk(txns: list[dict], retried: list[dict] | None = None, chunk: str = CHUNK):
+    calls = []
+
+    async def retry_chunk(text: str, hint: str) -> list[dict]:
+        calls.append((text, hint))
+        return retried if retried is not None else txns
+
+    before = _counts()
+    kept = asyncio.run(_reconcile_chunk(chunk, txns, retry_chunk))
+    after = _counts()
+    delta = {label: after[label] - before[label] for label in after if after[label] != before[label]}
+    return kept, calls, delta
+
+
+def test_clean_rows_reconcile():
+    report = reconcile(STATEMENT, OPENING)
+    assert report.ok and report.checked == len(STATEMENT) and report.repaired == 0
+
+
+def test_swapped_type_is_repaired():
+    report = reconcile(_flipped(STATEMENT, 2), OPENING, repair=True)
+    assert report.ok and report.repaired == 1
+    assert report.transactions == STATEMENT
+    # Without `repair` the same row is a gap, not a silent fix.
+    unrepaired = reconcile(_flipped(STATEMENT, 2), OPENING)
+    assert [g.index for g in unrepaired.gaps] == [2]
+
+
+def test_duplicated_row_is_dropped():
+    doubled = STATEMENT[:3] + [dict(STATEMENT[2])] + STATEMENT[3:]
+    report = reconcile(doubled, OPENING, repair=True)
+    assert report.ok and report.repaired == 1
+    assert report.transactions == STATEMENT
+    gap = reconcile(doubled, OPENING).gaps[0]
+    assert (gap.index, gap.difference) == (3, -120.0)
+
+
+def test_dropped_row_is_a_gap_with_its_amount():
+    report = reconcile(STATEMENT[:1] + STATEMENT[2:], OPENING, repair=True)
+    assert [(g.index, g.difference) for g in report.gaps] == [(1, -300.0)]
+    assert report.repaired == 0
+
+
+def test_gap_reanchors_on_the_printed_balance():
+    rows = [dict(t) for t in STATEMENT]
+    rows[1]["amount"] = 30.0  # misread
+    report = reconcile(rows, OPENING, repair=True)
+    # One break, reported once; later rows check against the printed balances.
+    assert [g.index for g in report.gaps] == [1]
+    assert report.checked == len(rows)
+
+
+def test_chunk_that_reconciles_is_not_retried():
+    kept, calls, delta = _run_chunk(STATEMENT)
+    assert kept == STATEMENT and calls == [] and delta == {"ok": 1}
+
+
+def test_chunk_repaired_in_place_is_not_retried():
+    kept, calls, delta = _run_chunk(_flipped(STATEMENT, 0))
+    assert kept == STATEMENT and calls == [] and delta == {"repaired": 1}
+
+
+def test_chunk_with_a_gap_is_retried_once_with_the_gap_described():
+    missing = STATEMENT[:1] + STATEMENT[2:]
+    kept, calls, delta = _run_chunk(missing, retried=STATEMENT)
+    assert len(calls) == 1
+    text, hint = calls[0]
+    assert text == CHUNK
+    assert "transfer in" in hint and "off by -300.00" in hint
+    assert kept == STATEMENT
+    assert delta == {"retried": 1}
+
+
+@pytest.mark.parametrize("retry", ["worse", "same", "unchecked"])
+def test_better_attempt_is_kept(retry):
+    missing = STATEMENT[:1] + STATEMENT[2:]
+    if retry == "worse":
+        # Rent still missing, and groceries misread as well: two gaps instead of one.
+        retried = [dict(t) for t in missing]
+        retried[2]["amount"] = 4.55
+        assert len(reconcile(retried, OPENING, repair=True).gaps) == 2
+    elif retry == "same":
+        retried = missing
+    else:
+        retried = [{k: v for k, v in t.items() if k != "balance"} for t in STATEMENT]
+    kept, calls, delta = _run_chunk(missing, retried=retried)
+    assert len(calls) == 1
+    assert kept == missing
+    assert delta == {"failed": 1}
+
+
+def test_retry_that_fixes_some_gaps_is_kept_even_if_not_clean():
+    two_gaps = STATEMENT[:1] + STATEMENT[2:3] + STATEMENT[4:]
+    one_gap = STATEMENT[:1] + STATEMENT[2:]
+    assert len(reconcile(two_gaps, OPENING, repair=True).gaps) == 2
+    kept, calls, delta = _run_chunk(two_gaps, retried=one_gap)
+    assert len(calls) == 1 and kept == one_gap and delta == {"failed": 1}
+
+
+def test_chunk_without_balances_is_unchecked():
+    bare = [{k: v for k, v in t.items() if k != "balance"} for t in STATEMENT]
+    kept, calls, delta = _run_chunk(bare, chunk="no balances here")
+    assert kept == bare and calls == [] and delta == {"unchecked": 1}
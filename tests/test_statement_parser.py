@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from api.statement_parser import parse_statement_text
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "web", "decrypted_test.pdf")
+
+
+def _types(text: str, bank: str | None = None) -> list[str]:
+    return [t["type"] for t in parse_statement_text(text, bank).transactions]
+
+
+def test_sample_statement_is_trusted():
+    pypdf = pytest.importorskip("pypdf")
+    text = "\n".join(page.extract_text() for page in pypdf.PdfReader(SAMPLE_PDF).pages)
+    parsed = parse_statement_text(text)
+    assert len(parsed.transactions) == 49
+    assert parsed.trusted
+    assert parsed.keyword_typed == 0
+
+
+def test_debit_keyword_forces_expense_and_credit_keyword_income():
+    text = "01/01/2025 รับโอนเงิน จากนาย ก 1,000.00\n02/01/2025 ถอนเงินสด ATM 200.00\n03/01/2025 salary Jan 50.00\n"
+    parsed = parse_statement_text(text)
+    assert [t["type"] for t in parsed.transactions] == ["Income", "Expense", "Income"]
+    assert parsed.keyword_typed == 3
+    assert parsed.keyword_ambiguous == 0
+
+
+def test_layout_debit_keywords_are_used():
+    # "เดบิต" is only in the BBL/KTB layouts' debit list.
+    assert _types("01/01/2025 เดบิต บัตร 100.00\n", bank="bbl") == ["Expense"]
+    assert _types("01/01/2025 เครดิต บัญชี 100.00\n", bank="bbl") == ["Income"]
+
+
+@pytest.mark.parametrize("description", ["ค่าจ้าง ชำระคืน", "misc"])
+def test_ambiguous_rows_are_expense_and_not_trusted(description):
+    parsed = parse_statement_text(f"01/01/2025 {description} 100.00 900.00\n")
+    assert [t["type"] for t in parsed.transactions] == ["Expense"]
+    assert parsed.keyword_ambiguous == 1
+    assert not parsed.trusted
+
+
+def test_balance_beats_keywords():
+    text = "01/01/2025 ยอดยกมา 1,000.00\n02/01/2025 ชำระ คืนเงิน 100.00 1,100.00\n"
+    parsed = parse_statement_text(text)
+    assert [t["type"] for t in parsed.transactions] == ["Income"]
+    assert parsed.keyword_typed == 0
+    assert parsed.trusted
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import re
+
+import pytest
+
+from api import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+TRANSACTIONS = [
+    {"date": "2025-01-05", "description": "ค่าจ้าง งานออกแบบ", "amount": 12000.0, "type": "Income"},
+    {"date": "2025-01-09", "description": "ค่าไฟฟ้า", "amount": 850.0, "type": "Expense"},
+    {"date": "2025-02-05", "description": "ค่าจ้าง งานออกแบบ", "amount": 11000.0, "type": "Income"},
+]
+
+
+class CaptureExporter:
+    def __init__(self) -> None:
+        self.spans: list[tracing.Span] = []
+
+    def export(self, span: tracing.Span) -> None:
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exported(monkeypatch) -> list[tracing.Span]:
+    exporter = CaptureExporter()
+    monkeypatch.setattr(tracing, "_EXPORTER", exporter)
+    monkeypatch.setattr(tracing, "_EXPORTER_READY", True)
+    return exporter.spans
+
+
+def _server_timing(header: str) -> dict[str, float]:
+    return {m.group(1): float(m.group(2)) for m in re.finditer(r"([\w.-]+);dur=([\d.]+)", header)}
+
+
+def test_traceparent_round_trip_through_analyze(client, exported):
+    resp = client.post(
+        "/analyze", json={"transactions": TRANSACTIONS}, headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+    )
+    assert resp.status_code == 200
+
+    trace_id, span_id, sampled = tracing.parse_traceparent(resp.headers["traceparent"])
+    assert trace_id == TRACE_ID and span_id != PARENT_ID and sampled
+
+    (root,) = [s for s in exported if s.parent_id == PARENT_ID]
+    assert root.span_id == span_id and root.name == "POST /analyze"
+    assert root.attributes["http.status_code"] == 200
+    stages = {s.name for s in exported if s.parent_id == span_id}
+    assert "features" in stages and stages & {"shap", "predict"}
+    assert all(s.trace_id == TRACE_ID for s in exported)
+
+    # Server-Timing lists the same stages as the exported spans, plus the total.
+    timing = _server_timing(resp.headers["Server-Timing"])
+    assert set(timing) == stages | {"total"}
+    assert timing["features"] <= timing["total"]
+
+
+def test_unsampled_trace_is_continued_but_not_exported(client, exported):
+    resp = client.post(
+        "/analyze", json={"transactions": TRANSACTIONS}, headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"}
+    )
+    assert resp.headers["traceparent"].startswith(f"00-{TRACE_ID}-") and resp.headers["traceparent"].endswith("-00")
+    assert exported == []
+    assert "total" in _server_timing(resp.headers["Server-Timing"])
+
+
+@pytest.mark.parametrize("header", [None, "garbage", f"00-{'0' * 32}-{PARENT_ID}-01", f"00-{TRACE_ID}-{'0' * 16}-01"])
+def test_missing_or_invalid_traceparent_starts_a_new_trace(client, header):
+    headers = {"traceparent": header} if header is not None else {}
+    resp = client.post("/analyze", json={"transactions": TRANSACTIONS}, headers=headers)
+    trace_id, _, sampled = tracing.parse_traceparent(resp.headers["traceparent"])
+    assert trace_id != TRACE_ID and sampled
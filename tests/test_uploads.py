@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+from starlette.datastructures import UploadFile
+
+from api import uploads
+from api.uploads import CHUNK_SIZE, UploadTooLarge, spool_upload
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _upload(path_or_bytes, filename: str = "statement.pdf") -> UploadFile:
+    if isinstance(path_or_bytes, bytes):
+        return UploadFile(io.BytesIO(path_or_bytes), filename=filename)
+    return UploadFile(open(path_or_bytes, "rb"), filename=filename)
+
+
+@pytest.fixture(scope="module")
+def large_pdf(tmp_path_factory) -> str:
+    """Two text-layer statement pages plus a ~12 MB incompressible scanned page."""
+
+    pytest.importorskip("matplotlib")
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+    from pypdf import PdfReader, PdfWriter
+
+    from benchmarks.ocr_memory import statement_pdf
+
+    statement = tmp_path_factory.mktemp("pdf") / "statement.pdf"
+    statement_pdf(str(statement), 2)
+    path = statement.with_name("large.pdf")
+    noise = statement.with_name("noise.pdf")
+    with PdfPages(noise) as pdf:
+        fig = plt.figure(figsize=(8.27, 11.69))
+        # interpolation="none" embeds the pixels unresampled.
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.imshow(np.random.default_rng(0).integers(0, 255, (2000, 2000, 3), dtype=np.uint8), interpolation="none")
+        ax.set_axis_off()
+        pdf.savefig(fig)
+        plt.close(fig)
+    writer = PdfWriter()
+    for source in (statement, noise):
+        for page in PdfReader(source).pages:
+            writer.add_page(page)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_spool_copies_and_hashes(upload_dir):
+    data = os.urandom(3 * CHUNK_SIZE + 123)
+    spooled = asyncio.run(spool_upload(_upload(data)))
+    try:
+        assert spooled.size == len(data)
+        assert spooled.digest == hashlib.sha256(data).hexdigest()
+        assert spooled.read_bytes() == data
+        assert os.path.dirname(spooled.path) == str(upload_dir)
+    finally:
+        spooled.close()
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_spool_rejects_oversized_upload_and_removes_partial_file(upload_dir):
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload(_upload(b"x" * (2 * CHUNK_SIZE + 1)), max_bytes=2 * CHUNK_SIZE))
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_close_removes_scratch_files(upload_dir):
+    spooled = asyncio.run(spool_upload(_upload(b"%PDF-1.4")))
+    scratch = spooled.scratch_path("decrypted.pdf")
+    with open(scratch, "wb") as f:
+        f.write(b"x")
+    spooled.close()
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_spool_memory_high_water_mark(large_pdf):
+    size = os.path.getsize(large_pdf)
+    assert size > 8 * CHUNK_SIZE
+    upload = _upload(large_pdf)
+    tracemalloc.start()
+    try:
+        spooled = asyncio.run(spool_upload(upload))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        upload.file.close()
+    spooled.close()
+    # One chunk in flight, not the whole file.
+    assert peak < 3 * CHUNK_SIZE, f"peak {peak / 1e6:.1f} MB for a {size / 1e6:.1f} MB upload"
+
+
+def test_ocr_document_memory_high_water_mark(large_pdf, upload_dir):
+    from api.executor import shutdown_cpu_executor
+    from api.main import _ocr_document
+
+    size = os.path.getsize(large_pdf)
+    upload = _upload(large_pdf)
+
+    async def main():
+        spooled = await spool_upload(upload)
+        try:
+            tracemalloc.start()
+            result = await _ocr_document(spooled, None, None)
+            return result, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            spooled.close()
+
+    try:
+        result, peak = asyncio.run(main())
+    finally:
+        upload.file.close()
+        shutdown_cpu_executor()
+    assert [p["source"] for p in result["pages"]] == ["text_layer", "text_layer", "skipped"]
+    assert len(result["transactions"]) == 80
+    # Workers get the path; the API process never holds the document.
+    assert peak < size / 4, f"peak {peak / 1e6:.1f} MB for a {size / 1e6:.1f} MB upload"
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_oversized_content_length_gets_413(client):
+    resp = client.post(
+        "/ocr",
+        files={"file": ("big.pdf", b"x", "application/pdf")},
+        headers={"Content-Length": str(uploads.MAX_UPLOAD_BYTES + 10 * 1024 * 1024)},
+    )
+    assert resp.status_code == 413
+
+
+def test_ocr_endpoint_leaves_no_temp_files(client, large_pdf, upload_dir):
+    with open(large_pdf, "rb") as f:
+        resp = client.post("/ocr", files={"file": ("large.pdf", f, "application/pdf")})
+    assert resp.status_code == 200
+    assert len(resp.json()["transactions"]) == 80
+    assert list(upload_dir.iterdir()) == []
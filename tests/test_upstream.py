@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from api import upstream
+from api.upstream import CircuitOpenError, UpstreamClient
+
+URL = "https://llm.test/v1/chat"
+
+
+def _client(handler, **kwargs) -> UpstreamClient:
+    options = dict(backoff_base=0.0, max_retries=2, failure_threshold=1, reset_timeout=0.05)
+    options.update(kwargs)
+    return UpstreamClient(transport=httpx.MockTransport(handler), http2=False, **options)
+
+
+def _open_breaker(client: UpstreamClient) -> None:
+    breaker = client.breaker("llm.test")
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+async def _wait_half_open(client: UpstreamClient) -> None:
+    while client.breaker("llm.test").state != "half_open":
+        await asyncio.sleep(0.01)
+
+
+def test_retries_5xx_then_succeeds():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) < 3 else 200, json={"ok": True})
+
+    async def main():
+        client = _client(handler, failure_threshold=5)
+        resp = await client.post(URL, json={})
+        await client.aclose()
+        return resp
+
+    assert asyncio.run(main()).status_code == 200
+    assert len(calls) == 3
+
+
+def test_retry_after_is_honoured():
+    calls = []
+
+    def handler(request):
+        calls.append(asyncio.get_running_loop().time())
+        return httpx.Response(429, headers={"Retry-After": "0.2"}) if len(calls) == 1 else httpx.Response(200)
+
+    async def main():
+        client = _client(handler)
+        resp = await client.post(URL)
+        await client.aclose()
+        return resp
+
+    assert asyncio.run(main()).status_code == 200
+    assert calls[1] - calls[0] >= 0.19
+
+
+def test_open_breaker_fails_fast_without_contacting_host():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    async def main():
+        client = _client(handler, max_retries=0, reset_timeout=60.0)
+        assert (await client.post(URL)).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            await client.post(URL)
+        await client.aclose()
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_successful_trial_closes_breaker():
+    async def main():
+        client = _client(lambda request: httpx.Response(200))
+        _open_breaker(client)
+        await _wait_half_open(client)
+        assert (await client.post(URL)).status_code == 200
+        assert client.breaker("llm.test").state == "closed"
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_cancelled_trial_releases_the_slot():
+    async def main():
+        gate = asyncio.Event()
+        hang = True
+
+        async def handler(request):
+            if hang:
+                await gate.wait()
+            return httpx.Response(200)
+
+        client = _client(handler)
+        _open_breaker(client)
+        await _wait_half_open(client)
+        trial = asyncio.create_task(client.post(URL))
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        hang = False
+        assert (await client.post(URL)).status_code == 200
+        assert client.breaker("llm.test").state == "closed"
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_unexpected_error_in_trial_releases_the_slot():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.DecodingError("bad body")
+        return httpx.Response(200)
+
+    async def main():
+        client = _client(handler)
+        _open_breaker(client)
+        await _wait_half_open(client)
+        with pytest.raises(httpx.DecodingError):
+            await client.post(URL)
+        assert (await client.post(URL)).status_code == 200
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_rate_limited_trial_releases_the_slot():
+    def handler(request):
+        return httpx.Response(429)
+
+    async def main():
+        client = _client(handler, max_retries=0)
+        _open_breaker(client)
+        await _wait_half_open(client)
+        assert (await client.post(URL)).status_code == 429
+        # Not refused by a trial slot still marked in flight.
+        assert (await client.post(URL)).status_code == 429
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_stream_cancelled_trial_releases_the_slot():
+    async def main():
+        gate = asyncio.Event()
+        hang = True
+
+        async def handler(request):
+            if hang:
+                await gate.wait()
+            return httpx.Response(200, content=b"data: done\n\n")
+
+        async def consume():
+            async with client.stream("POST", URL) as resp:
+                return await resp.aread()
+
+        client = _client(handler)
+        _open_breaker(client)
+        await _wait_half_open(client)
+        trial = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        hang = False
+        assert await consume() == b"data: done\n\n"
+        assert client.breaker("llm.test").state == "closed"
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_stream_retries_before_headers():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(502) if len(calls) == 1 else httpx.Response(200, content=b"ok")
+
+    async def main():
+        client = _client(handler, failure_threshold=5)
+        async with client.stream("POST", URL) as resp:
+            body = await resp.aread()
+        await client.aclose()
+        return body
+
+    assert asyncio.run(main()) == b"ok"
+    assert len(calls) == 2
+
+
+def _reset_process_client(monkeypatch) -> None:
+    monkeypatch.setattr(upstream, "_UPSTREAM", None)
+    monkeypatch.setattr(upstream, "_UPSTREAM_LOOP", None)
+
+
+def test_client_from_a_finished_loop_is_closed(monkeypatch):
+    _reset_process_client(monkeypatch)
+
+    async def first():
+        await upstream.startup_upstream()
+        return upstream.get_upstream()
+
+    async def second():
+        client = upstream.get_upstream()
+        assert upstream.get_upstream() is client
+        await asyncio.gather(*upstream._CLOSING)
+        await upstream.shutdown_upstream()
+        return client
+
+    old = asyncio.run(first())
+    new = asyncio.run(second())
+    assert new is not old
+    assert old._client.is_closed and new._client.is_closed
+
+
+def test_client_from_a_running_loop_is_closed_on_that_loop(monkeypatch):
+    _reset_process_client(monkeypatch)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    closed_on = []
+
+    async def create():
+        client = upstream.get_upstream()
+        aclose = client.aclose
+
+        async def recording_aclose():
+            closed_on.append(asyncio.get_running_loop())
+            await aclose()
+
+        client.aclose = recording_aclose
+        return client
+
+    async def replace():
+        client = upstream.get_upstream()
+        await upstream.shutdown_upstream()
+        return client
+
+    try:
+        old = asyncio.run_coroutine_threadsafe(create(), loop).result(5)
+        asyncio.run(replace())
+        deadline = time.monotonic() + 5
+        while not old._client.is_closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert old._client.is_closed
+        assert closed_on == [loop]
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()